@@ -1,20 +1,28 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response, Response, stream_with_context, g
 import os
+import time
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import hashlib
 import secrets
 from functools import wraps
 from config_manager import config_manager
+from upload_jobs import upload_job_manager
+from points_storage import get_points_storage
+from tenant_locks import tenant_locks
+from upload_results import upload_result_store
+from user_directory import user_directory
+from points_listing import PointsListing, points_listing_cache
+from points_export import EXPORT_FORMATS, EXPORT_CHUNK_ROWS, iter_csv, write_xlsx, iter_file, remove_file
+from qr_images import qr_image_cache
+from qr_cache import qr_cache_store
+from scheduler import maintenance_scheduler, every, daily
+from stage_timing import StageTimer
+from frame_cache import frame_cache
+from metrics import metrics_registry, observe_request, observe_upload, METRICS_CONTENT_TYPE
 import json
-
-# 安全导入 qrcode 模块
-import sys
-current_dir = os.getcwd()
-if current_dir in sys.path:
-    sys.path.remove(current_dir)
-
-import qrcode
+from urllib.parse import urlencode, quote
 
 # 创建 Flask 应用实例
 app = Flask(__name__)
@@ -35,15 +43,14 @@ def init_users_file():
     """初始化用户数据文件"""
     if not os.path.exists(USERS_FILE):
         # 创建默认管理员账户
-        default_users = pd.DataFrame({
-            'username': ['admin'],
-            'password_hash': [hash_password('admin123')],
-            'email': ['admin@example.com'],
-            'role': ['admin'],
-            'created_at': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            'is_active': [True]
-        })
-        default_users.to_csv(USERS_FILE, index=False)
+        user_directory.write_all([{
+            'username': 'admin',
+            'password_hash': hash_password('admin123'),
+            'email': 'admin@example.com',
+            'role': 'admin',
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'is_active': True
+        }])
 
 def hash_password(password):
     """密码哈希"""
@@ -68,10 +75,7 @@ def get_current_user():
         return None
 
     try:
-        users_df = pd.read_csv(USERS_FILE)
-        user = users_df[users_df['username'] == session['user_id']]
-        if not user.empty:
-            return user.iloc[0].to_dict()
+        return user_directory.get(session['user_id'])
     except:
         pass
     return None
@@ -79,28 +83,26 @@ def get_current_user():
 def create_user(username, password, email, role='user'):
     """创建新用户"""
     try:
-        users_df = pd.read_csv(USERS_FILE)
-
         # 检查用户名是否已存在
-        if not users_df[users_df['username'] == username].empty:
+        if user_directory.exists(username=username):
             return False, "用户名已存在"
 
         # 检查邮箱是否已存在
-        if not users_df[users_df['email'] == email].empty:
+        if user_directory.exists(email=email):
             return False, "邮箱已存在"
 
-        # 添加新用户
-        new_user = pd.DataFrame({
-            'username': [username],
-            'password_hash': [hash_password(password)],
-            'email': [email],
-            'role': [role],
-            'created_at': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            'is_active': [True]
-        })
+        # 添加新用户（追加到用户数据文件）
+        new_user = {
+            'username': username,
+            'password_hash': hash_password(password),
+            'email': email,
+            'role': role,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'is_active': True
+        }
 
-        users_df = pd.concat([users_df, new_user], ignore_index=True)
-        users_df.to_csv(USERS_FILE, index=False)
+        if not user_directory.add(new_user):
+            return False, "用户名或邮箱已存在"
 
         return True, "用户创建成功"
     except Exception as e:
@@ -110,168 +112,89 @@ def create_user(username, password, email, role='user'):
 init_users_file()
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# 配置二维码保存文件夹
-QR_FOLDER = 'static/qr_codes'
-if not os.path.exists(QR_FOLDER):
-    os.makedirs(QR_FOLDER)
-app.config['QR_FOLDER'] = QR_FOLDER
+# 二维码图片地址的签名密钥
+qr_image_cache.secret_key = app.secret_key.encode('utf-8')
 
 def generate_general_qr_code(query_url):
     """
     生成通用查询二维码
+    图片缓存在内存中，相同地址重复生成时不再重新编码；返回的 web_path 按内容区分，各管理员互不覆盖
     """
-    filename = "general_query_qr.png"
-    file_path = os.path.join(app.config['QR_FOLDER'], filename)
-
-    # 确保目录存在
-    os.makedirs(app.config['QR_FOLDER'], exist_ok=True)
-
     try:
-        # 创建二维码实例
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-
-        # 添加数据
-        qr.add_data(query_url)
-        qr.make(fit=True)
-
-        # 生成图片
-        img = qr.make_image(fill_color="black", back_color="white")
-        img.save(file_path)
+        key = qr_image_cache.make_key(query_url)
+        image = qr_image_cache.get(key)
+        filename = f"{image['signature']}.png"
 
         return {
             'query_url': query_url,
             'filename': filename,
-            'file_path': file_path,
-            'web_path': f"/static/qr_codes/{filename}"
+            'web_path': f"/qr/{filename}?{urlencode(qr_image_cache.url_params(key))}"
         }
 
     except Exception as e:
         print(f"❌ 通用二维码生成失败: {e}")
         raise Exception(str(e))
 
-def process_points_accumulation(new_points, daily_stats, user_info_df=None):
+def get_data_owner(user_id=None):
+    """
+    获取数据所属的管理员，为None时使用当前登录用户
+    """
+    if user_id is None:
+        user_id = session.get('user_id', 'default')
+    return user_id
+
+def get_storage():
+    """
+    根据配置获取积分数据存储后端（csv 或 sqlite）
+    """
+    return get_points_storage(
+        config_manager.snapshot.storage.backend,
+        data_dir='data',
+        sqlite_path=config_manager.snapshot.storage.sqlite_path
+    )
+
+def process_points_accumulation(new_points, daily_stats, user_info_df=None, user_id=None, timer=None):
     """
     处理积分累计和过期机制（使用配置参数）
+    user_id: 数据所属的管理员，为None时使用当前登录用户（后台任务中必须指定）
+    timer: 阶段计时器，写入积分存储（含等待写入锁）计入 store 阶段
     """
     from datetime import datetime, timedelta
 
     # 从配置中获取有效期天数
-    validity_days = config_manager.get('points_system.validity_days', 90)
-    points_per_day = config_manager.get('points_system.points_per_day', 1)
+    validity_days = config_manager.snapshot.points_system.validity_days
+    points_per_day = config_manager.snapshot.points_system.points_per_day
 
     # 当前日期
     current_date = datetime.now().date()
     cutoff_date = current_date - timedelta(days=validity_days)
 
-    # 读取当前用户的历史积分记录
-    points_history_file = get_user_data_path('points_history.csv')
-    if os.path.exists(points_history_file):
-        history_df = pd.read_csv(points_history_file)
-        history_df['Date'] = pd.to_datetime(history_df['Date']).dt.date
-        history_df['UserID'] = history_df['UserID'].astype(str)
-    else:
-        # 创建空的历史记录
-        history_df = pd.DataFrame(columns=['UserID', 'Date', 'Points'])
-
-    # 添加新的积分记录（检查重复）
-    new_records = []
-    for _, row in daily_stats.iterrows():
-        user_id = str(row['UserID'])
-        date = row['Date']
-
-        # 检查该用户在该日期是否已有记录
-        existing_record = history_df[
-            (history_df['UserID'] == user_id) &
-            (history_df['Date'] == date)
-        ]
-
-        # 如果没有记录，则添加新记录
-        if existing_record.empty:
-            new_records.append({
-                'UserID': user_id,
-                'Date': date,
-                'Points': points_per_day  # 使用配置的每日积分
-            })
-
-    if new_records:
-        new_df = pd.DataFrame(new_records)
-        history_df = pd.concat([history_df, new_df], ignore_index=True)
-        print(f"✅ 添加了 {len(new_records)} 条新的积分记录")
-
-    # 移除90天前的积分记录
-    history_df = history_df[history_df['Date'] > cutoff_date]
-
-    # 去重（同一用户同一天只能有一条记录）
-    history_df = history_df.drop_duplicates(subset=['UserID', 'Date'], keep='last')
-
-    # 保存更新后的历史记录
-    history_df.to_csv(points_history_file, index=False)
-
-    # 计算每个用户的总积分
-    user_points = history_df.groupby('UserID')['Points'].sum().reset_index()
-    user_points.columns = ['UserID', 'TotalPoints']
-    user_points['UserID'] = user_points['UserID'].astype(str)
-
-    # 添加有效期信息
-    user_points['ValidDays'] = history_df.groupby('UserID').size().reset_index(name='ValidDays')['ValidDays']
-
-    # 处理用户昵称信息 - 修复bug：保留已有用户的昵称
-    user_points_file = get_user_data_path('user_points.csv')
-    existing_user_names = {}
-
-    # 先读取现有的用户积分文件，保留已有的用户昵称
-    if os.path.exists(user_points_file):
-        try:
-            existing_df = pd.read_csv(user_points_file)
-            if 'UserName' in existing_df.columns:
-                existing_df['UserID'] = existing_df['UserID'].astype(str)
-                # 创建现有用户昵称的字典
-                for _, row in existing_df.iterrows():
-                    if pd.notna(row['UserName']) and row['UserName'] != '未知用户':
-                        existing_user_names[str(row['UserID'])] = row['UserName']
-                print(f"📋 保留了 {len(existing_user_names)} 个已有用户的昵称信息")
-        except Exception as e:
-            print(f"⚠️ 读取现有用户昵称失败: {str(e)}")
-
-    # 初始化用户昵称列
-    user_points['UserName'] = '未知用户'
-
-    # 先使用现有的用户昵称
-    for user_id in user_points['UserID']:
-        if user_id in existing_user_names:
-            user_points.loc[user_points['UserID'] == user_id, 'UserName'] = existing_user_names[user_id]
-
-    # 然后用新导入的数据更新用户昵称（如果有的话）
+    # 获取每个用户的最新昵称（只更新新导入文件中存在的用户）
+    user_names = None
     if user_info_df is not None and 'UserName' in user_info_df.columns:
-        # 获取每个用户的最新昵称
-        user_names = user_info_df.groupby('UserID')['UserName'].last().reset_index()
-        user_names['UserID'] = user_names['UserID'].astype(str)
-
-        # 更新用户昵称（只更新新导入文件中存在的用户）
-        for _, row in user_names.iterrows():
-            user_id = str(row['UserID'])
-            user_name = row['UserName']
-            if pd.notna(user_name) and user_name.strip():  # 确保昵称不为空
-                user_points.loc[user_points['UserID'] == user_id, 'UserName'] = user_name.strip()
+        user_names = user_info_df.groupby('UserID')['UserName'].last()
+        user_names.index = user_names.index.astype(str)
+        user_names = user_names.dropna().astype(str).str.strip()
+        user_names = user_names[user_names != '']  # 确保昵称不为空
+
+    # 同一管理员的多个上传任务可能同时执行，累计过程（读取-合并-写回）需要串行
+    data_owner = get_data_owner(user_id)
+    with (timer or StageTimer()).stage('store', len(daily_stats)) as span, tenant_locks.hold(data_owner):
+        user_points = get_storage().accumulate(
+            data_owner, daily_stats, user_names, points_per_day, cutoff_date
+        )
+        span.rows_out = len(user_points)
 
+    if user_names is not None:
         print(f"📋 更新了 {len(user_names)} 个用户的昵称信息")
 
-    # 保存当前用户的积分文件
-    user_points.to_csv(user_points_file, index=False)
-
     return user_points
 
 def get_user_data_path(filename, user_id=None):
     """
     获取用户专属的数据文件路径
     """
-    if user_id is None:
-        user_id = session.get('user_id', 'default')
+    user_id = get_data_owner(user_id)
 
     # 创建用户专属目录
     user_dir = os.path.join('data', user_id)
@@ -292,9 +215,8 @@ def get_system_stats():
         }
 
         # 读取当前用户的积分数据
-        user_points_file = get_user_data_path('user_points.csv')
-        if os.path.exists(user_points_file):
-            user_points = pd.read_csv(user_points_file)
+        user_points = get_storage().get_user_points(get_data_owner())
+        if user_points is not None:
 
             # 总用户数
             stats['total_users'] = len(user_points)
@@ -333,13 +255,18 @@ def extract_date_from_data(df):
         # 如果已经是datetime类型，直接提取日期
         df['Date'] = df[date_column].dt.date
     elif date_column:
-        # 尝试解析时间字符串
-        try:
-            df['Date'] = pd.to_datetime(df[date_column]).dt.date
-        except:
+        # 尝试解析时间字符串（按列推断格式）
+        parsed = parse_datetime_column(df[date_column])
+        if parsed.isna().all():
             # 如果解析失败，使用当前日期
             df['Date'] = datetime.now().date()
             print(f"⚠️ 警告: 无法解析时间列 {date_column}，使用当前日期")
+        else:
+            df['Date'] = parsed.dt.date
+            unparsed = parsed.isna()
+            if unparsed.any():
+                df.loc[unparsed, 'Date'] = datetime.now().date()
+                print(f"⚠️ 警告: 时间列 {date_column} 中有 {int(unparsed.sum())} 行无法解析，使用当前日期")
     else:
         # 没有时间列，检查是否有其他可能的日期列
         possible_date_columns = [col for col in df.columns if '时间' in col or '日期' in col or 'date' in col.lower() or 'time' in col.lower()]
@@ -367,7 +294,7 @@ def process_historical_data(df, cutoff_days=None):
 
     # 如果没有指定天数，从配置中获取
     if cutoff_days is None:
-        cutoff_days = config_manager.get('points_system.validity_days', 90)
+        cutoff_days = config_manager.snapshot.points_system.validity_days
 
     current_date = datetime.now().date()
     cutoff_date = current_date - timedelta(days=cutoff_days)
@@ -469,47 +396,31 @@ def clean_empty_data(df):
 
     return df
 
-def filter_and_paginate_user_points(user_points, page, per_page, search_user_id, search_user_name, min_points, max_points, sort_by, sort_order):
+def filter_and_paginate_user_points(user_points, page, per_page, search_user_id, search_user_name, min_points, max_points,
+                                    sort_by, sort_order, listing_key=None, version=None, after=None, before=None,
+                                    snapshot=False):
     """
     对用户积分数据进行筛选和分页处理
+    listing_key/version: 列表缓存的键和数据版本，相同版本的翻页复用已排序的行号和筛选结果
+    after/before: 翻页游标
+    snapshot: user_points 为上传结果等快照（不是当前管理员的积分数据）时为True，
+              按昵称筛选使用快照自身的昵称，而不是查询当前的积分数据
     """
-    # 转换为DataFrame以便处理
-    df = user_points.copy()
-
-    # 确保有UserName列
-    if 'UserName' not in df.columns:
-        df['UserName'] = '未知用户'
-
-    # 应用筛选条件
-    if search_user_id:
-        df = df[df['UserID'].astype(str).str.contains(search_user_id, case=False, na=False)]
-
-    if search_user_name:
-        df = df[df['UserName'].str.contains(search_user_name, case=False, na=False)]
-
-    if min_points is not None:
-        df = df[df['TotalPoints'] >= min_points]
-
-    if max_points is not None:
-        df = df[df['TotalPoints'] <= max_points]
-
-    # 排序
-    ascending = sort_order == 'asc'
-    if sort_by in df.columns:
-        df = df.sort_values(sort_by, ascending=ascending)
+    if listing_key is None:
+        listing = PointsListing(user_points, version)
+    else:
+        listing = points_listing_cache.get(listing_key, version, lambda: user_points)
 
-    # 计算分页
-    total_records = len(df)
-    total_pages = (total_records + per_page - 1) // per_page
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    paginated_data = df.iloc[start_idx:end_idx]
+    return listing.page(
+        page, per_page, search_user_id, search_user_name, min_points, max_points, sort_by, sort_order,
+        after=after, before=before,
+        match_user_name=listing.match_user_name if snapshot else match_user_name
+    )
 
-    return {
-        'data': paginated_data,
-        'total_records': total_records,
-        'total_pages': total_pages
-    }
+def match_user_name(search_user_name, user_id=None):
+    """按昵称（不区分大小写的子串）查找当前管理员的用户，返回匹配的 UserID，没有数据时返回None"""
+    matched = get_storage().search_users(search_user_name, get_data_owner(user_id))
+    return None if matched is None else matched['UserID']
 
 def detect_column_mapping(columns):
     """
@@ -606,66 +517,107 @@ def detect_column_mapping(columns):
     else:
         return None
 
+# 时长格式表：按旧版逐行解析器的匹配优先级排列
+# (正则, 换算函数) —— 换算函数接收提取出的各分组（float Series），返回分钟数
+DURATION_PATTERNS = [
+    # 格式1: "0小时43分53秒"
+    (r'(\d+)小时(\d+)分(\d+)秒', lambda h, m, s: h * 60 + m + s / 60),
+    # 格式2: "43分53秒"
+    (r'(\d+)分(\d+)秒', lambda m, s: m + s / 60),
+    # 格式3: "1:30:45" (时:分:秒)
+    (r'(\d+):(\d+):(\d+)', lambda h, m, s: h * 60 + m + s / 60),
+    # 格式4: "90:30" (分:秒)
+    (r'(\d+):(\d+)', lambda m, s: m + s / 60),
+    # 格式5: "90分钟" 或 "90分"
+    (r'(\d+)分', lambda m: m),
+]
+
 def parse_duration_column(duration_series):
     """
     解析时长列，支持多种格式
     例如：'0小时43分53秒', '1:30:45', '90分钟' 等
-    """
-    import re
 
-    def parse_single_duration(duration_str):
-        if pd.isna(duration_str):
-            return None
-
-        duration_str = str(duration_str).strip()
-
-        # 格式1: "0小时43分53秒"
-        chinese_pattern = r'(\d+)小时(\d+)分(\d+)秒'
-        match = re.search(chinese_pattern, duration_str)
-        if match:
-            hours, minutes, seconds = map(int, match.groups())
-            return hours * 60 + minutes + seconds / 60
-
-        # 格式2: "43分53秒"
-        chinese_pattern2 = r'(\d+)分(\d+)秒'
-        match = re.search(chinese_pattern2, duration_str)
-        if match:
-            minutes, seconds = map(int, match.groups())
-            return minutes + seconds / 60
-
-        # 格式3: "1:30:45" (时:分:秒)
-        time_pattern = r'(\d+):(\d+):(\d+)'
-        match = re.search(time_pattern, duration_str)
-        if match:
-            hours, minutes, seconds = map(int, match.groups())
-            return hours * 60 + minutes + seconds / 60
-
-        # 格式4: "90:30" (分:秒)
-        time_pattern2 = r'(\d+):(\d+)'
-        match = re.search(time_pattern2, duration_str)
-        if match:
-            minutes, seconds = map(int, match.groups())
-            return minutes + seconds / 60
-
-        # 格式5: "90分钟" 或 "90分"
-        minute_pattern = r'(\d+)分'
-        match = re.search(minute_pattern, duration_str)
-        if match:
-            minutes = int(match.group(1))
-            return minutes
-
-        # 格式6: 纯数字（假设为分钟）
-        if duration_str.isdigit():
-            return float(duration_str)
-
-        # 无法解析
+    按整列向量化处理：先对列去重（factorize），每种格式只对尚未解析的
+    唯一值执行一次 str.extract，再按编码回填到各行。
+    结果与逐行 re.search 的旧实现完全一致，无法解析的行返回 NaN
+    """
+    # 导出数据中时长取值大量重复，只需解析唯一值（空值编码为 -1）
+    # 非纯文本的 object 列（如 Excel 中混合的 45 和 45.0）先转为字符串再去重：
+    # factorize 会把 45 和 45.0 视为同一个值，而旧实现按 str() 区分（'45' 可解析，'45.0' 不能）
+    keys = duration_series
+    if keys.dtype == object and pd.api.types.infer_dtype(keys, skipna=True) != 'string':
+        keys = keys.where(keys.isna(), keys.astype(str))
+    codes, uniques = pd.factorize(keys)
+    values = np.full(len(uniques), np.nan)
+
+    text = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    text = text.astype(str).str.strip()
+
+    for pattern, to_minutes in DURATION_PATTERNS:
+        if text.empty:
+            break
+
+        parts = text.str.extract(pattern)
+        matched = parts[0].notna().to_numpy()
+        if matched.any():
+            groups = [parts[col][matched].astype('float64') for col in parts.columns]
+            values[text.index[matched]] = to_minutes(*groups).to_numpy()
+            text = text[~matched]
+
+    # 格式6: 纯数字（假设为分钟）
+    if not text.empty:
+        digits = text[text.str.isdigit().to_numpy(dtype=bool)]
+        if not digits.empty:
+            values[digits.index] = digits.map(float).to_numpy()
+
+    # 按编码回填，空值行保持 NaN
+    parsed = np.append(values, np.nan)[codes]
+    return pd.Series(parsed, index=duration_series.index, dtype='float64')
+
+# 常见的时间格式列表（按优先级排列）
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',      # 2023-03-10 17:05:35
+    '%Y/%m/%d %H:%M:%S',      # 2023/03/10 17:05:35
+    '%Y-%m-%d %H:%M',         # 2023-03-10 17:05
+    '%Y/%m/%d %H:%M',         # 2023/03/10 17:05
+    '%Y-%m-%d',               # 2023-03-10
+    '%Y/%m/%d',               # 2023/03/10
+    '%m/%d/%Y %H:%M:%S',      # 03/10/2023 17:05:35
+    '%m-%d-%Y %H:%M:%S',      # 03-10-2023 17:05:35
+    '%d/%m/%Y %H:%M:%S',      # 10/03/2023 17:05:35
+    '%d-%m-%Y %H:%M:%S',      # 10-03-2023 17:05:35
+]
+
+# 推断列格式时采样的行数
+DATETIME_SAMPLE_SIZE = 200
+
+def detect_datetime_format(text_series, sample_size=DATETIME_SAMPLE_SIZE):
+    """
+    根据采样推断整列的时间格式
+    返回能解析全部样本的第一个格式；若没有，返回解析成功数最多的格式；都失败返回None
+    """
+    sample = text_series.head(sample_size)
+    if sample.empty:
         return None
 
-    return duration_series.apply(parse_single_duration)
+    best_format = None
+    best_count = 0
+    for fmt in DATETIME_FORMATS:
+        parsed_count = int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        if parsed_count == len(sample):
+            return fmt
+        if parsed_count > best_count:
+            best_format = fmt
+            best_count = parsed_count
+
+    return best_format
 
 def parse_datetime_column(datetime_series):
     """
     解析时间列，支持多种时间格式
+
+    先从样本推断整列格式，用一次向量化的 pd.to_datetime(format=...) 转换整列，
+    只有转换失败的行才逐行尝试其他格式
     """
     def parse_single_datetime(datetime_str):
         if pd.isna(datetime_str):
@@ -673,109 +625,384 @@ def parse_datetime_column(datetime_series):
 
         datetime_str = str(datetime_str).strip()
 
-        # 常见的时间格式列表
-        time_formats = [
-            '%Y-%m-%d %H:%M:%S',      # 2023-03-10 17:05:35
-            '%Y/%m/%d %H:%M:%S',      # 2023/03/10 17:05:35
-            '%Y-%m-%d %H:%M',         # 2023-03-10 17:05
-            '%Y/%m/%d %H:%M',         # 2023/03/10 17:05
-            '%Y-%m-%d',               # 2023-03-10
-            '%Y/%m/%d',               # 2023/03/10
-            '%m/%d/%Y %H:%M:%S',      # 03/10/2023 17:05:35
-            '%m-%d-%Y %H:%M:%S',      # 03-10-2023 17:05:35
-            '%d/%m/%Y %H:%M:%S',      # 10/03/2023 17:05:35
-            '%d-%m-%Y %H:%M:%S',      # 10-03-2023 17:05:35
-        ]
-
         # 尝试各种格式
-        for fmt in time_formats:
+        for fmt in DATETIME_FORMATS:
             try:
                 return pd.to_datetime(datetime_str, format=fmt)
-            except:
+            except (ValueError, TypeError):
                 continue
 
         # 如果所有格式都失败，尝试pandas的智能解析
         try:
             return pd.to_datetime(datetime_str, errors='coerce')
-        except:
+        except (ValueError, TypeError, OverflowError):
             return None
 
-    return datetime_series.apply(parse_single_datetime)
+    # 已经是时间类型（如Excel读取的单元格），无需解析
+    if pd.api.types.is_datetime64_any_dtype(datetime_series):
+        return datetime_series
+
+    not_null = datetime_series.notna()
+    text = datetime_series[not_null].astype(str).str.strip()
+
+    result = pd.Series(pd.NaT, index=datetime_series.index, dtype='datetime64[ns]')
+    if text.empty:
+        return result
+
+    # 1. 推断格式并整列转换
+    column_format = detect_datetime_format(text)
+    if column_format:
+        parsed = pd.to_datetime(text, format=column_format, errors='coerce')
+    else:
+        parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
 
-def process_uploaded_file(file_path):
+    # 2. 仅对转换失败的行逐行回退解析
+    failed = parsed.isna()
+    if failed.any():
+        fallback = pd.to_datetime(text[failed].apply(parse_single_datetime), errors='coerce')
+        parsed = parsed.where(~failed, fallback)
+        print(f"🕒 时间列格式 {column_format}: {int((~failed).sum())} 行批量解析, {int(failed.sum())} 行逐行解析")
+
+    result[not_null] = parsed.to_numpy()
+    return result
+
+def calculate_duration(df):
     """
-    处理上传的文件，支持 CSV、Excel 等格式，计算积分
+    计算已重命名为标准列名的数据的观看时长（分钟）
+    返回 (df, error_message)，成功时 error_message 为 None
+    """
+    df['UserID'] = df['UserID'].astype(str)
+
+    # 处理时长数据 - 支持两种方式
+    if 'Duration' in df.columns:
+        # 方式1：直接使用观看时长列
+        df['Duration'] = parse_duration_column(df['Duration'])
+        # 移除时长解析失败的行
+        df = df.dropna(subset=['Duration'])
+    else:
+        # 方式2：使用开始和结束时间计算时长
+        df['StartTime'] = parse_datetime_column(df['StartTime'])
+        df['EndTime'] = parse_datetime_column(df['EndTime'])
+
+        # 移除时间解析失败的行
+        df = df.dropna(subset=['StartTime', 'EndTime'])
+
+        if df.empty:
+            return df, '时间数据格式错误，无法解析开始时间和结束时间'
+
+        df['Duration'] = (df['EndTime'] - df['StartTime']).dt.total_seconds() / 60
+
+    if df.empty:
+        return df, '无法解析时长数据，请检查数据格式'
+
+    return df, None
+
+def get_csv_separator(file_extension):
+    """
+    获取可流式读取的文本格式的分隔符，其他格式返回None
+    """
+    return {'.csv': ',', '.tsv': '\t'}.get(file_extension)
+
+def read_upload_header(file_path, file_extension):
+    """
+    只读取上传文件的表头，返回原始列名列表
+    JSON 文件无法单独读取表头，返回None
+    """
+    if file_extension in ['.csv', '.tsv']:
+        sep = get_csv_separator(file_extension)
+        return list(pd.read_csv(file_path, sep=sep, encoding='utf-8-sig', nrows=0).columns)
+    elif file_extension in ['.xlsx', '.xls']:
+        return list(pd.read_excel(file_path, nrows=0).columns)
+    return None
+
+def get_mapped_read_options(header_columns, column_mapping):
+    """
+    根据列名映射生成第二阶段读取参数
+    返回 (usecols, dtype)：只读取识别出的列，并全部按字符串读取
+    （用户ID保持原样，时长和时间交由各自的解析函数处理）
     """
+    usecols = [col for col in header_columns if str(col).strip() in column_mapping]
+    dtype = {col: str for col in usecols}
+    return usecols, dtype
+
+def read_uploaded_file(file_path, file_extension):
+    """
+    两阶段读取上传文件：先只读取表头识别列名，再只读取识别出的列
+    返回 (df, column_mapping, header_columns)，无法识别表格结构时 df 为None
+    """
+    header_columns = read_upload_header(file_path, file_extension)
+
+    if header_columns is None:
+        # JSON 只能整体读取，读取后立即裁剪列
+        df = pd.read_json(file_path, dtype=False)
+        header_columns = list(df.columns)
+    else:
+        df = None
+
+    column_mapping = detect_column_mapping([str(col) for col in header_columns])
+    if not column_mapping:
+        return None, None, header_columns
+
+    usecols, dtype = get_mapped_read_options(header_columns, column_mapping)
+
+    if df is not None:
+        df = df[usecols]
+        df = df.astype(dtype).where(df.notna())
+    elif file_extension in ['.csv', '.tsv']:
+        sep = get_csv_separator(file_extension)
+        df = pd.read_csv(file_path, sep=sep, encoding='utf-8-sig', usecols=usecols, dtype=dtype)
+    else:
+        df = pd.read_excel(file_path, usecols=usecols, dtype=dtype)
+
+    df.columns = [str(col).strip() for col in df.columns]
+    return df, column_mapping, header_columns
+
+def should_stream_upload(file_path):
+    """
+    判断上传文件是否使用分块流式导入（仅 CSV/TSV 且超过配置的大小阈值）
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if get_csv_separator(file_extension) is None:
+        return False
+
+    threshold_mb = config_manager.snapshot.data_processing.streaming_threshold_mb
+    return os.path.getsize(file_path) >= threshold_mb * 1024 * 1024
+
+def estimate_csv_rows(file_path, sample_bytes=1024 * 1024):
+    """
+    根据文件开头的采样估算文本文件的数据行数（用于进度显示）
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+
+    line_count = sample.count(b'\n')
+    if line_count == 0:
+        return None
+    if len(sample) >= file_size:
+        return max(line_count - 1, 0)
+
+    return max(int(file_size / (len(sample) / line_count)) - 1, 0)
+
+def process_uploaded_file_streaming(file_path, user_id=None, progress=None, timer=None):
+    """
+    分块流式处理大型 CSV/TSV 文件
+
+    按 data_processing.batch_size 行分块读取，每块立即完成时长筛选和日期提取，
+    只保留 (UserID, Date) 去重集合和用户最新昵称，内存占用与文件大小无关；
+    各分块的阶段计时累计到同一阶段
+    """
+    progress = progress or report_no_progress
+    timer = timer or StageTimer()
+
     try:
-        # 根据文件扩展名选择读取方法
         file_extension = os.path.splitext(file_path)[1].lower()
-
-        if file_extension == '.csv':
-            df = pd.read_csv(file_path, encoding='utf-8-sig')
-        elif file_extension in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path)
-        elif file_extension == '.json':
-            df = pd.read_json(file_path)
-        elif file_extension == '.tsv':
-            df = pd.read_csv(file_path, sep='\t', encoding='utf-8-sig')
-        else:
+        sep = get_csv_separator(file_extension)
+        batch_size = config_manager.snapshot.data_processing.batch_size
+        min_duration = config_manager.snapshot.points_system.min_duration_minutes
+        validity_days = config_manager.snapshot.points_system.validity_days
+
+        # 只读取表头识别列名
+        header_columns = read_upload_header(file_path, file_extension)
+        column_mapping = detect_column_mapping([str(col) for col in header_columns])
+        if not column_mapping:
             return {
                 'success': False,
-                'error': f'不支持的文件格式: {file_extension}。支持的格式: .csv, .xlsx, .xls, .json, .tsv'
+                'error': f'无法识别表格结构。请确保包含用户ID、开始时间、结束时间相关的列。\n当前列名: {header_columns}'
             }
 
-        print(f"📊 原始文件读取: {len(df)} 行")
+        daily_pairs = set()
+        user_names = {}
+        total_rows = 0
+        parsed_rows = 0
+        qualified_rows = 0
+        last_error = None
+
+        # 只读取识别出的列，并全部按字符串读取，避免各分块推断出不同的类型
+        usecols, dtype = get_mapped_read_options(header_columns, column_mapping)
+        estimated_rows = estimate_csv_rows(file_path)
+        progress('read', 0, estimated_rows)
+
+        reader = iter(pd.read_csv(file_path, sep=sep, encoding='utf-8-sig', chunksize=batch_size,
+                                  usecols=usecols, dtype=dtype))
+        while True:
+            with timer.stage('read') as span:
+                chunk = next(reader, None)
+                span.rows_out = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                break
+
+            total_rows += len(chunk)
+            progress('parse', total_rows, max(estimated_rows or 0, total_rows))
+
+            # 转换为标准列名
+            with timer.stage('map', len(chunk)) as span:
+                chunk = chunk.rename(columns=lambda col: column_mapping[str(col).strip()])
+                span.rows_out = len(chunk)
+
+            # 清理空字符串，删除用户ID为空的行
+            with timer.stage('clean', len(chunk)) as span:
+                chunk = chunk.replace(r'^\s*$', pd.NA, regex=True)
+                chunk = chunk.dropna(subset=['UserID'])
+                span.rows_out = len(chunk)
+            if chunk.empty:
+                continue
+
+            parse_stage = 'parse_duration' if 'Duration' in chunk.columns else 'parse_datetime'
+            with timer.stage(parse_stage, len(chunk)) as span:
+                chunk, last_error = calculate_duration(chunk)
+                span.rows_out = len(chunk)
+            if last_error:
+                continue
+            parsed_rows += len(chunk)
 
-        # 清理空数据和无效行
-        df = clean_empty_data(df)
+            # 筛选大于等于配置时长的记录
+            with timer.stage('filter', len(chunk)) as span:
+                chunk = chunk[chunk['Duration'] >= min_duration].copy()
+                span.rows_out = len(chunk)
+            if chunk.empty:
+                continue
+            qualified_rows += len(chunk)
 
-        if df.empty:
+            with timer.stage('extract_date', len(chunk)) as span:
+                chunk = extract_date_from_data(chunk)
+                chunk = process_historical_data(chunk)
+                span.rows_out = len(chunk)
+            if chunk.empty:
+                continue
+
+            # 立即归约为 (UserID, Date) 集合
+            daily_pairs.update(zip(chunk['UserID'], chunk['Date']))
+
+            if 'UserName' in chunk.columns:
+                names = chunk.dropna(subset=['UserName']).groupby('UserID')['UserName'].last()
+                user_names.update(names.to_dict())
+
+        print(f"📊 流式导入完成: 读取 {total_rows} 行, 有效 (用户, 日期) {len(daily_pairs)} 组")
+
+        if total_rows == 0:
             return {
                 'success': False,
                 'error': '文件中没有有效数据，请检查文件内容'
             }
 
-        # 智能识别列名，支持多种表头格式
-        column_mapping = detect_column_mapping(df.columns)
-        if not column_mapping:
+        if parsed_rows == 0:
             return {
                 'success': False,
-                'error': f'无法识别表格结构。请确保包含用户ID、开始时间、结束时间相关的列。\n当前列名: {list(df.columns)}'
+                'error': last_error or '无法解析时长数据，请检查数据格式'
             }
 
-        # 重命名列为标准格式
-        df = df.rename(columns=column_mapping)
+        if qualified_rows == 0:
+            return {
+                'success': False,
+                'error': f'没有找到持续时长大于等于{min_duration}分钟的直播记录'
+            }
 
-        # 处理数据
-        try:
-            df['UserID'] = df['UserID'].astype(str)
-
-            # 处理时长数据 - 支持两种方式
-            if 'Duration' in df.columns:
-                # 方式1：直接使用观看时长列
-                df['Duration'] = parse_duration_column(df['Duration'])
-                # 移除时长解析失败的行
-                df = df.dropna(subset=['Duration'])
-            else:
-                # 方式2：使用开始和结束时间计算时长
-                df['StartTime'] = parse_datetime_column(df['StartTime'])
-                df['EndTime'] = parse_datetime_column(df['EndTime'])
+        if not daily_pairs:
+            return {
+                'success': False,
+                'error': f'所有数据都超过了{validity_days}天有效期，无法获得积分'
+            }
 
-                # 移除时间解析失败的行
-                df = df.dropna(subset=['StartTime', 'EndTime'])
+        # 处理积分累计和过期
+        progress('accumulate', total_rows, total_rows)
+        with timer.stage('accumulate', len(daily_pairs)) as span:
+            daily_stats = pd.DataFrame(list(daily_pairs), columns=['UserID', 'Date'])
+            daily_stats['Count'] = 1
+            new_points = daily_stats.groupby('UserID').size().reset_index(name='NewPoints')
+
+            user_info_df = None
+            if user_names:
+                user_info_df = pd.DataFrame({
+                    'UserID': list(user_names.keys()),
+                    'UserName': list(user_names.values())
+                })
+            span.rows_out = len(daily_stats)
 
-                if df.empty:
-                    return {
-                        'success': False,
-                        'error': '时间数据格式错误，无法解析开始时间和结束时间'
-                    }
+        user_points = process_points_accumulation(new_points, daily_stats, user_info_df, user_id, timer)
 
-                df['Duration'] = (df['EndTime'] - df['StartTime']).dt.total_seconds() / 60
+        return {
+            'success': True,
+            'user_points': user_points,
+            'total_users': len(user_points)
+        }
 
-            if df.empty:
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def report_no_progress(stage, rows_processed=None, rows_total=None):
+    """默认的进度回调（不记录进度）"""
+    pass
+
+def process_uploaded_file(file_path, user_id=None, progress=None, timer=None):
+    """
+    处理上传的文件，支持 CSV、Excel 等格式，计算积分
+    user_id: 数据所属的管理员，为None时使用当前登录用户（后台任务中必须指定）
+    progress: 进度回调 progress(stage, rows_processed, rows_total)，行数未知时不传
+    timer: 阶段计时器（StageTimer），记录各阶段耗时、行数和内存峰值
+    """
+    # 大型 CSV/TSV 文件使用分块流式导入
+    if should_stream_upload(file_path):
+        return process_uploaded_file_streaming(file_path, user_id, progress, timer)
+
+    progress = progress or report_no_progress
+    timer = timer or StageTimer()
+
+    try:
+        file_extension = os.path.splitext(file_path)[1].lower()
+
+        if file_extension not in ['.csv', '.xlsx', '.xls', '.json', '.tsv']:
+            return {
+                'success': False,
+                'error': f'不支持的文件格式: {file_extension}。支持的格式: .csv, .xlsx, .xls, .json, .tsv'
+            }
+
+        # 两阶段读取：先根据表头智能识别列名，再只读取识别出的列
+        progress('read')
+        with timer.stage('read') as span:
+            df, column_mapping, header_columns = read_uploaded_file(file_path, file_extension)
+            span.rows_out = None if df is None else len(df)
+        if df is None:
+            return {
+                'success': False,
+                'error': f'无法识别表格结构。请确保包含用户ID、开始时间、结束时间相关的列。\n当前列名: {header_columns}'
+            }
+
+        print(f"📊 原始文件读取: {len(df)} 行, 使用 {len(df.columns)}/{len(header_columns)} 列")
+        total_rows = len(df)
+
+        # 清理空数据和无效行
+        # 整表处理时各阶段没有逐行进度，只报告阶段和总行数（已处理行数和剩余时间为空）
+        progress('clean', rows_total=total_rows)
+        with timer.stage('clean', total_rows) as span:
+            df = clean_empty_data(df)
+            span.rows_out = len(df)
+
+        if df.empty:
+            return {
+                'success': False,
+                'error': '文件中没有有效数据，请检查文件内容'
+            }
+
+        # 重命名列为标准格式
+        with timer.stage('map', len(df)) as span:
+            df = df.rename(columns=column_mapping)
+            span.rows_out = len(df)
+
+        # 处理数据
+        try:
+            progress('parse')
+            parse_stage = 'parse_duration' if 'Duration' in df.columns else 'parse_datetime'
+            with timer.stage(parse_stage, len(df)) as span:
+                df, error = calculate_duration(df)
+                span.rows_out = len(df)
+            if error:
                 return {
                     'success': False,
-                    'error': '无法解析时长数据，请检查数据格式'
+                    'error': error
                 }
 
         except Exception as e:
@@ -785,10 +1012,13 @@ def process_uploaded_file(file_path):
             }
 
         # 从配置中获取最小有效时长
-        min_duration = config_manager.get('points_system.min_duration_minutes', 40)
+        min_duration = config_manager.snapshot.points_system.min_duration_minutes
 
         # 筛选大于等于配置时长的记录
-        filtered_df = df[df['Duration'] >= min_duration].copy()
+        progress('filter')
+        with timer.stage('filter', len(df)) as span:
+            filtered_df = df[df['Duration'] >= min_duration].copy()
+            span.rows_out = len(filtered_df)
 
         if filtered_df.empty:
             return {
@@ -796,12 +1026,12 @@ def process_uploaded_file(file_path):
                 'error': f'没有找到持续时长大于等于{min_duration}分钟的直播记录'
             }
 
-        # 提取日期信息（支持历史数据）
-        filtered_df = extract_date_from_data(filtered_df)
-
-        # 处理历史数据（过滤超过有效期的数据）
-        validity_days = config_manager.get('points_system.validity_days', 90)
-        filtered_df = process_historical_data(filtered_df)
+        # 提取日期信息（支持历史数据），并过滤超过有效期的数据
+        validity_days = config_manager.snapshot.points_system.validity_days
+        with timer.stage('extract_date', len(filtered_df)) as span:
+            filtered_df = extract_date_from_data(filtered_df)
+            filtered_df = process_historical_data(filtered_df)
+            span.rows_out = len(filtered_df)
 
         if filtered_df.empty:
             return {
@@ -809,12 +1039,15 @@ def process_uploaded_file(file_path):
                 'error': f'所有数据都超过了{validity_days}天有效期，无法获得积分'
             }
 
-        daily_stats = filtered_df.groupby(['UserID', 'Date']).size().reset_index(name='Count')
-        new_points = daily_stats.groupby('UserID').size().reset_index(name='NewPoints')
-        new_points['UserID'] = new_points['UserID'].astype(str)
-
         # 处理积分累计和过期
-        user_points = process_points_accumulation(new_points, daily_stats, filtered_df)
+        progress('accumulate')
+        with timer.stage('accumulate', len(filtered_df)) as span:
+            daily_stats = filtered_df.groupby(['UserID', 'Date']).size().reset_index(name='Count')
+            new_points = daily_stats.groupby('UserID').size().reset_index(name='NewPoints')
+            new_points['UserID'] = new_points['UserID'].astype(str)
+            span.rows_out = len(daily_stats)
+
+        user_points = process_points_accumulation(new_points, daily_stats, filtered_df, user_id, timer)
 
         return {
             'success': True,
@@ -842,15 +1075,12 @@ def login():
             return render_template('login.html')
 
         try:
-            users_df = pd.read_csv(USERS_FILE)
-            user = users_df[users_df['username'] == username]
+            user_data = user_directory.get(username)
 
-            if user.empty:
+            if user_data is None:
                 flash('用户名不存在', 'error')
                 return render_template('login.html')
 
-            user_data = user.iloc[0]
-
             if not user_data['is_active']:
                 flash('账户已被禁用', 'error')
                 return render_template('login.html')
@@ -924,9 +1154,9 @@ def home():
         stats = get_system_stats()
 
         # 获取配置参数用于显示
-        validity_days = config_manager.get('points_system.validity_days', 90)
-        min_duration = config_manager.get('points_system.min_duration_minutes', 40)
-        points_per_day = config_manager.get('points_system.points_per_day', 1)
+        validity_days = config_manager.snapshot.points_system.validity_days
+        min_duration = config_manager.snapshot.points_system.min_duration_minutes
+        points_per_day = config_manager.snapshot.points_system.points_per_day
 
         return render_template('index.html',
                              stats=stats,
@@ -941,14 +1171,121 @@ def home():
                              min_duration=40,
                              points_per_day=1)
 
+def run_upload_job(job, file_path, user_id, query_url):
+    """
+    在后台上传任务中执行完整处理流程（不能访问 session 和 request）
+    """
+    timer = StageTimer()
+    result = {'success': False}
+    try:
+        result = process_uploaded_file(file_path, user_id=user_id, progress=job.update, timer=timer)
+        if not result['success']:
+            return result
+
+        # 生成通用查询二维码
+        job.update('qr')
+        result['general_qr'] = None
+        with timer.stage('qr'):
+            try:
+                result['general_qr'] = generate_general_qr_code(query_url)
+            except Exception as e:
+                result['qr_error'] = f'通用二维码生成失败: {str(e)}'
+
+        result['upload_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # 将用户积分表保存到服务器端，结果页和筛选/分页请求通过结果ID读取
+        user_points = result.pop('user_points')
+        with timer.stage('write', len(user_points)) as span:
+            result['result_id'] = upload_result_store.save(user_id, {
+                'filename': job.filename,
+                'total_users': result['total_users'],
+                'general_qr': result.get('general_qr'),
+                'upload_time': result['upload_time']
+            }, user_points)
+            span.rows_out = len(user_points)
+
+        # 所有阶段结束后再记录耗时，结果页包含保存结果阶段
+        result['timings'] = timer.to_list()
+        upload_result_store.update_summary(result['result_id'], user_id, timings=result['timings'])
+        return result
+    finally:
+        # 成功或失败都输出一行阶段耗时日志，并计入运行指标
+        success = result.get('success', False)
+        timer.log(job_id=job.job_id, owner=user_id, filename=job.filename, success=success)
+        read_stage = timer.records.get('read')
+        observe_upload(success, (read_stage.rows_out or 0) if read_stage else 0, timer.total_seconds(), timer.to_list())
+
+def get_upload_filter_params():
+    """
+    获取上传结果页的分页和筛选参数
+    """
+    return {
+        'page': request.args.get('page', 1, type=int),
+        'per_page': request.args.get('per_page', 10, type=int),
+        'search_user_id': request.args.get('search_user_id', '').strip(),
+        'search_user_name': request.args.get('search_user_name', '').strip(),
+        'min_points': request.args.get('min_points', type=int),
+        'max_points': request.args.get('max_points', type=int),
+        'sort_by': request.args.get('sort_by', 'TotalPoints'),
+        'sort_order': request.args.get('sort_order', 'desc'),
+        'after': request.args.get('after'),
+        'before': request.args.get('before')
+    }
+
+def render_upload_result(last_result, user_points, current_user=None, result_id=None):
+    """
+    渲染上传结果页（含分页和筛选）
+    result_id: 上传结果ID，结果内容不会变化，同一结果的翻页复用已排序的列表
+    """
+    params = get_upload_filter_params()
+    per_page = params['per_page']
+
+    # 处理用户积分数据的分页和筛选
+    filtered_user_points = filter_and_paginate_user_points(
+        user_points, params['page'], per_page, params['search_user_id'], params['search_user_name'],
+        params['min_points'], params['max_points'], params['sort_by'], params['sort_order'],
+        listing_key=('upload', result_id) if result_id else None, version=result_id,
+        after=params['after'], before=params['before'], snapshot=True
+    )
+    page = filtered_user_points['page']
+
+    return render_template('admin_upload_combined.html',
+                         show_results=True,
+                         upload_result={
+                             'filename': last_result['filename'],
+                             'total_users': last_result['total_users'],
+                             'user_points': filtered_user_points['data'],
+                             'total_records': filtered_user_points['total_records'],
+                             'total_pages': filtered_user_points['total_pages'],
+                             'current_page': page,
+                             'per_page': per_page,
+                             'next_cursor': filtered_user_points['next_cursor'],
+                             'prev_cursor': filtered_user_points['prev_cursor'],
+                             'general_qr': last_result.get('general_qr'),
+                             'upload_time': last_result['upload_time'],
+                             'timings': last_result.get('timings'),
+                             'search_params': {
+                                 'search_user_id': params['search_user_id'],
+                                 'search_user_name': params['search_user_name'],
+                                 'min_points': params['min_points'],
+                                 'max_points': params['max_points'],
+                                 'sort_by': params['sort_by'],
+                                 'sort_order': params['sort_order']
+                             }
+                         },
+                         current_user=current_user,
+                         min_duration=config_manager.snapshot.points_system.min_duration_minutes,
+                         points_per_day=config_manager.snapshot.points_system.points_per_day,
+                         validity_days=config_manager.snapshot.points_system.validity_days)
+
 # 管理员上传页面路由
 @app.route('/admin/upload', methods=['GET', 'POST'])
 @login_required
 def admin_upload():
     """
     管理员上传页面
-    GET: 显示上传表单或处理筛选/分页
-    POST: 处理文件上传
+    GET: 显示上传表单、上传任务进度/结果，或处理筛选/分页
+    POST: 保存上传文件并提交后台处理任务
     """
     if request.method == 'GET':
         # 检查是否刚刚登录
@@ -957,9 +1294,49 @@ def admin_upload():
 
         # 检查是否需要清除session
         if request.args.get('clear_session'):
-            session.pop('last_upload_result', None)
+            session.pop('last_upload_id', None)
             return redirect(url_for('admin_upload'))
 
+        # 查看上传任务的进度或结果
+        job_id = request.args.get('job_id')
+        if job_id:
+            job = upload_job_manager.get(job_id, session['user_id'])
+
+            if job is None:
+                flash('上传任务不存在或已过期', 'error')
+                return redirect(url_for('admin_upload'))
+
+            if job.status == 'failed':
+                flash(f'处理失败: {job.error}', 'error')
+                return redirect(url_for('admin_upload'))
+
+            if job.status != 'done':
+                # 任务处理中，显示进度
+                return render_template('admin_upload_combined.html',
+                                     show_results=False,
+                                     upload_result=None,
+                                     upload_job=job.to_dict(),
+                                     current_user=current_user,
+                                     min_duration=config_manager.snapshot.points_system.min_duration_minutes,
+                                     points_per_day=config_manager.snapshot.points_system.points_per_day,
+                                     validity_days=config_manager.snapshot.points_system.validity_days)
+
+            result = job.result
+            qr_error = result.pop('qr_error', None)
+            if qr_error:
+                flash(qr_error, 'error')
+
+            stored_result = upload_result_store.load(result['result_id'], session['user_id'])
+            if stored_result is None:
+                flash('上传结果不存在或已过期', 'error')
+                return redirect(url_for('admin_upload'))
+
+            # session中只保存结果ID，以便后续筛选使用
+            session['last_upload_id'] = result['result_id']
+
+            last_result, user_points = stored_result
+            return render_upload_result(last_result, user_points, current_user, result['result_id'])
+
         # 检查是否有筛选参数，如果有则说明是在筛选结果
         has_filter_params = any([
             request.args.get('page'),
@@ -972,58 +1349,21 @@ def admin_upload():
             request.args.get('sort_order')
         ])
 
-        # 如果有筛选参数且session中有上传结果数据，则处理筛选
-        if has_filter_params and 'last_upload_result' in session:
+        # 如果有筛选参数且session中有上传结果ID，则处理筛选
+        if has_filter_params and 'last_upload_id' in session:
             try:
-                # 从session中获取上传结果数据
-                last_result = session['last_upload_result']
-                user_points = pd.DataFrame(last_result['user_points_data'])
-
-                # 获取分页和筛选参数
-                page = request.args.get('page', 1, type=int)
-                per_page = request.args.get('per_page', 10, type=int)
-                search_user_id = request.args.get('search_user_id', '').strip()
-                search_user_name = request.args.get('search_user_name', '').strip()
-                min_points = request.args.get('min_points', type=int)
-                max_points = request.args.get('max_points', type=int)
-                sort_by = request.args.get('sort_by', 'TotalPoints')
-                sort_order = request.args.get('sort_order', 'desc')
-
-                # 处理用户积分数据的分页和筛选
-                filtered_user_points = filter_and_paginate_user_points(
-                    user_points, page, per_page, search_user_id, search_user_name,
-                    min_points, max_points, sort_by, sort_order
-                )
-
-                return render_template('admin_upload_combined.html',
-                                     show_results=True,
-                                     upload_result={
-                                         'filename': last_result['filename'],
-                                         'total_users': last_result['total_users'],
-                                         'user_points': filtered_user_points['data'],
-                                         'total_records': filtered_user_points['total_records'],
-                                         'total_pages': filtered_user_points['total_pages'],
-                                         'current_page': page,
-                                         'per_page': per_page,
-                                         'general_qr': last_result.get('general_qr'),
-                                         'upload_time': last_result['upload_time'],
-                                         'search_params': {
-                                             'search_user_id': search_user_id,
-                                             'search_user_name': search_user_name,
-                                             'min_points': min_points,
-                                             'max_points': max_points,
-                                             'sort_by': sort_by,
-                                             'sort_order': sort_order
-                                         }
-                                     },
-                                     current_user=current_user,
-                                     min_duration=config_manager.get('points_system.min_duration_minutes', 40),
-                                     points_per_day=config_manager.get('points_system.points_per_day', 1),
-                                     validity_days=config_manager.get('points_system.validity_days', 90))
+                # 从服务器端结果存储中读取上传结果
+                stored_result = upload_result_store.load(session['last_upload_id'], session['user_id'])
+                if stored_result is not None:
+                    last_result, user_points = stored_result
+                    return render_upload_result(last_result, user_points, current_user, session['last_upload_id'])
+
+                # 结果已过期，清除session数据并显示上传表单
+                session.pop('last_upload_id', None)
             except Exception as e:
                 print(f"处理筛选参数失败: {str(e)}")
                 # 如果处理失败，清除session数据并显示上传表单
-                session.pop('last_upload_result', None)
+                session.pop('last_upload_id', None)
 
         # 默认显示上传表单
         return render_template('admin_upload_combined.html',
@@ -1031,9 +1371,9 @@ def admin_upload():
                              upload_result=None,
                              just_logged_in=just_logged_in,
                              current_user=current_user,
-                             min_duration=config_manager.get('points_system.min_duration_minutes', 40),
-                             points_per_day=config_manager.get('points_system.points_per_day', 1),
-                             validity_days=config_manager.get('points_system.validity_days', 90))
+                             min_duration=config_manager.snapshot.points_system.min_duration_minutes,
+                             points_per_day=config_manager.snapshot.points_system.points_per_day,
+                             validity_days=config_manager.snapshot.points_system.validity_days)
 
     elif request.method == 'POST':
         # 处理文件上传
@@ -1059,80 +1399,43 @@ def admin_upload():
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             file.save(file_path)
 
-            # 处理上传的文件
-            result = process_uploaded_file(file_path)
-
-            if result['success']:
-                user_points = result['user_points']
-                base_url = request.host_url.rstrip('/')
-
-                # 生成通用查询二维码
-                general_qr_info = None
-                try:
-                    query_url = f"{base_url}/query"  # 通用查询页面
-                    general_qr_info = generate_general_qr_code(query_url)
-                except Exception as e:
-                    flash(f'通用二维码生成失败: {str(e)}', 'error')
-
-                # 不使用flash消息，改为在页面内显示成功信息
-
-                # 获取分页和筛选参数
-                page = request.args.get('page', 1, type=int)
-                per_page = request.args.get('per_page', 10, type=int)
-                search_user_id = request.args.get('search_user_id', '').strip()
-                search_user_name = request.args.get('search_user_name', '').strip()
-                min_points = request.args.get('min_points', type=int)
-                max_points = request.args.get('max_points', type=int)
-                sort_by = request.args.get('sort_by', 'TotalPoints')
-                sort_order = request.args.get('sort_order', 'desc')
-
-                # 将上传结果保存到session中，以便后续筛选使用
-                upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                session['last_upload_result'] = {
-                    'filename': filename,
-                    'total_users': result['total_users'],
-                    'user_points_data': user_points.to_dict('records'),  # 保存完整数据
-                    'general_qr': general_qr_info,
-                    'upload_time': upload_time
-                }
+            # 提交后台处理任务，立即返回任务ID
+            query_url = f"{request.host_url.rstrip('/')}/query"  # 通用查询页面
+            job_id = upload_job_manager.submit(session['user_id'], filename, run_upload_job,
+                                               file_path, session['user_id'], query_url)
 
-                # 处理用户积分数据的分页和筛选
-                filtered_user_points = filter_and_paginate_user_points(
-                    user_points, page, per_page, search_user_id, search_user_name,
-                    min_points, max_points, sort_by, sort_order
-                )
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({
+                    'success': True,
+                    'job_id': job_id,
+                    'status_url': url_for('upload_job_status', job_id=job_id),
+                    'result_url': url_for('admin_upload', job_id=job_id)
+                }), 202
 
-                return render_template('admin_upload_combined.html',
-                                     show_results=True,
-                                     upload_result={
-                                         'filename': filename,
-                                         'total_users': result['total_users'],
-                                         'user_points': filtered_user_points['data'],
-                                         'total_records': filtered_user_points['total_records'],
-                                         'total_pages': filtered_user_points['total_pages'],
-                                         'current_page': page,
-                                         'per_page': per_page,
-                                         'general_qr': general_qr_info,
-                                         'upload_time': upload_time,
-                                         'search_params': {
-                                             'search_user_id': search_user_id,
-                                             'search_user_name': search_user_name,
-                                             'min_points': min_points,
-                                             'max_points': max_points,
-                                             'sort_by': sort_by,
-                                             'sort_order': sort_order
-                                         }
-                                     },
-                                     min_duration=config_manager.get('points_system.min_duration_minutes', 40),
-                                     points_per_day=config_manager.get('points_system.points_per_day', 1),
-                                     validity_days=config_manager.get('points_system.validity_days', 90))
-            else:
-                flash(f'处理失败: {result["error"]}', 'error')
-                return redirect(request.url)
+            return redirect(url_for('admin_upload', job_id=job_id))
         else:
             flash(f'不支持的文件格式。支持的格式: {", ".join(allowed_extensions)}', 'error')
             return redirect(request.url)
 
+# 上传任务进度查询接口
+@app.route('/admin/upload/jobs/<job_id>')
+@login_required
+def upload_job_status(job_id):
+    """
+    查询上传任务的处理阶段、已处理行数和预计剩余时间
+    """
+    job = upload_job_manager.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': '上传任务不存在或已过期'
+        }), 404
+
+    status = job.to_dict()
+    status['success'] = True
+    status['result_url'] = url_for('admin_upload', job_id=job_id)
+    return jsonify(status)
+
 # 积分管理页面
 @app.route('/admin/points')
 @login_required
@@ -1153,47 +1456,27 @@ def admin_points():
         sort_by = request.args.get('sort_by', 'TotalPoints')
         sort_order = request.args.get('sort_order', 'desc')
 
-        # 读取当前用户的积分数据
-        user_points_file = get_user_data_path('user_points.csv')
-        if os.path.exists(user_points_file):
-            user_stats = pd.read_csv(user_points_file)
-            user_stats['UserID'] = user_stats['UserID'].astype(str)
-
-            # 确保有UserName列
-            if 'UserName' not in user_stats.columns:
-                user_stats['UserName'] = '未知用户'
-
-            # 应用筛选条件
-            if search_user_id:
-                user_stats = user_stats[user_stats['UserID'].str.contains(search_user_id, case=False, na=False)]
-
-            if search_user_name:
-                user_stats = user_stats[user_stats['UserName'].str.contains(search_user_name, case=False, na=False)]
-
-            if min_points is not None:
-                user_stats = user_stats[user_stats['TotalPoints'] >= min_points]
-
-            if max_points is not None:
-                user_stats = user_stats[user_stats['TotalPoints'] <= max_points]
-
-            # 排序
-            ascending = sort_order == 'asc'
-            if sort_by in user_stats.columns:
-                user_stats = user_stats.sort_values(sort_by, ascending=ascending)
-
-            # 计算分页
-            total_records = len(user_stats)
-            total_pages = (total_records + per_page - 1) // per_page
-            start_idx = (page - 1) * per_page
-            end_idx = start_idx + per_page
-            paginated_stats = user_stats.iloc[start_idx:end_idx]
+        # 读取当前用户的积分数据（数据版本不变时复用已排序的列表）
+        storage = get_storage()
+        data_owner = get_data_owner()
+        listing = points_listing_cache.get(
+            ('points', data_owner), storage.data_version(data_owner),
+            lambda: storage.get_user_points(data_owner)
+        )
+        if listing is not None:
+            # 筛选、排序和分页
+            result = listing.page(
+                page, per_page, search_user_id, search_user_name, min_points, max_points, sort_by, sort_order,
+                after=request.args.get('after'), before=request.args.get('before'),
+                match_user_name=match_user_name
+            )
+            page = result['page']
+            paginated_stats = result['data']
+            total_records = result['total_records']
+            total_pages = result['total_pages']
 
             # 读取当前用户的历史记录数量
-            points_history_file = get_user_data_path('points_history.csv')
-            history_count = 0
-            if os.path.exists(points_history_file):
-                history_df = pd.read_csv(points_history_file)
-                history_count = len(history_df)
+            history_count = storage.count_history(data_owner)
 
             # 获取当前用户信息
             current_user = get_current_user()
@@ -1204,6 +1487,8 @@ def admin_points():
                                  total_pages=total_pages,
                                  current_page=page,
                                  per_page=per_page,
+                                 next_cursor=result['next_cursor'],
+                                 prev_cursor=result['prev_cursor'],
                                  history_count=history_count,
                                  current_date=datetime.now().date(),
                                  current_user=current_user,
@@ -1236,6 +1521,84 @@ def admin_points():
         flash(f'读取积分数据失败: {str(e)}', 'error')
         return redirect(url_for('admin_upload'))
 
+# 导出积分数据
+@app.route('/admin/points/export')
+@login_required
+def export_points():
+    """
+    导出积分数据（CSV 或 XLSX），使用与积分管理页面相同的筛选和排序条件
+    dataset=points 导出用户积分，dataset=history 导出筛选出的用户的积分历史记录；
+    CSV 逐块生成并流式输出；XLSX 先完整写入临时文件（带 Content-Length），写完前不会开始下载
+    """
+    export_format = request.args.get('format', 'csv')
+    dataset = request.args.get('dataset', 'points')
+    if export_format not in EXPORT_FORMATS or dataset not in ('points', 'history'):
+        flash('不支持的导出格式', 'error')
+        return redirect(url_for('admin_points'))
+
+    search_user_id = request.args.get('search_user_id', '').strip()
+    search_user_name = request.args.get('search_user_name', '').strip()
+    min_points = request.args.get('min_points', type=int)
+    max_points = request.args.get('max_points', type=int)
+    sort_by = request.args.get('sort_by', 'TotalPoints')
+    sort_order = request.args.get('sort_order', 'desc')
+
+    try:
+        storage = get_storage()
+        data_owner = get_data_owner()
+        listing = points_listing_cache.get(
+            ('points', data_owner), storage.data_version(data_owner),
+            lambda: storage.get_user_points(data_owner)
+        )
+        if listing is None:
+            flash('暂无积分数据可导出', 'warning')
+            return redirect(url_for('admin_points'))
+
+        # 在请求开始时确定导出的行，之后数据更新不影响本次导出
+        rows = listing.rows(search_user_id, search_user_name, min_points, max_points, sort_by, sort_order,
+                            match_user_name=match_user_name)
+
+        if dataset == 'points':
+            columns = list(listing.df.columns)
+            user_points = listing.df
+
+            def chunks():
+                for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+                    yield user_points.iloc[rows[start:start + EXPORT_CHUNK_ROWS]]
+        else:
+            columns = ['UserID', 'Date', 'Points']
+            filtered = any([search_user_id, search_user_name, min_points is not None, max_points is not None])
+            user_ids = set(listing.df['UserID'].iloc[rows].astype(str)) if filtered else None
+
+            def chunks():
+                for chunk in storage.iter_history(data_owner, EXPORT_CHUNK_ROWS):
+                    if user_ids is not None:
+                        chunk = chunk[chunk['UserID'].astype(str).isin(user_ids)]
+                    yield chunk
+
+        name = '积分数据' if dataset == 'points' else '积分历史'
+        filename = f"{name}_{data_owner}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+        print(f"📤 导出{name}: 用户 {data_owner}，{len(rows)} 个用户，格式 {export_format}")
+
+        if export_format == 'xlsx':
+            xlsx_path = write_xlsx(chunks(), columns, name)
+            response = Response(iter_file(xlsx_path), content_type=EXPORT_FORMATS[export_format])
+            response.headers['Content-Length'] = str(os.path.getsize(xlsx_path))
+            # 响应结束（包括客户端中途断开）后删除临时文件
+            response.call_on_close(lambda: remove_file(xlsx_path))
+        else:
+            response = Response(stream_with_context(iter_csv(chunks(), columns)),
+                                content_type=EXPORT_FORMATS[export_format])
+        response.headers['Content-Disposition'] = (
+            f"attachment; filename=\"points_export.{export_format}\"; filename*=UTF-8''{quote(filename)}"
+        )
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    except Exception as e:
+        print(f"导出积分数据失败: {str(e)}")
+        flash(f'导出积分数据失败: {str(e)}', 'error')
+        return redirect(url_for('admin_points'))
+
 # 清空用户积分功能
 @app.route('/admin/clear_points', methods=['POST'])
 @login_required
@@ -1255,13 +1618,12 @@ def clear_user_points():
             flash('请确认您要执行清空操作', 'error')
             return redirect(url_for('admin_points'))
 
-        # 获取当前用户的数据文件路径
-        user_points_file = get_user_data_path('user_points.csv')
-        points_history_file = get_user_data_path('points_history.csv')
+        # 当前用户的数据
+        data_owner = get_data_owner()
 
         if action == 'single' and user_id:
             # 清空单个用户的积分
-            success = clear_single_user_points(user_id, user_points_file, points_history_file)
+            success = clear_single_user_points(user_id, data_owner)
             if success:
                 flash(f'用户 {user_id} 的积分已清空', 'success')
             else:
@@ -1269,7 +1631,7 @@ def clear_user_points():
 
         elif action == 'all':
             # 清空所有用户的积分
-            success = clear_all_user_points(user_points_file, points_history_file)
+            success = clear_all_user_points(data_owner)
             if success:
                 flash('所有用户积分已清空', 'success')
             else:
@@ -1285,57 +1647,25 @@ def clear_user_points():
 
     return redirect(url_for('admin_points'))
 
-def clear_single_user_points(user_id, user_points_file, points_history_file):
+def clear_single_user_points(user_id, data_owner):
     """
     清空单个用户的积分
     """
     try:
-        # 处理用户积分统计文件
-        if os.path.exists(user_points_file):
-            user_stats = pd.read_csv(user_points_file)
-            user_stats['UserID'] = user_stats['UserID'].astype(str)
-
-            # 检查用户是否存在
-            if user_id not in user_stats['UserID'].values:
-                return False
-
-            # 删除指定用户的记录
-            user_stats = user_stats[user_stats['UserID'] != user_id]
-            user_stats.to_csv(user_points_file, index=False)
-
-        # 处理积分历史文件
-        if os.path.exists(points_history_file):
-            history_df = pd.read_csv(points_history_file)
-            history_df['UserID'] = history_df['UserID'].astype(str)
-
-            # 删除指定用户的历史记录
-            history_df = history_df[history_df['UserID'] != user_id]
-            history_df.to_csv(points_history_file, index=False)
-
-        return True
+        with tenant_locks.hold(data_owner):
+            return get_storage().clear_user(data_owner, user_id)
 
     except Exception as e:
         print(f"清空单个用户积分错误: {str(e)}")
         return False
 
-def clear_all_user_points(user_points_file, points_history_file):
+def clear_all_user_points(data_owner):
     """
     清空所有用户的积分
     """
     try:
-        # 清空用户积分统计文件
-        if os.path.exists(user_points_file):
-            # 创建空的DataFrame但保持列结构
-            empty_df = pd.DataFrame(columns=['UserID', 'UserName', 'TotalPoints', 'ValidDays'])
-            empty_df.to_csv(user_points_file, index=False)
-
-        # 清空积分历史文件
-        if os.path.exists(points_history_file):
-            # 创建空的DataFrame但保持列结构
-            empty_df = pd.DataFrame(columns=['UserID', 'Date', 'Points'])
-            empty_df.to_csv(points_history_file, index=False)
-
-        return True
+        with tenant_locks.hold(data_owner):
+            return get_storage().clear_all(data_owner)
 
     except Exception as e:
         print(f"清空所有用户积分错误: {str(e)}")
@@ -1356,47 +1686,21 @@ def query_user(user_name):
     用户查询接口 - 根据用户名查询
     """
     try:
-        # 检查是否有登录用户的数据
-        user_points_file = None
+        storage = get_storage()
+
+        # 优先查找登录用户的数据（支持模糊匹配）
+        user_records = None
         if 'user_id' in session:
-            user_points_file = get_user_data_path('user_points.csv')
-
-        # 如果没有登录用户，尝试查找所有用户的数据
-        if not user_points_file or not os.path.exists(user_points_file):
-            # 查找data目录下所有用户的数据
-            data_dir = 'data'
-            found_data = False
-            combined_df = pd.DataFrame()
-
-            if os.path.exists(data_dir):
-                for user_dir in os.listdir(data_dir):
-                    user_data_file = os.path.join(data_dir, user_dir, 'user_points.csv')
-                    if os.path.exists(user_data_file):
-                        try:
-                            temp_df = pd.read_csv(user_data_file)
-                            combined_df = pd.concat([combined_df, temp_df], ignore_index=True)
-                            found_data = True
-                        except:
-                            continue
-
-            if not found_data:
-                return render_template('query_result.html',
-                                     user_name=user_name,
-                                     error_message="积分数据文件不存在，请先上传数据文件")
+            user_records = storage.search_users(user_name, get_data_owner())
 
-            df = combined_df
-        else:
-            df = pd.read_csv(user_points_file)
-        df['UserID'] = df['UserID'].astype(str)
+        # 如果没有登录用户，查找所有用户的数据
+        if user_records is None:
+            user_records = storage.search_users(user_name)
 
-        # 确保有UserName列
-        if 'UserName' not in df.columns:
+        if user_records is None:
             return render_template('query_result.html',
                                  user_name=user_name,
-                                 error_message="系统暂不支持用户名查询，请联系管理员")
-
-        # 查找用户（支持模糊匹配）
-        user_records = df[df['UserName'].str.contains(str(user_name), case=False, na=False)]
+                                 error_message="积分数据文件不存在，请先上传数据文件")
 
         if not user_records.empty:
             # 如果找到多个用户，返回所有匹配的用户
@@ -1475,6 +1779,8 @@ def admin_config():
             data_config['max_file_size_mb'] = int(request.form.get('max_file_size_mb', 50))
             data_config['auto_clean_uploads_days'] = int(request.form.get('auto_clean_uploads_days', 7))
             data_config['batch_size'] = int(request.form.get('batch_size', 1000))
+            data_config['streaming_threshold_mb'] = int(request.form.get('streaming_threshold_mb', 20))
+            data_config['frame_cache_mb'] = int(request.form.get('frame_cache_mb', 256))
 
             # 处理显示配置
             display_config = {}
@@ -1505,39 +1811,26 @@ def admin_config():
             qr_config['clean_interval_hours'] = int(request.form.get('clean_interval_hours', 6))
             qr_config['max_cache_size'] = int(request.form.get('max_cache_size', 1000))
 
-            # 更新配置
-            success_count = 0
-            error_messages = []
+            # 汇总所有修改，验证通过后一次性写入配置文件
+            updates = {}
+            for section, section_config in [('points_system', points_config),
+                                            ('data_processing', data_config),
+                                            ('display', display_config),
+                                            ('qr_system', qr_config)]:
+                for key, value in section_config.items():
+                    updates[f'{section}.{key}'] = value
 
-            # 更新积分系统配置
-            for key, value in points_config.items():
-                if config_manager.set(f'points_system.{key}', value, username):
-                    success_count += 1
-                else:
-                    error_messages.append(f'更新积分系统配置 {key} 失败')
-
-            # 更新数据处理配置
-            for key, value in data_config.items():
-                if config_manager.set(f'data_processing.{key}', value, username):
-                    success_count += 1
-                else:
-                    error_messages.append(f'更新数据处理配置 {key} 失败')
+            old_validity = config_manager.snapshot.qr_system.validity_hours
 
-            # 更新显示配置
-            for key, value in display_config.items():
-                if config_manager.set(f'display.{key}', value, username):
-                    success_count += 1
-                else:
-                    error_messages.append(f'更新显示配置 {key} 失败')
-
-            # 更新二维码系统配置
-            old_validity = config_manager.get('qr_system.validity_hours', 24)
-
-            for key, value in qr_config.items():
-                if config_manager.set(f'qr_system.{key}', value, username):
-                    success_count += 1
-                else:
-                    error_messages.append(f'更新二维码系统配置 {key} 失败')
+            validation_errors = config_manager.update_many(updates, username)
+            if validation_errors:
+                error_messages = [
+                    f'{category}: {error}'
+                    for category, errors in validation_errors.items()
+                    for error in errors
+                ]
+                flash('配置验证失败，未保存任何修改：' + '; '.join(error_messages), 'error')
+                return redirect(url_for('admin_config'))
 
             # 如果有效期配置发生变化，处理现有缓存
             new_validity = qr_config.get('validity_hours', old_validity)
@@ -1547,20 +1840,10 @@ def admin_config():
                     print(f"二维码有效期配置已从 {old_validity} 更改为 {new_validity}")
                 except Exception as e:
                     print(f"处理有效期配置变更失败: {str(e)}")
-                    error_messages.append('处理二维码缓存更新失败')
+                    flash(f'配置已保存，但处理二维码缓存更新失败: {str(e)}', 'warning')
+                    return redirect(url_for('admin_config'))
 
-            # 验证配置
-            validation_errors = config_manager.validate_config()
-            if validation_errors:
-                for category, errors in validation_errors.items():
-                    for error in errors:
-                        error_messages.append(f'{category}: {error}')
-
-            # 显示结果
-            if error_messages:
-                flash(f'配置更新部分成功（{success_count}项），但有错误：' + '; '.join(error_messages), 'warning')
-            else:
-                flash(f'配置更新成功！共更新了{success_count}项配置', 'success')
+            flash(f'配置更新成功！共更新了{len(updates)}项配置', 'success')
 
             return redirect(url_for('admin_config'))
 
@@ -1635,6 +1918,36 @@ def generate_universal_qr():
             'message': f'生成二维码时出错: {str(e)}'
         }), 500
 
+# 二维码图片路由
+@app.route('/qr/<filename>')
+def qr_image(filename):
+    """
+    返回缓存的二维码图片
+    地址中的签名和参数一一对应，内容不会变化，可以长期缓存
+    """
+    signature, ext = os.path.splitext(filename)
+    try:
+        key = qr_image_cache.make_key(
+            request.args.get('data', ''),
+            request.args.get('box', 10, type=int),
+            request.args.get('border', 4, type=int),
+            request.args.get('ec', 'L')
+        )
+    except ValueError:
+        return '二维码不存在', 404
+
+    if ext != '.png' or not qr_image_cache.verify(key, signature):
+        return '二维码不存在', 404
+
+    image = qr_image_cache.get(key)
+    response = make_response(image['png'])
+    response.mimetype = 'image/png'
+    response.set_etag(image['etag'])
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
 # 获取通用二维码状态路由
 @app.route('/admin/universal_qr_status')
 @login_required
@@ -1677,51 +1990,16 @@ def get_universal_qr_status():
         }), 500
 
 # 二维码缓存管理函数
-def get_qr_cache_file_path():
-    """获取二维码缓存文件路径"""
-    return os.path.join('data', 'universal_qr_cache.json')
-
-def ensure_qr_cache_dir():
-    """确保缓存目录存在"""
-    cache_dir = os.path.dirname(get_qr_cache_file_path())
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
-
-def load_qr_cache():
-    """加载二维码缓存"""
-    try:
-        cache_file = get_qr_cache_file_path()
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        print(f"加载二维码缓存失败: {str(e)}")
-        return {}
-
-def save_qr_cache(cache_data):
-    """保存二维码缓存"""
-    try:
-        ensure_qr_cache_dir()
-        cache_file = get_qr_cache_file_path()
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"保存二维码缓存失败: {str(e)}")
-        return False
-
 def get_cached_universal_qr(user_id):
     """获取用户的缓存二维码信息"""
     try:
-        cache_data = load_qr_cache()
-        cached_qr = cache_data.get(user_id)
+        cached_qr = qr_cache_store.get(user_id)
 
         if not cached_qr:
             return None
 
         # 检查缓存的配置是否与当前配置兼容
-        current_validity = config_manager.get('qr_system.validity_hours', 24)
+        current_validity = config_manager.snapshot.qr_system.validity_hours
         cached_validity = cached_qr.get('validity_hours', 24)
 
         # 如果配置发生变化，需要重新验证缓存
@@ -1736,8 +2014,7 @@ def get_cached_universal_qr(user_id):
                 cached_qr['expires_at'] = "永不过期"
 
                 # 保存更新后的缓存
-                cache_data[user_id] = cached_qr
-                save_qr_cache(cache_data)
+                qr_cache_store.set(user_id, cached_qr)
 
                 return cached_qr
 
@@ -1758,8 +2035,7 @@ def get_cached_universal_qr(user_id):
                         cached_qr['validity_hours'] = current_validity
                         cached_qr['expires_at'] = new_expires_at.isoformat()
 
-                        cache_data[user_id] = cached_qr
-                        save_qr_cache(cache_data)
+                        qr_cache_store.set(user_id, cached_qr)
 
                         return cached_qr
                     else:
@@ -1781,7 +2057,7 @@ def cache_universal_qr(user_id, qr_url, query_url, validity_hours=None):
     try:
         # 从配置中获取有效期，默认24小时
         if validity_hours is None:
-            validity_hours = config_manager.get('qr_system.validity_hours', 24)
+            validity_hours = config_manager.snapshot.qr_system.validity_hours
 
         current_time = datetime.now()
 
@@ -1802,15 +2078,9 @@ def cache_universal_qr(user_id, qr_url, query_url, validity_hours=None):
             'validity_hours': validity_hours
         }
 
-        # 加载现有缓存
-        cache_data = load_qr_cache()
-        cache_data[user_id] = cache_info
-
-        # 保存缓存
-        if save_qr_cache(cache_data):
-            return cache_info
-        else:
-            return None
+        # 保存缓存（延迟写入文件）
+        qr_cache_store.set(user_id, cache_info)
+        return cache_info
 
     except Exception as e:
         print(f"缓存二维码失败: {str(e)}")
@@ -1843,18 +2113,9 @@ def is_qr_expired(qr_cache_info):
 def clean_expired_qr_cache():
     """清理过期的二维码缓存"""
     try:
-        cache_data = load_qr_cache()
-        cleaned_data = {}
-        cleaned_count = 0
-
-        for user_id, qr_info in cache_data.items():
-            if not is_qr_expired(qr_info):
-                cleaned_data[user_id] = qr_info
-            else:
-                cleaned_count += 1
+        cleaned_count = qr_cache_store.remove_where(is_qr_expired)
 
         if cleaned_count > 0:
-            save_qr_cache(cleaned_data)
             print(f"清理了 {cleaned_count} 个过期的二维码缓存")
 
         return cleaned_count
@@ -1866,14 +2127,13 @@ def clean_expired_qr_cache():
 def handle_validity_config_change(old_validity, new_validity):
     """处理有效期配置变更"""
     try:
-        cache_data = load_qr_cache()
         updated_data = {}
         updated_count = 0
         removed_count = 0
 
         print(f"处理有效期配置变更: {old_validity} -> {new_validity}")
 
-        for user_id, qr_info in cache_data.items():
+        for user_id, qr_info in qr_cache_store.items():
             try:
                 # 如果新配置是长期有效
                 if new_validity == -1:
@@ -1914,10 +2174,8 @@ def handle_validity_config_change(old_validity, new_validity):
                 removed_count += 1
 
         # 保存更新后的缓存
-        if save_qr_cache(updated_data):
-            print(f"配置变更处理完成: 更新了 {updated_count} 个缓存，移除了 {removed_count} 个缓存")
-        else:
-            print("保存更新后的缓存失败")
+        qr_cache_store.replace_all(updated_data)
+        print(f"配置变更处理完成: 更新了 {updated_count} 个缓存，移除了 {removed_count} 个缓存")
 
         return updated_count, removed_count
 
@@ -1925,7 +2183,159 @@ def handle_validity_config_change(old_validity, new_validity):
         print(f"处理有效期配置变更失败: {str(e)}")
         return 0, 0
 
+# 后台维护任务
+def clean_old_uploads():
+    """删除 uploads/ 中超过 data_processing.auto_clean_uploads_days 天的文件"""
+    days = config_manager.snapshot.data_processing.auto_clean_uploads_days
+    if days <= 0 or not os.path.exists(app.config['UPLOAD_FOLDER']):
+        return 0
+
+    cutoff = datetime.now().timestamp() - days * 24 * 3600
+    removed_count = 0
+    for entry in os.scandir(app.config['UPLOAD_FOLDER']):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed_count += 1
+        except OSError:
+            continue
+
+    if removed_count > 0:
+        print(f"清理了 {removed_count} 个超过 {days} 天的上传文件")
+    return removed_count
+
+def compact_expired_points():
+    """移除所有管理员的过期积分记录（没有新上传的管理员也会按时过期）"""
+    validity_days = config_manager.snapshot.points_system.validity_days
+    cutoff_date = datetime.now().date() - timedelta(days=validity_days)
+
+    storage = get_storage()
+    tenants = storage.list_tenants()
+    for tenant in tenants:
+        try:
+            # 与上传累计和清空操作使用同一把锁，避免覆盖并发写入的数据
+            with tenant_locks.hold(tenant):
+                storage.expire(tenant, cutoff_date)
+        except Exception as e:
+            print(f"⚠️ 压缩 {tenant} 的过期积分失败: {str(e)}")
+    return len(tenants)
+
+def qr_clean_interval_hours():
+    qr_config = config_manager.snapshot.qr_system
+    return qr_config.clean_interval_hours if qr_config.auto_clean_expired else None
+
+# 过期积分每天凌晨压缩一次
+POINTS_EXPIRY_HOUR = 3
+
+maintenance_scheduler.register('clean_expired_qr_cache', clean_expired_qr_cache, every(qr_clean_interval_hours))
+maintenance_scheduler.register('clean_old_uploads', clean_old_uploads, every(lambda: 24))
+maintenance_scheduler.register('compact_expired_points', compact_expired_points, daily(POINTS_EXPIRY_HOUR))
+
+def start_background_tasks():
+    """
+    启动后台维护任务（会删除过期的上传文件并压缩积分数据）
+    导入模块时不启动，避免脚本和测试导入应用时修改数据；由 `python app.py` 或 create_app() 调用
+    """
+    maintenance_scheduler.start()
+
+def create_app():
+    """WSGI 服务器入口，例如 gunicorn 'app:create_app()'：启动后台维护任务并返回应用"""
+    start_background_tasks()
+    return app
+
+# 运行指标
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """按路由记录请求耗时（静态文件和指标接口本身除外）"""
+    started = g.pop('request_started', None)
+    endpoint = request.endpoint or 'unmatched'
+    if started is not None and endpoint not in ('static', 'metrics'):
+        observe_request(endpoint, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+def collect_cache_metrics():
+    """各进程内缓存的命中次数、条目数和内存占用"""
+    caches = {
+        'frame': frame_cache.stats(),
+        'points_listing': points_listing_cache.stats(),
+        'qr_image': qr_image_cache.stats(),
+        'qr_cache': qr_cache_store.stats()
+    }
+    hit_ratio = []
+    for name, stats in caches.items():
+        lookups = stats['hits'] + stats['misses']
+        hit_ratio.append(({'cache': name}, round(stats['hits'] / lookups, 4) if lookups else 0))
+
+    return [
+        ('points_cache_hits_total', 'counter', '缓存命中次数',
+         [({'cache': name}, stats['hits']) for name, stats in caches.items()]),
+        ('points_cache_misses_total', 'counter', '缓存未命中次数',
+         [({'cache': name}, stats['misses']) for name, stats in caches.items()]),
+        ('points_cache_hit_ratio', 'gauge', '缓存命中率', hit_ratio),
+        ('points_cache_entries', 'gauge', '缓存条目数',
+         [({'cache': name}, stats['entries']) for name, stats in caches.items()]),
+        ('points_cache_size_bytes', 'gauge', '缓存内存占用（字节）',
+         [({'cache': name}, stats['size_bytes']) for name, stats in caches.items() if 'size_bytes' in stats])
+    ]
+
+# 数据目录指标的采集间隔（秒），期间的抓取使用上次的结果
+DATA_METRICS_INTERVAL = 60
+
+def data_file_kind(root, filename):
+    """data 目录下文件的分类（用于文件大小指标）"""
+    if 'upload_results' in root:
+        return 'upload_results'
+    if filename in ('points_history.csv', 'user_points.csv', 'points_bitmap.npz'):
+        return os.path.splitext(filename)[0]
+    if '.db' in filename:
+        return 'sqlite'
+    return 'other'
+
+def collect_data_metrics():
+    """
+    管理员数、积分历史记录数和 data 目录的文件大小（只读取文件信息，不解析数据文件）
+    历史记录数使用各存储后端在写入时记录的计数，尚无计数的管理员在下次写入或过期积分压缩后计入
+    """
+    history_counts = get_storage().history_row_counts()
+    history_rows = sum(rows for rows in history_counts.values() if rows is not None)
+
+    sizes = {}
+    for root, _, filenames in os.walk('data'):
+        for filename in filenames:
+            try:
+                size = os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                continue
+            kind = data_file_kind(root, filename)
+            sizes[kind] = sizes.get(kind, 0) + size
+
+    return [
+        ('points_tenants', 'gauge', '有积分数据的管理员数', [({}, len(history_counts))]),
+        ('points_history_rows', 'gauge', '所有管理员的积分历史记录数', [({}, history_rows)]),
+        ('points_data_bytes', 'gauge', 'data 目录下的文件大小（字节）',
+         [({'kind': kind}, size) for kind, size in sorted(sizes.items())])
+    ]
+
+metrics_registry.register_collector(collect_cache_metrics)
+metrics_registry.register_collector(collect_data_metrics, interval=DATA_METRICS_INTERVAL)
+
+@app.route('/metrics')
+def metrics():
+    """
+    Prometheus 格式的运行指标（请求耗时、上传吞吐、缓存命中率、数据规模）
+    只输出汇总数值，不包含管理员名称等数据
+    """
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 # 运行应用
 if __name__ == '__main__':
+    # 调试模式下自动重载的监视进程不执行维护任务，只在实际运行应用的子进程中启动
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+
     # 开启调试模式，方便开发
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+配置读取基准测试
+对比 config_manager.get('段.配置项') 与读取配置快照属性的单次耗时
+
+用法（在 flask-version 目录下运行）:
+    python benchmarks/bench_config_lookup.py [--lookups 1000000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import config_manager
+
+
+def run(lookups):
+    cases = [
+        ('get(路径)', lambda: config_manager.get('points_system.validity_days', 90)),
+        ('snapshot 属性', lambda: config_manager.snapshot.points_system.validity_days),
+    ]
+
+    # 热点路径中先取出配置段，再读取属性
+    points_system = config_manager.snapshot.points_system
+    cases.append(('配置段局部变量', lambda: points_system.validity_days))
+
+    assert len({func() for _, func in cases}) == 1, '各种读取方式的结果不一致'
+
+    baseline = None
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=lookups, repeat=3))
+        per_lookup_ns = seconds / lookups * 1e9
+        baseline = baseline or per_lookup_ns
+        print(f"{name:<12} {per_lookup_ns:8.1f} ns/次  ({baseline / per_lookup_ns:.1f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='配置读取基准测试')
+    parser.add_argument('--lookups', type=int, default=1_000_000, help='每种方式的读取次数')
+    args = parser.parse_args()
+
+    run(args.lookups)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+积分日位图基准测试
+对比按行保存的积分历史（DataFrame，与 points_history.csv 相同）和 DayBitmap 的内存占用，
+以及一次上传（去重写入新记录 + 过期 + 汇总用户积分）和单独过期一天的耗时
+
+用法（在 flask-version 目录下运行）:
+    python benchmarks/bench_day_bitmap.py [--users 1000000] [--days-per-user 5] [--new-rows 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from day_bitmap import DayBitmap
+from points_storage import select_new_daily_records
+
+VALIDITY_DAYS = 90
+
+
+def make_history(users, days_per_user, seed=7):
+    """生成合成历史记录：每个用户在有效期内平均 days_per_user 天各有一条记录"""
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    calendar = np.array([today - timedelta(days=i) for i in range(VALIDITY_DAYS)], dtype=object)
+
+    rows = users * days_per_user
+    history = pd.DataFrame({
+        'UserID': (rng.integers(0, users, rows) + 81000000).astype(str),
+        'Date': calendar[rng.integers(0, VALIDITY_DAYS, rows)],
+    }).drop_duplicates(ignore_index=True)
+    history['Points'] = 1
+    return history, calendar
+
+
+def make_daily_stats(rows, users, calendar, seed=11):
+    """生成一次上传的每日统计（最近一周，包含部分新用户）"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'UserID': (rng.integers(0, int(users * 1.1), rows) + 81000000).astype(str),
+        'Date': calendar[rng.integers(0, 7, rows)],
+    }).drop_duplicates(ignore_index=True)
+
+
+def dataframe_accumulate(history_df, daily_stats, cutoff_date, points_per_day):
+    """按行处理：反连接去重、移除过期记录、从历史记录汇总用户积分（与 CSV 存储的完整重算相同）"""
+    new_df = select_new_daily_records(history_df, daily_stats, points_per_day)
+    new_df = new_df[new_df['Date'] > cutoff_date]
+    history_df = pd.concat([history_df[history_df['Date'] > cutoff_date], new_df], ignore_index=True)
+    user_points = history_df.groupby('UserID').agg(
+        TotalPoints=('Points', 'sum'),
+        ValidDays=('Points', 'size')
+    ).reset_index()
+    return history_df, user_points
+
+
+def bitmap_accumulate(bitmap, daily_stats, cutoff_date, points_per_day):
+    bitmap.expire(cutoff_date)
+    bitmap.add(daily_stats['UserID'], daily_stats['Date'], points_per_day)
+    bitmap.compact()
+    return bitmap.summary()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def mb(size_bytes):
+    return size_bytes / 1024 / 1024
+
+
+def run(users, days_per_user, new_rows):
+    history, calendar = make_history(users, days_per_user)
+    daily = make_daily_stats(new_rows, users, calendar)
+    today = date.today()
+    cutoff = today - timedelta(days=VALIDITY_DAYS)
+    print(f"用户 {users:,}，历史记录 {len(history):,} 行，本次上传 {len(daily):,} 条每日记录")
+
+    bitmap, build_seconds = timed(DayBitmap.from_history, history, VALIDITY_DAYS, cutoff)
+    assert bitmap.count() == len(history), '位图记录数与历史记录不一致'
+
+    history_mb = mb(history.memory_usage(index=True, deep=True).sum())
+    bitmap_mb = mb(bitmap.bits.nbytes)
+    ids_mb = mb(sys.getsizeof(bitmap.user_ids) + sum(sys.getsizeof(user_id) for user_id in bitmap.user_ids))
+    print(f"\n{'内存':<16} {'MB':>10}")
+    print(f"{'按行历史':<14} {history_mb:>10.1f}")
+    print(f"{'位图(仅位)':<13} {bitmap_mb:>10.1f}  ({history_mb / bitmap_mb:.0f}x)")
+    print(f"{'位图(含用户ID)':<11} {bitmap_mb + ids_mb:>10.1f}  ({history_mb / (bitmap_mb + ids_mb):.1f}x)")
+    print(f"由历史记录建立位图: {build_seconds:.3f} s")
+
+    # 一次上传：有效期前移一天
+    next_cutoff = cutoff + timedelta(days=1)
+    (new_history, df_points), df_seconds = timed(dataframe_accumulate, history, daily, next_cutoff, 1)
+    bm_points, bm_seconds = timed(bitmap_accumulate, bitmap, daily, next_cutoff, 1)
+
+    df_points = df_points.sort_values('UserID').reset_index(drop=True)
+    bm_points = bm_points.sort_values('UserID').reset_index(drop=True)
+    assert df_points['UserID'].astype(str).tolist() == bm_points['UserID'].astype(str).tolist(), '用户不一致'
+    assert (df_points['ValidDays'].to_numpy() == bm_points['ValidDays'].to_numpy()).all(), '有效天数不一致'
+
+    # 单独过期一天
+    expire_cutoff = next_cutoff + timedelta(days=1)
+    _, df_expire_seconds = timed(lambda: new_history[new_history['Date'] > expire_cutoff])
+    _, bm_expire_seconds = timed(bitmap.expire, expire_cutoff)
+
+    print(f"\n{'操作':<14} {'按行(s)':>10} {'位图(s)':>10} {'加速':>8}")
+    print(f"{'上传并汇总':<12} {df_seconds:>10.3f} {bm_seconds:>10.3f} {df_seconds / bm_seconds:>7.1f}x")
+    print(f"{'过期一天':<13} {df_expire_seconds:>10.3f} {bm_expire_seconds:>10.3f} "
+          f"{df_expire_seconds / bm_expire_seconds:>7.1f}x")
+    print(f"位图上传吞吐: {len(daily) / bm_seconds:,.0f} 条/秒")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='积分日位图基准测试')
+    parser.add_argument('--users', type=int, default=1_000_000, help='用户数')
+    parser.add_argument('--days-per-user', type=int, default=5, help='每个用户平均的有效天数')
+    parser.add_argument('--new-rows', type=int, default=1_000_000, help='每次上传的每日统计行数')
+    args = parser.parse_args()
+
+    run(args.users, args.days_per_user, args.new_rows)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+时长解析基准测试
+对比逐行 re.search 的旧解析器与向量化 parse_duration_column 的吞吐量，
+并校验两者输出完全一致
+
+用法（在 flask-version 目录下运行）:
+    python benchmarks/bench_duration_parser.py [--rows 1000000]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import parse_duration_column
+
+
+def legacy_parse_duration_column(duration_series):
+    """旧版逐行解析器（仅作为基准参照）"""
+    def parse_single_duration(duration_str):
+        if pd.isna(duration_str):
+            return None
+
+        duration_str = str(duration_str).strip()
+
+        match = re.search(r'(\d+)小时(\d+)分(\d+)秒', duration_str)
+        if match:
+            hours, minutes, seconds = map(int, match.groups())
+            return hours * 60 + minutes + seconds / 60
+
+        match = re.search(r'(\d+)分(\d+)秒', duration_str)
+        if match:
+            minutes, seconds = map(int, match.groups())
+            return minutes + seconds / 60
+
+        match = re.search(r'(\d+):(\d+):(\d+)', duration_str)
+        if match:
+            hours, minutes, seconds = map(int, match.groups())
+            return hours * 60 + minutes + seconds / 60
+
+        match = re.search(r'(\d+):(\d+)', duration_str)
+        if match:
+            minutes, seconds = map(int, match.groups())
+            return minutes + seconds / 60
+
+        match = re.search(r'(\d+)分', duration_str)
+        if match:
+            return int(match.group(1))
+
+        if duration_str.isdigit():
+            return float(duration_str)
+
+        return None
+
+    return duration_series.apply(parse_single_duration)
+
+
+def make_duration_column(rows, seed=42):
+    """生成混合各种格式的合成时长列"""
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(0, 4, rows)
+    minutes = rng.integers(0, 60, rows)
+    seconds = rng.integers(0, 60, rows)
+    kinds = rng.integers(0, 8, rows)
+
+    values = []
+    for h, m, s, kind in zip(hours, minutes, seconds, kinds):
+        if kind == 0:
+            values.append(f"{h}小时{m}分{s}秒")
+        elif kind == 1:
+            values.append(f"{m}分{s}秒")
+        elif kind == 2:
+            values.append(f"{h}:{m:02d}:{s:02d}")
+        elif kind == 3:
+            values.append(f"{h * 60 + m}:{s:02d}")
+        elif kind == 4:
+            values.append(f"{h * 60 + m}分钟")
+        elif kind == 5:
+            values.append(f" {h * 60 + m} ")
+        elif kind == 6:
+            values.append(None)
+        else:
+            values.append("未知")
+    return pd.Series(values, dtype=object)
+
+
+def run(rows, legacy_rows):
+    series = make_duration_column(rows)
+
+    start = time.perf_counter()
+    vectorized = parse_duration_column(series)
+    vectorized_seconds = time.perf_counter() - start
+
+    sample = series.iloc[:legacy_rows]
+    start = time.perf_counter()
+    legacy = legacy_parse_duration_column(sample)
+    legacy_seconds = time.perf_counter() - start
+
+    expected = pd.to_numeric(legacy, errors='coerce').to_numpy(dtype='float64')
+    actual = vectorized.iloc[:legacy_rows].to_numpy()
+    identical = np.array_equal(expected, actual, equal_nan=True)
+
+    print(f"向量化解析: {rows:,} 行, {vectorized_seconds:.3f}s, {rows / vectorized_seconds:,.0f} 行/秒")
+    print(f"逐行解析:   {legacy_rows:,} 行, {legacy_seconds:.3f}s, {legacy_rows / legacy_seconds:,.0f} 行/秒")
+    print(f"输出一致: {identical}")
+    return identical
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='时长解析基准测试')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='合成时长列的行数')
+    parser.add_argument('--legacy-rows', type=int, default=None, help='旧解析器参与对比的行数（默认与 --rows 相同）')
+    args = parser.parse_args()
+
+    ok = run(args.rows, args.legacy_rows or args.rows)
+    sys.exit(0 if ok else 1)
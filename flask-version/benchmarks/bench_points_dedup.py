@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+积分去重基准测试
+测量 select_new_daily_records 在历史记录从 1万 增长到 1000万 行时的耗时变化，
+并在较小规模下与旧版逐行布尔筛选实现对比
+
+用法（在 flask-version 目录下运行）:
+    python benchmarks/bench_points_dedup.py [--sizes 10000,100000,1000000,10000000] [--new-rows 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from points_storage import select_new_daily_records
+
+
+def legacy_select_new_daily_records(history_df, daily_stats, points_per_day):
+    """旧版逐行布尔筛选实现（仅作为基准参照）"""
+    new_records = []
+    for _, row in daily_stats.iterrows():
+        user_id = str(row['UserID'])
+        day = row['Date']
+
+        existing_record = history_df[
+            (history_df['UserID'] == user_id) &
+            (history_df['Date'] == day)
+        ]
+
+        if existing_record.empty:
+            new_records.append({
+                'UserID': user_id,
+                'Date': day,
+                'Points': points_per_day
+            })
+
+    return pd.DataFrame(new_records, columns=['UserID', 'Date', 'Points'])
+
+
+def make_history(rows, days=90, seed=7):
+    """生成合成历史记录：每个用户在有效期内若干天各有一条记录"""
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    calendar = np.array([today - timedelta(days=i) for i in range(days)], dtype=object)
+
+    users = max(rows // 30, 1)
+    history = pd.DataFrame({
+        'UserID': (rng.integers(0, users, rows) + 81000000).astype(str),
+        'Date': calendar[rng.integers(0, days, rows)],
+    }).drop_duplicates(ignore_index=True)
+    history['Points'] = 1
+    return history, users, calendar
+
+
+def make_daily_stats(rows, users, calendar, seed=11):
+    """生成一次上传的每日统计，其中约一半与历史记录重叠"""
+    rng = np.random.default_rng(seed)
+    daily = pd.DataFrame({
+        'UserID': (rng.integers(0, users * 2, rows) + 81000000).astype(str),
+        'Date': calendar[rng.integers(0, len(calendar), rows)],
+    }).drop_duplicates(ignore_index=True)
+    daily['Count'] = 1
+    return daily
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, new_rows, legacy_max):
+    print(f"{'历史行数':>12} {'新记录':>8} {'反连接(s)':>10} {'行/秒':>14} {'旧实现(s)':>10}")
+    for size in sizes:
+        history, users, calendar = make_history(size)
+        daily = make_daily_stats(new_rows, users, calendar)
+
+        new_df, seconds = time_call(select_new_daily_records, history, daily, 1)
+        throughput = (len(history) + len(daily)) / seconds
+
+        legacy_text = '-'
+        if size <= legacy_max:
+            legacy_df, legacy_seconds = time_call(legacy_select_new_daily_records, history, daily, 1)
+            legacy_text = f"{legacy_seconds:.3f}"
+            assert len(legacy_df) == len(new_df), '新旧实现结果不一致'
+
+        print(f"{len(history):>12,} {len(new_df):>8,} {seconds:>10.3f} {throughput:>14,.0f} {legacy_text:>10}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='积分去重基准测试')
+    parser.add_argument('--sizes', default='10000,100000,1000000,10000000',
+                        help='历史记录行数列表，逗号分隔')
+    parser.add_argument('--new-rows', type=int, default=10000, help='每次上传的每日统计行数')
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='旧实现参与对比的最大历史行数（旧实现为 O(新记录×历史记录)）')
+    args = parser.parse_args()
+
+    run([int(size) for size in args.sizes.split(',')], args.new_rows, args.legacy_max)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+上传和查询基准测试套件
+在临时目录中运行应用，用合成的直播观看记录（benchmarks/synthetic_logs.py）测量：
+    ingest      首次上传（process_uploaded_file，含各阶段耗时）
+    accumulate  第二次上传（与已有积分合并，部分用户重复、日期后移）
+    listing     积分列表首页（首次排序）、翻页、按积分和按昵称筛选
+    search      按昵称搜索当前管理员的用户
+    query       公开查询页面 /query/<昵称>（跨管理员）
+结果写入 JSON 文件，可用 --compare 对比两次运行（例如不同提交）的结果
+
+用法（在 flask-version 目录下运行）:
+    python benchmarks/bench_suite.py [--scales 10000,100000] [--formats csv,xlsx,json,tsv]
+                                     [--variants duration,start_end] [--backend csv] [--output results.json]
+    python benchmarks/bench_suite.py --compare old.json new.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from synthetic_logs import FORMATS, HEADER_SETS, VARIANTS, generate_viewing_log, write_viewing_log
+
+# 每个用户平均的观看次数（规模 = 行数，用户数 = 行数 / 该值）
+SESSIONS_PER_USER = 5
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, *args, **kwargs):
+    """执行一次并返回 (结果, 秒)，屏蔽处理流程中的日志输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - start
+
+
+def median_seconds(func, repeat):
+    return statistics.median(timed(func)[1] for _ in range(repeat))
+
+
+class Suite:
+    """在临时工作目录中导入应用并执行各项测量"""
+
+    def __init__(self, workdir, backend, repeat, days):
+        self.workdir = workdir
+        self.repeat = repeat
+        self.days = days
+        self.results = []
+
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+        self.app = app_module
+        errors = app_module.config_manager.update_many({'storage.backend': backend}, updated_by='benchmark')
+        if errors:
+            raise RuntimeError(f'配置存储后端失败: {errors}')
+
+        # 合成数据的表头必须能被识别
+        for variant, headers in HEADER_SETS.items():
+            mapping = app_module.detect_column_mapping(list(headers.values()))
+            assert mapping == {column: name for name, column in headers.items()}, f'表头无法识别: {variant}'
+
+        self.client = app_module.app.test_client()
+
+    def record(self, scale, variant, file_format, operation, seconds, **extra):
+        entry = dict(scale=scale, variant=variant, format=file_format, operation=operation,
+                     seconds=round(seconds, 6), **extra)
+        self.results.append(entry)
+        detail = ', '.join(f"{key}={value}" for key, value in extra.items() if key != 'stages')
+        print(f"  {operation:<22} {seconds:>9.4f} s  {detail}")
+
+    def write_log(self, scale, variant, file_format, seed, end_date):
+        log = generate_viewing_log(max(scale // SESSIONS_PER_USER, 1), self.days, SESSIONS_PER_USER,
+                                   variant=variant, seed=seed, end_date=end_date)
+        path = os.path.join(self.workdir, f"bench_{scale}_{variant}_{seed}.{file_format}")
+        size = write_viewing_log(log, path)
+        return path, len(log), size
+
+    def upload(self, operation, tenant, scale, variant, file_format, seed, end_date):
+        path, rows, size = self.write_log(scale, variant, file_format, seed, end_date)
+        timer = self.app.StageTimer()
+        result, seconds = timed(self.app.process_uploaded_file, path, user_id=tenant, timer=timer)
+        if not result['success']:
+            raise RuntimeError(f"{operation} 失败: {result['error']}")
+        self.record(scale, variant, file_format, operation, seconds, rows=rows, file_bytes=size,
+                    rows_per_second=round(rows / seconds), users=result['total_users'], stages=timer.to_list())
+        os.remove(path)
+
+    def measure_queries(self, tenant, scale, variant, file_format):
+        storage = self.app.get_storage()
+        user_points = storage.get_user_points(tenant)
+        names = user_points['UserName'].dropna().astype(str)
+        sample_name = names.iloc[len(names) // 2]
+        name_prefix = sample_name[:2]
+
+        def cold(operation):
+            """每次在新建的列表视图上执行（包含首次排序和筛选，不命中列表内的缓存）"""
+            return statistics.median(
+                timed(operation, self.app.PointsListing(user_points, 'bench'))[1] for _ in range(self.repeat))
+
+        match_user_name = lambda name: self.app.match_user_name(name, tenant)
+        listing = self.app.PointsListing(user_points, 'bench')
+        middle_page = max((len(user_points) + 19) // 20, 1) // 2 + 1
+        listing.page(middle_page, 20)
+
+        self.record(scale, variant, file_format, 'listing_first_page', cold(
+            lambda view: view.page(1, 20, sort_by='TotalPoints', sort_order='desc')), users=len(user_points))
+        self.record(scale, variant, file_format, 'listing_page', median_seconds(
+            lambda: listing.page(middle_page, 20), self.repeat))
+        self.record(scale, variant, file_format, 'listing_filter', cold(
+            lambda view: view.page(1, 20, min_points=3, sort_by='UserID', sort_order='asc')))
+        self.record(scale, variant, file_format, 'listing_name_filter', cold(
+            lambda view: view.page(1, 20, search_user_name=name_prefix, match_user_name=match_user_name)))
+        self.record(scale, variant, file_format, 'search_users', median_seconds(
+            lambda: storage.search_users(name_prefix, tenant), self.repeat), query=name_prefix)
+
+        def public_query():
+            response = self.client.get(f'/query/{sample_name}')
+            assert response.status_code == 200
+        self.record(scale, variant, file_format, 'public_query', median_seconds(public_query, self.repeat),
+                    query=sample_name)
+
+    def run(self, scales, variants, formats):
+        today = date.today()
+        for scale in scales:
+            for variant in variants:
+                for file_format in formats:
+                    tenant = f"bench_{scale}_{variant}_{file_format}"
+                    print(f"\n规模 {scale:,} 行 / {variant} / {file_format}")
+                    self.upload('ingest', tenant, scale, variant, file_format, 1, today - timedelta(days=1))
+                    # 第二次上传：不同随机种子，日期后移一天，与已有积分合并
+                    self.upload('accumulate', tenant, scale, variant, file_format, 2, today)
+                    if file_format == formats[0]:
+                        # 查询路径与上传格式无关，每个规模和时长格式只测一次
+                        self.measure_queries(tenant, scale, variant, file_format)
+
+
+def result_key(entry):
+    return entry['scale'], entry['variant'], entry['format'], entry['operation']
+
+
+def compare(old_path, new_path):
+    """对比两次运行的结果，按相同的 (规模, 时长格式, 文件格式, 操作) 匹配"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    old_results = {result_key(entry): entry for entry in old['results']}
+    print(f"{old['meta'].get('commit')} ({old['meta'].get('backend')}) → "
+          f"{new['meta'].get('commit')} ({new['meta'].get('backend')})")
+    print(f"{'规模':>10} {'时长格式':<10} {'格式':<5} {'操作':<22} {'旧(s)':>10} {'新(s)':>10} {'变化':>8}")
+    for entry in new['results']:
+        previous = old_results.get(result_key(entry))
+        if previous is None:
+            continue
+        ratio = entry['seconds'] / previous['seconds'] if previous['seconds'] else float('inf')
+        print(f"{entry['scale']:>10,} {entry['variant']:<14} {entry['format']:<7} {entry['operation']:<22} "
+              f"{previous['seconds']:>10.4f} {entry['seconds']:>10.4f} {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上传和查询基准测试套件')
+    parser.add_argument('--scales', default='10000,100000', help='每次上传的行数，逗号分隔')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='上传文件格式，逗号分隔')
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='时长格式，逗号分隔')
+    parser.add_argument('--days', type=int, default=30, help='观看记录覆盖的天数')
+    parser.add_argument('--backend', choices=('csv', 'sqlite', 'bitmap'), default='csv', help='积分存储后端')
+    parser.add_argument('--repeat', type=int, default=5, help='查询类操作的重复次数（取中位数）')
+    parser.add_argument('--output', default=None, help='结果文件（默认 benchmarks/results/<时间>_<提交>.json）')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留临时工作目录')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='对比两个结果文件')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scales = [int(value) for value in args.scales.split(',')]
+    formats = [value.strip() for value in args.formats.split(',')]
+    variants = [value.strip() for value in args.variants.split(',')]
+    for file_format in formats:
+        if file_format not in FORMATS:
+            parser.error(f'不支持的格式: {file_format}')
+    for variant in variants:
+        if variant not in VARIANTS:
+            parser.error(f'未知的时长格式: {variant}')
+
+    commit = git_commit()
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, 'results', f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'unknown'}.json")
+    output = os.path.abspath(output)
+
+    workdir = tempfile.mkdtemp(prefix='points_bench_')
+    cwd = os.getcwd()
+    try:
+        suite = Suite(workdir, args.backend, args.repeat, args.days)
+        suite.run(scales, variants, formats)
+    finally:
+        os.chdir(cwd)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'commit': commit,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'backend': args.backend,
+            'scales': scales,
+            'formats': formats,
+            'variants': variants,
+            'days': args.days,
+            'repeat': args.repeat
+        },
+        'results': suite.results
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+直播观看记录合成数据生成器
+生成与直播平台导出文件相似的观看记录：中文表头（可被 detect_column_mapping 识别）、
+“观看时长”或“开始/结束时间”两种格式、同一用户同一天多次观看以及完全重复的行，
+可输出 CSV / XLSX / JSON / TSV；相同参数和随机种子生成相同的文件
+
+用法（在 flask-version 目录下运行）:
+    python benchmarks/synthetic_logs.py out.csv [--users 10000] [--days 30] [--sessions-per-user 5]
+                                                [--duplicate-rate 0.05] [--variant duration|start_end] [--seed 1]
+"""
+
+import argparse
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# 各格式的表头（标准列名 -> 导出文件中的列名），均可被 detect_column_mapping 识别
+HEADER_SETS: Dict[str, Dict[str, str]] = {
+    'duration': {
+        'UserID': '用户ID',
+        'UserName': '用户昵称',
+        'StartTime': '首次观看直播时间',
+        'Duration': '直播观看时长'
+    },
+    'start_end': {
+        'UserID': '用户id',
+        'UserName': '昵称',
+        'StartTime': '开始时间',
+        'EndTime': '结束时间'
+    }
+}
+
+# 导出文件中与积分无关的其他列
+EXTRA_COLUMNS = ['观看设备', '所在地区', '互动次数']
+
+# 昵称用字
+NAME_CHARS = list('小明红华强丽军燕芳伟娜静敏磊洋勇艳杰娟涛超秀霞平刚桂英')
+
+DEVICES = np.array(['iOS', 'Android', 'PC', '小程序'], dtype=object)
+REGIONS = np.array(['北京', '上海', '广东', '浙江', '四川', '湖北', '江苏', '山东'], dtype=object)
+
+VARIANTS = tuple(HEADER_SETS)
+FORMATS = ('csv', 'xlsx', 'json', 'tsv')
+
+
+def format_durations(minutes: np.ndarray, seconds: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """按导出文件中常见的几种写法格式化观看时长（以“X小时X分X秒”为主）"""
+    style = rng.choice(4, len(minutes), p=[0.7, 0.15, 0.1, 0.05])
+    hours, mins = minutes // 60, minutes % 60
+    values = np.empty(len(minutes), dtype=object)
+    for i in range(len(minutes)):
+        if style[i] == 0:
+            values[i] = f"{hours[i]}小时{mins[i]}分{seconds[i]}秒"
+        elif style[i] == 1:
+            values[i] = f"{minutes[i]}分{seconds[i]}秒"
+        elif style[i] == 2:
+            values[i] = f"{hours[i]}:{mins[i]:02d}:{seconds[i]:02d}"
+        else:
+            values[i] = f"{minutes[i]}分钟"
+    return values
+
+
+def generate_viewing_log(users: int = 10000, days: int = 30, sessions_per_user: float = 5,
+                         duplicate_rate: float = 0.05, variant: str = 'duration', seed: int = 1,
+                         end_date: Optional[date] = None, id_offset: int = 81000000) -> pd.DataFrame:
+    """
+    生成观看记录
+    users: 用户数；days: 覆盖最近多少天；sessions_per_user: 每个用户平均的观看次数
+    duplicate_rate: 完全重复的行占总行数的比例（模拟重复导出）
+    variant: duration（观看时长列）或 start_end（开始/结束时间列）
+    """
+    if variant not in HEADER_SETS:
+        raise ValueError(f'未知的格式: {variant}')
+
+    rng = np.random.default_rng(seed)
+    end_date = end_date or date.today()
+    rows = max(int(users * sessions_per_user), 1)
+
+    # 活跃度服从长尾分布：少数用户贡献大部分观看记录
+    weights = rng.pareto(1.5, users) + 1
+    user_index = rng.choice(users, rows, p=weights / weights.sum())
+    user_ids = (user_index + id_offset).astype(str)
+
+    name_codes = rng.integers(0, len(NAME_CHARS), (users, 2))
+    names = np.array([f"{NAME_CHARS[a]}{NAME_CHARS[b]}{i % 1000}" for i, (a, b) in enumerate(name_codes)], dtype=object)
+
+    # 观看开始时间：最近 days 天内，集中在晚间
+    day_offsets = rng.integers(0, days, rows)
+    start_minutes = np.clip(rng.normal(20 * 60, 90, rows), 0, 24 * 60 - 1).astype(np.int64)
+    start = (np.datetime64(end_date) - day_offsets.astype('timedelta64[D]')).astype('datetime64[m]') \
+        + start_minutes.astype('timedelta64[m]')
+
+    # 观看时长：约 60% 的记录达到 40 分钟
+    minutes = np.clip(rng.gamma(2.0, 28, rows), 1, 300).astype(np.int64)
+    seconds = rng.integers(0, 60, rows)
+
+    headers = HEADER_SETS[variant]
+    df = pd.DataFrame({
+        headers['UserID']: user_ids,
+        headers['UserName']: names[user_index]
+    })
+    if variant == 'duration':
+        df[headers['StartTime']] = pd.Series(start).dt.strftime('%Y-%m-%d %H:%M:%S').to_numpy()
+        df[headers['Duration']] = format_durations(minutes, seconds, rng)
+    else:
+        end = start + (minutes * 60 + seconds).astype('timedelta64[s]')
+        df[headers['StartTime']] = pd.Series(start).dt.strftime('%Y/%m/%d %H:%M:%S').to_numpy()
+        df[headers['EndTime']] = pd.Series(end).dt.strftime('%Y/%m/%d %H:%M:%S').to_numpy()
+
+    df[EXTRA_COLUMNS[0]] = DEVICES[rng.integers(0, len(DEVICES), rows)]
+    df[EXTRA_COLUMNS[1]] = REGIONS[rng.integers(0, len(REGIONS), rows)]
+    df[EXTRA_COLUMNS[2]] = rng.poisson(3, rows)
+
+    # 追加完全重复的行，并打乱顺序
+    duplicates = int(rows * duplicate_rate)
+    if duplicates > 0:
+        df = pd.concat([df, df.iloc[rng.integers(0, rows, duplicates)]], ignore_index=True)
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+def write_viewing_log(df: pd.DataFrame, path: str) -> int:
+    """按扩展名写入文件，返回文件大小（字节）"""
+    file_format = os.path.splitext(path)[1].lower().lstrip('.')
+    if file_format == 'csv':
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+    elif file_format == 'tsv':
+        df.to_csv(path, index=False, sep='\t', encoding='utf-8-sig')
+    elif file_format == 'xlsx':
+        df.to_excel(path, index=False, engine='openpyxl')
+    elif file_format == 'json':
+        df.to_json(path, orient='records', force_ascii=False)
+    else:
+        raise ValueError(f'不支持的格式: {file_format}，支持: {", ".join(FORMATS)}')
+    return os.path.getsize(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成合成的直播观看记录')
+    parser.add_argument('output', help='输出文件（.csv / .xlsx / .json / .tsv）')
+    parser.add_argument('--users', type=int, default=10000, help='用户数')
+    parser.add_argument('--days', type=int, default=30, help='覆盖最近多少天')
+    parser.add_argument('--sessions-per-user', type=float, default=5, help='每个用户平均的观看次数')
+    parser.add_argument('--duplicate-rate', type=float, default=0.05, help='完全重复的行所占比例')
+    parser.add_argument('--variant', choices=VARIANTS, default='duration', help='时长列格式')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    started = datetime.now()
+    log = generate_viewing_log(args.users, args.days, args.sessions_per_user, args.duplicate_rate,
+                               args.variant, args.seed)
+    size = write_viewing_log(log, args.output)
+    print(f"已生成 {args.output}: {len(log):,} 行, {size / 1024 / 1024:.1f} MB, "
+          f"耗时 {(datetime.now() - started).total_seconds():.1f} 秒")
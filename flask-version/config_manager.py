@@ -4,16 +4,90 @@
 管理系统的可配置参数，如有效时长、积分值、有效期等
 """
 
+import copy
 import json
 import os
+import threading
+import time
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PointsSystemConfig:
+    """积分系统配置"""
+    min_duration_minutes: int
+    points_per_day: int
+    validity_days: int
+    allow_duplicate_daily: bool
+
+
+@dataclass(frozen=True)
+class DataProcessingConfig:
+    """数据处理配置"""
+    max_file_size_mb: int
+    supported_formats: Tuple[str, ...]
+    auto_clean_uploads_days: int
+    batch_size: int
+    streaming_threshold_mb: int
+    frame_cache_mb: int
+
+
+@dataclass(frozen=True)
+class DisplayConfig:
+    """显示配置"""
+    default_page_size: int
+    max_page_size: int
+    date_format: str
+    datetime_format: str
+
+
+@dataclass(frozen=True)
+class QrSystemConfig:
+    """二维码系统配置"""
+    validity_hours: int
+    auto_clean_expired: bool
+    clean_interval_hours: int
+    max_cache_size: int
+
+
+@dataclass(frozen=True)
+class StorageConfig:
+    """积分数据存储配置"""
+    backend: str
+    sqlite_path: str
+
+
+@dataclass(frozen=True)
+class SystemConfig:
+    """系统配置"""
+    session_timeout_hours: int
+    max_login_attempts: int
+    enable_registration: bool
+    debug_mode: bool
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    配置快照（只读），按配置段以属性访问，如 snapshot.points_system.validity_days
+    配置变化时重新生成，热点路径读取属性即可，不必每次解析配置路径
+    """
+    points_system: PointsSystemConfig
+    data_processing: DataProcessingConfig
+    display: DisplayConfig
+    qr_system: QrSystemConfig
+    storage: StorageConfig
+    system: SystemConfig
+
 
 class ConfigManager:
     """配置管理器"""
     
-    def __init__(self, config_file: str = 'system_config.json'):
+    def __init__(self, config_file: str = 'system_config.json', reload_interval: float = 1.0):
         self.config_file = config_file
+        self.reload_interval = reload_interval    # 检查配置文件是否被其他进程修改的最小间隔（秒）
         self.default_config = {
             # 积分系统配置
             'points_system': {
@@ -28,7 +102,9 @@ class ConfigManager:
                 'max_file_size_mb': 50,          # 最大文件大小（MB）
                 'supported_formats': ['.csv', '.xlsx', '.xls', '.json', '.tsv'],
                 'auto_clean_uploads_days': 7,    # 自动清理上传文件的天数
-                'batch_size': 1000               # 批处理大小
+                'batch_size': 1000,              # 批处理大小（流式导入每块行数）
+                'streaming_threshold_mb': 20,    # 超过此大小的CSV/TSV文件使用分块流式导入（MB）
+                'frame_cache_mb': 256            # 已解析数据表的进程内缓存上限（MB）
             },
             
             # 显示配置
@@ -47,6 +123,12 @@ class ConfigManager:
                 'max_cache_size': 1000          # 最大缓存数量
             },
 
+            # 积分数据存储配置
+            'storage': {
+                'backend': 'csv',                # 存储后端：csv（按管理员目录存放CSV文件）、sqlite 或 bitmap（日位图）
+                'sqlite_path': 'data/points.db'  # SQLite 数据库文件路径（首次访问时自动导入已有CSV数据）
+            },
+
             # 系统配置
             'system': {
                 'session_timeout_hours': 24,     # 会话超时时间（小时）
@@ -64,7 +146,55 @@ class ConfigManager:
         }
         
         # 加载配置
+        # 快照与生成它的配置字典一起缓存：配置字典只整体替换（不原地修改），
+        # 读取方发现 self.config 已不是生成快照的那个字典时重新生成，不会缓存旧配置的快照
+        self._snapshot: Optional[Tuple[Dict[str, Any], ConfigSnapshot]] = None
+        self._reload_lock = threading.RLock()
+        self._file_signature: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
         self.config = self.load_config()
+        self._file_signature = self._stat_config_file()
+    
+    def _stat_config_file(self) -> Optional[Tuple[int, int, int]]:
+        """配置文件的 (inode, 修改时间, 大小)，原子替换后 inode 会变化"""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    def check_reload(self, force: bool = False):
+        """
+        检查配置文件是否被其他进程（如其他 gunicorn worker）修改，是则重新加载
+        为降低开销，两次检查之间至少间隔 reload_interval 秒（force=True 时立即检查）
+        """
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        
+        signature = self._stat_config_file()
+        if signature is None or signature == self._file_signature:
+            return
+        
+        with self._reload_lock:
+            signature = self._stat_config_file()
+            if signature is None or signature == self._file_signature:
+                return
+            
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            except Exception as e:
+                print(f"⚠️ 重新加载配置文件失败，继续使用当前配置: {str(e)}")
+                self._file_signature = signature
+                return
+            
+            # 整体替换配置字典，读取方不会看到更新了一半的配置
+            self.config = self._merge_config(self.default_config, config)
+            self._snapshot = None
+            self._file_signature = signature
+            print("🔄 检测到配置文件变化，已重新加载配置")
     
     def load_config(self) -> Dict[str, Any]:
         """加载配置文件"""
@@ -104,19 +234,30 @@ class ConfigManager:
         return merged
     
     def save_config(self, config: Optional[Dict[str, Any]] = None) -> bool:
-        """保存配置文件"""
+        """
+        保存配置文件并替换内存中的配置
+        config: 新的配置字典（调用方不应再修改它），为None时保存当前配置
+        """
         try:
-            config_to_save = config if config is not None else self.config
-            
-            # 更新元信息
-            config_to_save['meta']['last_updated'] = datetime.now().isoformat()
-            
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config_to_save, f, ensure_ascii=False, indent=2)
-            
-            # 更新内存中的配置
-            if config is not None:
-                self.config = config
+            with self._reload_lock:
+                # 在副本上修改，正在读取 self.config 的线程不会看到修改了一半的配置
+                config_to_save = config if config is not None else copy.deepcopy(self.config)
+                
+                # 更新元信息
+                config_to_save['meta']['last_updated'] = datetime.now().isoformat()
+                
+                # 先写入临时文件再原子替换，避免其他进程读到写了一半的配置
+                tmp_file = f"{self.config_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(config_to_save, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.config_file)
+                
+                # 先替换配置，再清除快照（与 check_reload 的顺序相同）
+                self.config = config_to_save
+                self._snapshot = None
+                
+                # 自己写入的文件不需要重新加载
+                self._file_signature = self._stat_config_file()
             
             return True
         
@@ -129,6 +270,9 @@ class ConfigManager:
         获取配置值
         key_path: 配置路径，如 'points_system.min_duration_minutes'
         """
+        if time.monotonic() >= self._next_check:
+            self.check_reload()
+        
         try:
             keys = key_path.split('.')
             value = self.config
@@ -141,6 +285,46 @@ class ConfigManager:
         except (KeyError, TypeError):
             return default
     
+    @staticmethod
+    def _set_value(config: Dict[str, Any], key_path: str, value: Any):
+        """在配置字典中按路径设置值"""
+        keys = key_path.split('.')
+        
+        # 导航到目标位置
+        for key in keys[:-1]:
+            if key not in config:
+                config[key] = {}
+            config = config[key]
+        
+        # 设置值
+        config[keys[-1]] = value
+    
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """当前配置的只读快照，配置变化后首次访问时重新生成"""
+        if time.monotonic() >= self._next_check:
+            self.check_reload()
+        config = self.config
+        cached = self._snapshot
+        if cached is None or cached[0] is not config:
+            cached = (config, self._build_snapshot(config))
+            self._snapshot = cached
+        return cached[1]
+    
+    def _build_snapshot(self, config: Dict[str, Any]) -> ConfigSnapshot:
+        """由配置字典生成快照，缺失的配置项使用默认值"""
+        sections = {}
+        for section_field in fields(ConfigSnapshot):
+            section_class = section_field.type
+            section = config.get(section_field.name, {})
+            default_section = self.default_config[section_field.name]
+            values = {}
+            for field in fields(section_class):
+                value = section.get(field.name, default_section[field.name])
+                values[field.name] = tuple(value) if isinstance(value, list) else value
+            sections[section_field.name] = section_class(**values)
+        return ConfigSnapshot(**sections)
+    
     def set(self, key_path: str, value: Any, updated_by: str = 'admin') -> bool:
         """
         设置配置值
@@ -149,34 +333,52 @@ class ConfigManager:
         updated_by: 更新者
         """
         try:
-            keys = key_path.split('.')
-            config = self.config
-            
-            # 导航到目标位置
-            for key in keys[:-1]:
-                if key not in config:
-                    config[key] = {}
-                config = config[key]
-            
-            # 设置值
-            config[keys[-1]] = value
-            
-            # 更新元信息
-            self.config['meta']['updated_by'] = updated_by
-            
-            # 保存配置
-            return self.save_config()
+            with self._reload_lock:
+                # 在最新的配置的副本上修改，避免覆盖其他进程保存的配置；保存后整体替换
+                self.check_reload(force=True)
+                candidate = copy.deepcopy(self.config)
+                self._set_value(candidate, key_path, value)
+                
+                # 更新元信息
+                candidate['meta']['updated_by'] = updated_by
+                
+                # 保存配置
+                return self.save_config(candidate)
         
         except Exception as e:
             print(f"❌ 设置配置失败: {str(e)}")
             return False
     
-    def validate_config(self) -> Dict[str, list]:
-        """验证配置的合理性"""
+    def update_many(self, updates: Dict[str, Any], updated_by: str = 'admin') -> Dict[str, list]:
+        """
+        批量设置配置值：先在副本上应用全部修改并验证，验证通过后只写一次配置文件
+        updates: 配置路径到新值的映射，如 {'points_system.validity_days': 90}
+        返回验证错误（与 validate_config 格式相同），有错误时不做任何修改
+        """
+        with self._reload_lock:
+            # 在最新的配置上修改，避免覆盖其他进程保存的配置
+            self.check_reload(force=True)
+            candidate = copy.deepcopy(self.config)
+            for key_path, value in updates.items():
+                self._set_value(candidate, key_path, value)
+            
+            errors = self.validate_config(candidate)
+            if errors:
+                return errors
+            
+            candidate['meta']['updated_by'] = updated_by
+            if not self.save_config(candidate):
+                return {'meta': ['保存配置文件失败']}
+        
+        return {}
+    
+    def validate_config(self, config: Optional[Dict[str, Any]] = None) -> Dict[str, list]:
+        """验证配置的合理性（默认验证当前配置）"""
+        config = config if config is not None else self.config
         errors = {}
         
         # 验证积分系统配置
-        points_config = self.config.get('points_system', {})
+        points_config = config.get('points_system', {})
         
         if points_config.get('min_duration_minutes', 0) <= 0:
             errors.setdefault('points_system', []).append('最小有效时长必须大于0')
@@ -188,16 +390,22 @@ class ConfigManager:
             errors.setdefault('points_system', []).append('积分有效期必须大于0')
         
         # 验证数据处理配置
-        data_config = self.config.get('data_processing', {})
+        data_config = config.get('data_processing', {})
         
         if data_config.get('max_file_size_mb', 0) <= 0:
             errors.setdefault('data_processing', []).append('最大文件大小必须大于0')
         
         if data_config.get('batch_size', 0) <= 0:
             errors.setdefault('data_processing', []).append('批处理大小必须大于0')
+
+        if data_config.get('streaming_threshold_mb', 0) <= 0:
+            errors.setdefault('data_processing', []).append('流式导入阈值必须大于0')
+
+        if data_config.get('frame_cache_mb', 0) <= 0:
+            errors.setdefault('data_processing', []).append('数据缓存上限必须大于0')
         
         # 验证显示配置
-        display_config = self.config.get('display', {})
+        display_config = config.get('display', {})
 
         if display_config.get('default_page_size', 0) <= 0:
             errors.setdefault('display', []).append('默认分页大小必须大于0')
@@ -206,7 +414,7 @@ class ConfigManager:
             errors.setdefault('display', []).append('最大分页大小必须大于0')
 
         # 验证二维码系统配置
-        qr_config = self.config.get('qr_system', {})
+        qr_config = config.get('qr_system', {})
 
         validity_hours = qr_config.get('validity_hours', 0)
         # -1 表示长期有效，是合法值
@@ -222,6 +430,12 @@ class ConfigManager:
         if qr_config.get('max_cache_size', 0) <= 0:
             errors.setdefault('qr_system', []).append('最大缓存数量必须大于0')
 
+        # 验证存储配置
+        storage_config = config.get('storage', {})
+
+        if storage_config.get('backend', 'csv') not in ('csv', 'sqlite', 'bitmap'):
+            errors.setdefault('storage', []).append('存储后端必须是 csv、sqlite 或 bitmap')
+
         return errors
     
     def get_config_schema(self) -> Dict[str, Any]:
@@ -282,11 +496,27 @@ class ConfigManager:
                     },
                     'batch_size': {
                         'title': '批处理大小',
-                        'description': '数据处理时的批次大小',
+                        'description': '数据处理时的批次大小，流式导入时每块读取的行数',
                         'type': 'number',
                         'min': 100,
                         'max': 10000,
                         'unit': '条'
+                    },
+                    'streaming_threshold_mb': {
+                        'title': '流式导入阈值',
+                        'description': '超过此大小的CSV/TSV文件将分块流式导入，以降低内存占用',
+                        'type': 'number',
+                        'min': 1,
+                        'max': 10240,
+                        'unit': 'MB'
+                    },
+                    'frame_cache_mb': {
+                        'title': '数据缓存上限',
+                        'description': '进程内缓存已解析积分数据的内存上限，超出时淘汰最久未使用的数据',
+                        'type': 'number',
+                        'min': 1,
+                        'max': 65536,
+                        'unit': 'MB'
                     }
                 }
             },
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+积分日位图模块
+每个用户在有效期内每天最多一条积分记录，因此用户的积分状态就是一组日期：
+以固定宽度的位图（每天一位，按日期序号对容量取模的环形布局）保存，
+写入记录为按位或，过期为清除离开有效期的日期位，有效天数为位计数；
+每天的积分单独保存（该日期首次写入时的每日积分），总积分为各有效日期的积分之和
+"""
+
+import os
+from datetime import date
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# 0~255 每个字节中 1 的个数
+POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+# 1970-01-01 的日期序号（date.toordinal）
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_ordinals(dates: Iterable) -> np.ndarray:
+    """日期（date、字符串或 datetime64）转换为日期序号"""
+    days = pd.to_datetime(pd.Series(dates, dtype=object)).to_numpy(dtype='datetime64[D]')
+    return days.astype(np.int64) + EPOCH_ORDINAL
+
+
+class DayBitmap:
+    """
+    用户 × 日期 位图
+    bits[行, 字节] 的第 k 位表示日期序号 d（d % capacity == 字节 * 8 + k）是否有积分，day_points[d % capacity] 为该日期的积分；
+    只保存 cutoff 之后 window_days 天内的日期，cutoff 及之前的日期已过期
+    points_per_day: 新写入日期的默认每日积分
+    """
+
+    def __init__(self, window_days: int, cutoff_date: date, user_ids: Optional[np.ndarray] = None,
+                 bits: Optional[np.ndarray] = None, points_per_day: int = 1,
+                 day_points: Optional[np.ndarray] = None):
+        self.window_days = int(window_days)
+        self.capacity = (self.window_days + 7) // 8 * 8
+        self.cutoff = cutoff_date.toordinal()
+        self.points_per_day = int(points_per_day)
+        self.user_ids = np.array([], dtype=object) if user_ids is None else np.asarray(user_ids, dtype=object)
+        if bits is None:
+            bits = np.zeros((len(self.user_ids), self.capacity // 8), dtype=np.uint8)
+        self.bits = bits
+        if day_points is None:
+            day_points = np.zeros(self.capacity, dtype=np.int64)
+        self.day_points = np.asarray(day_points, dtype=np.int64)
+        self._positions: Optional[pd.Index] = None
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def cutoff_date(self) -> date:
+        return date.fromordinal(self.cutoff)
+
+    def _index(self) -> pd.Index:
+        """UserID -> 行号 的哈希索引"""
+        if self._positions is None:
+            self._positions = pd.Index(self.user_ids)
+        return self._positions
+
+    def _clear_days(self, first: int, last: int) -> int:
+        """清除日期序号 first..last（含）的位，返回清除的记录数"""
+        if last < first:
+            return 0
+        if last - first + 1 >= self.capacity:
+            removed = self.count()
+            self.bits[:] = 0
+            self.day_points[:] = 0
+            return removed
+
+        removed = 0
+        for ordinal in range(first, last + 1):
+            byte, mask = divmod(ordinal % self.capacity, 8)
+            column = self.bits[:, byte]
+            hit = (column & (1 << mask)) != 0
+            removed += int(hit.sum())
+            column &= np.uint8(~(1 << mask) & 0xFF)
+            self.day_points[ordinal % self.capacity] = 0
+        return removed
+
+    def expire(self, cutoff_date: date) -> int:
+        """移除 cutoff_date 及之前的记录，返回移除的记录数"""
+        cutoff = cutoff_date.toordinal()
+        if cutoff <= self.cutoff:
+            return 0
+        removed = self._clear_days(self.cutoff + 1, cutoff)
+        self.cutoff = cutoff
+        return removed
+
+    def resize(self, window_days: int):
+        """
+        调整有效期天数，cutoff 不变，保留 cutoff 之后新容量范围内的记录
+        缩短有效期时应先 expire 到新的 cutoff
+        """
+        capacity = (int(window_days) + 7) // 8 * 8
+        if capacity == self.capacity:
+            self.window_days = int(window_days)
+            return
+
+        bits = np.zeros((len(self.user_ids), capacity // 8), dtype=np.uint8)
+        day_points = np.zeros(capacity, dtype=np.int64)
+        for ordinal in range(self.cutoff + 1, self.cutoff + min(self.capacity, capacity) + 1):
+            old_byte, old_bit = divmod(ordinal % self.capacity, 8)
+            new_byte, new_bit = divmod(ordinal % capacity, 8)
+            hit = ((self.bits[:, old_byte] >> old_bit) & 1).astype(np.uint8)
+            bits[:, new_byte] |= hit << new_bit
+            day_points[ordinal % capacity] = self.day_points[ordinal % self.capacity]
+
+        self.window_days, self.capacity, self.bits, self.day_points = int(window_days), capacity, bits, day_points
+
+    def add(self, user_ids: Iterable, dates: Iterable, points_per_day: Optional[int] = None) -> int:
+        """
+        写入 (用户, 日期) 记录，返回新增的记录数
+        已存在、已过期或晚于有效期（cutoff + window_days，即未来日期）的记录被忽略，不会推进 cutoff；
+        尚无记录的日期的积分设为 points_per_day（为None时使用 self.points_per_day），已有记录的日期保持原积分
+        """
+        if points_per_day is None:
+            points_per_day = self.points_per_day
+        records = pd.DataFrame({
+            'UserID': pd.Series(user_ids, dtype=object).astype(str).to_numpy(dtype=object),
+            'Ordinal': to_ordinals(dates)
+        })
+        records = records[(records['Ordinal'] > self.cutoff) & (records['Ordinal'] <= self.cutoff + self.window_days)]
+        if records.empty:
+            return 0
+
+        # 先对本次的用户ID去重，只对不重复的ID查找行号；新用户追加到末尾
+        codes, unique_ids = pd.factorize(records['UserID'].to_numpy())
+        unique_rows = self._index().get_indexer(unique_ids)
+        new_users = unique_rows < 0
+        if new_users.any():
+            unique_rows[new_users] = np.arange(len(self.user_ids), len(self.user_ids) + int(new_users.sum()))
+            self.user_ids = np.concatenate([self.user_ids, np.asarray(unique_ids[new_users], dtype=object)])
+            self.bits = np.vstack([self.bits, np.zeros((int(new_users.sum()), self.bits.shape[1]), dtype=np.uint8)])
+            self._positions = None
+
+        rows = unique_rows[codes]
+        slots = records['Ordinal'].to_numpy() % self.capacity
+        byte, mask = slots // 8, (1 << (slots % 8)).astype(np.uint8)
+
+        # 日期的积分在该日期第一次有记录时确定
+        new_slots = np.unique(slots)
+        new_slots = new_slots[~self._slot_has_records(new_slots)]
+        self.day_points[new_slots] = points_per_day
+
+        # 重复的 (用户, 日期) 按位或后不变，新增记录数由写入前后的位计数得出
+        before = self.count()
+        np.bitwise_or.at(self.bits, (rows, byte), mask)
+        return self.count() - before
+
+    def _slot_has_records(self, slots: np.ndarray) -> np.ndarray:
+        """各日期位是否已有任何用户的记录"""
+        if len(self.user_ids) == 0:
+            return np.zeros(len(slots), dtype=bool)
+        return (self.bits[:, slots // 8] & (1 << (slots % 8)).astype(np.uint8)).any(axis=0)
+
+    def totals(self) -> np.ndarray:
+        """每个用户的总积分（各有效日期的积分之和）"""
+        totals = np.zeros(len(self.user_ids), dtype=np.int64)
+        if len(self.user_ids) == 0:
+            return totals
+        # 按积分值分组：同一积分的日期位合成字节掩码，位计数后乘以积分（通常只有一两种积分值）
+        for points in np.unique(self.day_points):
+            if points == 0:
+                continue
+            masks = np.packbits(self.day_points == points, bitorder='little')
+            totals += POPCOUNT_TABLE[self.bits & masks].sum(axis=1, dtype=np.int64) * int(points)
+        return totals
+
+    def counts(self) -> np.ndarray:
+        """每个用户的有效天数"""
+        if len(self.user_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return POPCOUNT_TABLE[self.bits].sum(axis=1, dtype=np.int64)
+
+    def count(self) -> int:
+        """记录总数"""
+        return int(POPCOUNT_TABLE[self.bits].sum(dtype=np.int64))
+
+    def compact(self):
+        """移除已没有有效记录的用户"""
+        keep = self.counts() > 0
+        if not keep.all():
+            self.user_ids, self.bits = self.user_ids[keep], self.bits[keep]
+            self._positions = None
+
+    def remove_users(self, user_ids: Iterable) -> int:
+        """移除指定用户，返回移除的用户数"""
+        drop = np.isin(self.user_ids, np.asarray(list(user_ids), dtype=object))
+        if drop.any():
+            self.user_ids, self.bits = self.user_ids[~drop], self.bits[~drop]
+            self._positions = None
+        return int(drop.sum())
+
+    def summary(self, points_per_day: Optional[int] = None) -> pd.DataFrame:
+        """用户积分汇总（UserID, TotalPoints, ValidDays），只包含有效天数大于0的用户"""
+        valid_days = self.counts()
+        total_points = self.totals() if points_per_day is None else valid_days * points_per_day
+        keep = valid_days > 0
+        return pd.DataFrame({
+            'UserID': self.user_ids[keep].astype(str),
+            'TotalPoints': total_points[keep],
+            'ValidDays': valid_days[keep]
+        })
+
+    def iter_history(self, points_per_day: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """按日期顺序逐日生成 points_history.csv 格式的记录（UserID, Date, Points），积分默认为各日期的积分"""
+        for ordinal in range(self.cutoff + 1, self.cutoff + self.capacity + 1):
+            byte, bit = divmod(ordinal % self.capacity, 8)
+            rows = np.flatnonzero(self.bits[:, byte] & (1 << bit))
+            if len(rows) > 0:
+                yield pd.DataFrame({
+                    'UserID': self.user_ids[rows],
+                    'Date': date.fromordinal(ordinal).isoformat(),
+                    'Points': int(self.day_points[ordinal % self.capacity]) if points_per_day is None
+                    else points_per_day
+                })
+
+    @classmethod
+    def from_history(cls, history_df: pd.DataFrame, window_days: int, cutoff_date: date,
+                     points_per_day: int = 1) -> 'DayBitmap':
+        """由 points_history.csv 格式的记录建立位图，各日期的积分取自记录的 Points 列"""
+        bitmap = cls(window_days, cutoff_date, points_per_day=points_per_day)
+        if not history_df.empty:
+            for points, records in history_df.groupby('Points', sort=False):
+                bitmap.add(records['UserID'], records['Date'], int(points))
+        return bitmap
+
+    def save(self, path: str):
+        """原子写入 .npz 文件"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                user_ids=self.user_ids.astype(str),
+                bits=self.bits,
+                day_points=self.day_points,
+                meta=np.array([self.window_days, self.cutoff, self.points_per_day, self.count()], dtype=np.int64)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'DayBitmap':
+        with np.load(path, allow_pickle=False) as data:
+            window_days, cutoff, points_per_day = (int(value) for value in data['meta'][:3])
+            bitmap = cls(window_days, date.fromordinal(cutoff), data['user_ids'].astype(object),
+                         data['bits'], points_per_day)
+            if 'day_points' in data.files:
+                bitmap.day_points = data['day_points'].astype(np.int64)
+            else:
+                # 早期保存的文件没有各日期的积分，按保存时的每日积分计算
+                bitmap.day_points[:] = points_per_day
+            return bitmap
+
+    @classmethod
+    def read_count(cls, path: str) -> int:
+        """读取保存时记录的记录总数（只读取 meta，不加载位图）；早期保存的文件没有记录时加载位图计数"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = data['meta']
+            if len(meta) > 3:
+                return int(meta[3])
+        return cls.load(path).count()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+数据表缓存模块
+在进程内缓存已解析的管理员数据（DataFrame 等），以文件路径、修改时间和大小校验有效性，
+按配置的内存上限做 LRU 淘汰
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from config_manager import config_manager
+
+
+class DataFrameCache:
+    """
+    按 (路径, 修改时间, 大小) 校验的 LRU 缓存
+    同一文件可缓存多种解析结果（kind），例如完整数据表和行数；文件变化后自动失效
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes    # 为None时使用配置 data_processing.frame_cache_mb
+        self.entries: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _budget_bytes(self) -> int:
+        if self.max_bytes is not None:
+            return self.max_bytes
+        return int(config_manager.snapshot.data_processing.frame_cache_mb) * 1024 * 1024
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        """估算缓存对象的内存占用（字节）"""
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(index=True, deep=True).sum())
+        return sys.getsizeof(value)
+
+    @staticmethod
+    def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: str, loader: Callable[[str], Any], kind: str = 'frame') -> Any:
+        """
+        获取 path 的解析结果，缓存未命中或文件已变化时调用 loader(path) 重新解析
+        返回 DataFrame 时为浅拷贝，调用方可以增删列，但不应原地修改单元格
+        """
+        key = (path, kind)
+        signature = self._file_signature(path)
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and signature is not None and entry['signature'] == signature:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self._share(entry['value'])
+            self.misses += 1
+
+        value = loader(path)
+        # 解析期间文件可能再次被写入，使用解析前的签名，下次访问时会发现变化
+        if signature is not None and value is not None:
+            self._put(key, signature, value)
+        return self._share(value)
+
+    @staticmethod
+    def _share(value: Any) -> Any:
+        if isinstance(value, pd.DataFrame):
+            return value.copy(deep=False)
+        return value
+
+    def _put(self, key: Tuple[str, str], signature: Tuple[int, int], value: Any):
+        size = self._estimate_size(value)
+        budget = self._budget_bytes()
+
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old['size']
+
+            # 超过整个内存上限的对象不缓存
+            if size > budget:
+                return
+
+            self.entries[key] = {'signature': signature, 'value': value, 'size': size}
+            self.total_bytes += size
+
+            while self.total_bytes > budget and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted['size']
+                self.evictions += 1
+
+    def invalidate(self, path: str):
+        """文件被写入后使其所有缓存失效"""
+        with self._lock:
+            for key in [key for key in self.entries if key[0] == path]:
+                self.total_bytes -= self.entries.pop(key)['size']
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计：命中/未命中次数、条目数和内存占用"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size_bytes': self.total_bytes,
+                'budget_bytes': self._budget_bytes()
+            }
+
+
+# 全局数据表缓存实例
+frame_cache = DataFrameCache()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+运行指标模块
+在进程内累计请求耗时、上传吞吐等计数器，按 Prometheus 文本格式输出；
+需要读取文件或数据库的指标由采集函数计算，并按设定的间隔缓存结果，抓取时不扫描数据文件
+（指标按进程统计，多个工作进程时每个进程分别输出）
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 请求耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 指标输出的 Content-Type
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (标签字典, 数值)
+Sample = Tuple[Dict[str, str], float]
+
+# (指标名, 类型, 说明, 样本列表)
+MetricFamily = Tuple[str, str, str, List[Sample]]
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def family(self) -> MetricFamily:
+        with self._lock:
+            samples = [(dict(zip(self.labelnames, key)), value) for key, value in self.values.items()]
+        return self.name, self.type, self.help, samples
+
+
+class Gauge(Counter):
+    """可任意设置的数值"""
+
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+
+class Histogram:
+    """按分桶累计观测值的直方图"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各分桶计数..., 总和, 次数]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def family(self) -> MetricFamily:
+        samples = []
+        with self._lock:
+            for key, state in self.values.items():
+                labels = dict(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets + (float('inf'),), state[:len(self.buckets)] + [state[-1]]):
+                    samples.append((dict(labels, __suffix__='_bucket', le=format_value(bound)), count))
+                samples.append((dict(labels, __suffix__='_sum'), state[-2]))
+                samples.append((dict(labels, __suffix__='_count'), state[-1]))
+        return self.name, self.type, self.help, samples
+
+
+class Collector:
+    """采集函数及其缓存结果，距上次采集不足 interval 秒时直接使用缓存"""
+
+    def __init__(self, func: Callable[[], Iterable[MetricFamily]], interval: float):
+        self.func = func
+        self.interval = interval
+        self.families: List[MetricFamily] = []
+        self.collected_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            now = time.monotonic()
+            if self.collected_at is None or now - self.collected_at >= self.interval:
+                try:
+                    self.families = list(self.func())
+                except Exception as e:
+                    print(f"⚠️ 指标采集失败 {getattr(self.func, '__name__', self.func)}: {str(e)}")
+                self.collected_at = now
+            return self.families
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics: List[object] = []
+        self.collectors: List[Collector] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, func: Callable[[], Iterable[MetricFamily]], interval: float = 0):
+        """
+        注册采集函数，func() 返回 (指标名, 类型, 说明, [(标签, 数值), ...]) 列表
+        interval: 结果缓存的秒数，需要读取文件或数据库的采集应设置较长的间隔
+        """
+        self.collectors.append(Collector(func, interval))
+        return func
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        families = [metric.family() for metric in self.metrics]
+        for collector in self.collectors:
+            families.extend(collector.collect())
+
+        lines = []
+        for name, metric_type, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                labels = dict(labels)
+                suffix = labels.pop('__suffix__', '')
+                lines.append(f"{name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
+
+# 请求耗时（按路由）
+request_latency = metrics_registry.histogram(
+    'points_http_request_duration_seconds', '请求处理耗时（秒）', ('endpoint', 'method'))
+request_count = metrics_registry.counter(
+    'points_http_requests_total', '请求次数', ('endpoint', 'method', 'status'))
+
+# 上传处理
+upload_jobs = metrics_registry.counter('points_upload_jobs_total', '上传任务数', ('status',))
+upload_rows = metrics_registry.counter('points_upload_rows_total', '上传文件读取的数据行数')
+upload_seconds = metrics_registry.counter('points_upload_seconds_total', '上传任务处理耗时（秒）')
+upload_stage_seconds = metrics_registry.counter(
+    'points_upload_stage_seconds_total', '上传处理各阶段耗时（秒）', ('stage',))
+upload_last_rows_per_second = metrics_registry.gauge(
+    'points_upload_last_rows_per_second', '最近一次成功上传的处理速度（行/秒）')
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float):
+    """记录一次请求的耗时和状态码"""
+    request_latency.observe(seconds, endpoint=endpoint, method=method)
+    request_count.inc(endpoint=endpoint, method=method, status=status)
+
+
+def observe_upload(success: bool, rows: int, seconds: float, stages: Iterable[Dict]):
+    """记录一次上传任务：stages 为 StageTimer.to_list() 的结果"""
+    upload_jobs.inc(status='done' if success else 'failed')
+    for stage in stages:
+        upload_stage_seconds.inc(stage['seconds'], stage=stage['stage'])
+    if not success:
+        return
+    upload_rows.inc(rows)
+    upload_seconds.inc(seconds)
+    if seconds > 0:
+        upload_last_rows_per_second.set(round(rows / seconds, 1))
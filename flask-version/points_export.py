@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+积分数据导出模块
+CSV 逐块编码并流式输出；XLSX 是 zip 格式，需要先完整写入临时文件（逐行写入，内存占用不随行数增长），
+写完后再按文件输出。两种格式都不在内存中生成完整文件
+"""
+
+import os
+import tempfile
+from typing import Iterable, Iterator, List
+
+import pandas as pd
+from openpyxl import Workbook
+
+# 支持的导出格式及其 MIME 类型
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# 每块编码的行数
+EXPORT_CHUNK_ROWS = 50000
+
+# 输出 XLSX 临时文件时每次读取的字节数
+FILE_READ_BYTES = 256 * 1024
+
+
+def iter_csv(chunks: Iterable[pd.DataFrame], columns: List[str]) -> Iterator[bytes]:
+    """
+    逐块生成 CSV 内容（UTF-8 BOM，便于 Excel 直接打开中文）
+    """
+    header = pd.DataFrame(columns=columns).to_csv(index=False)
+    yield ('\ufeff' + header).encode('utf-8')
+
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        yield chunk[columns].to_csv(header=False, index=False).encode('utf-8')
+
+
+def write_xlsx(chunks: Iterable[pd.DataFrame], columns: List[str], sheet_title: str = 'Sheet1') -> str:
+    """
+    使用 openpyxl 只写模式逐行写入工作表，保存为临时文件并返回其路径（调用方负责删除）
+    整个工作簿写完后才能输出，因此 XLSX 导出在文件生成前不会发送任何内容
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=sheet_title)
+    worksheet.append(columns)
+
+    for chunk in chunks:
+        for row in chunk[columns].itertuples(index=False, name=None):
+            # numpy 标量转换为 Python 原生类型
+            worksheet.append([value.item() if hasattr(value, 'item') else value for value in row])
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(tmp_path)
+    except Exception:
+        remove_file(tmp_path)
+        raise
+    return tmp_path
+
+
+def iter_file(path: str) -> Iterator[bytes]:
+    """分块读出文件内容"""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(FILE_READ_BYTES)
+            if not data:
+                break
+            yield data
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
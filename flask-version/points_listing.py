@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+积分列表模块
+为积分管理页面和上传结果页面提供筛选、排序和分页：每个可排序列只排序一次（预先排好的行号数组），
+相同筛选条件的结果按排序缓存，翻页只取当前页的行；数据写入后版本变化，列表随之重建
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from user_index import NgramNameIndex
+
+# 可排序的列
+SORTABLE_COLUMNS = ('TotalPoints', 'ValidDays', 'UserID', 'UserName')
+
+# 每个列表缓存的筛选结果数
+FILTER_CACHE_SIZE = 32
+
+
+class PointsListing:
+    """
+    一份用户积分数据的列表视图
+    翻页可以按页码，也可以按游标（上一页最后一行/下一页第一行在排序中的位置），
+    游标中包含数据版本，数据变化后旧游标失效，回退到按页码
+    """
+
+    def __init__(self, user_points: pd.DataFrame, version: Hashable):
+        df = user_points.reset_index(drop=True)
+        if 'UserName' not in df.columns:
+            df['UserName'] = '未知用户'
+        self.df = df
+        self.token = hashlib.sha1(repr(version).encode('utf-8')).hexdigest()[:8]
+        self._orders: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._filtered: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+        self._name_index: Optional[NgramNameIndex] = None
+        self._lock = threading.Lock()
+
+    def _order(self, sort_by: str, ascending: bool) -> np.ndarray:
+        """按列排序后的行号（稳定排序，相同值保持原顺序），首次使用时计算"""
+        key = (sort_by, ascending)
+        order = self._orders.get(key)
+        if order is None:
+            if sort_by in SORTABLE_COLUMNS and sort_by in self.df.columns:
+                values = self.df[sort_by].reset_index(drop=True)
+                if values.dtype == object or pd.api.types.is_string_dtype(values):
+                    values = values.fillna('').astype(str)
+                order = values.sort_values(ascending=ascending, kind='stable').index.to_numpy()
+            else:
+                order = np.arange(len(self.df))
+            self._orders[key] = order
+        return order
+
+    def match_user_name(self, name: str) -> pd.Series:
+        """
+        按昵称（不区分大小写的子串）查找本列表中的用户，返回匹配的 UserID
+        用于上传结果等快照数据：昵称索引在首次按昵称筛选时建立，随列表视图一起缓存
+        """
+        with self._lock:
+            if self._name_index is None:
+                self._name_index = NgramNameIndex(self.df['UserName'])
+            name_index = self._name_index
+        rows, _ = name_index.search(name)
+        return self.df['UserID'].iloc[rows].astype(str)
+
+    def _filter_mask(self, search_user_id: str, search_user_name: str, min_points: Optional[int],
+                     max_points: Optional[int], match_user_name: Callable[[str], Optional[pd.Series]]) -> Optional[np.ndarray]:
+        """筛选条件对应的行掩码，没有筛选条件时返回None"""
+        mask = None
+
+        def combine(condition):
+            nonlocal mask
+            condition = np.asarray(condition, dtype=bool)
+            mask = condition if mask is None else mask & condition
+
+        if search_user_id:
+            combine(self.df['UserID'].astype(str).str.contains(search_user_id, case=False, na=False, regex=False))
+
+        if search_user_name:
+            matched_ids = match_user_name(search_user_name)
+            if matched_ids is None:
+                combine(np.zeros(len(self.df), dtype=bool))
+            else:
+                combine(self.df['UserID'].astype(str).isin(matched_ids))
+
+        if min_points is not None:
+            combine(self.df['TotalPoints'] >= min_points)
+
+        if max_points is not None:
+            combine(self.df['TotalPoints'] <= max_points)
+
+        return mask
+
+    def _positions(self, filters: Tuple, sort_by: str, ascending: bool,
+                   match_user_name: Callable[[str], Optional[pd.Series]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        返回 (排序后的行号, 满足筛选条件的行在排序中的位置)
+        同一筛选条件和排序只计算一次
+        """
+        with self._lock:
+            order = self._order(sort_by, ascending)
+            key = (filters, sort_by, ascending)
+            positions = self._filtered.get(key)
+            if positions is not None:
+                self._filtered.move_to_end(key)
+                return order, positions
+
+        mask = self._filter_mask(*filters, match_user_name)
+        positions = np.arange(len(order)) if mask is None else np.flatnonzero(mask[order])
+
+        with self._lock:
+            self._filtered[key] = positions
+            while len(self._filtered) > FILTER_CACHE_SIZE:
+                self._filtered.popitem(last=False)
+        return order, positions
+
+    def rows(self, search_user_id: str = '', search_user_name: str = '', min_points: Optional[int] = None,
+             max_points: Optional[int] = None, sort_by: str = 'TotalPoints', sort_order: str = 'desc',
+             match_user_name: Callable[[str], Optional[pd.Series]] = lambda name: None) -> np.ndarray:
+        """满足筛选条件的所有行号（按排序），用于导出"""
+        filters = (search_user_id or '', search_user_name or '', min_points, max_points)
+        order, positions = self._positions(filters, sort_by, sort_order == 'asc', match_user_name)
+        return order[positions]
+
+    def _parse_cursor(self, cursor: Optional[str]) -> Optional[int]:
+        """解析游标，版本不一致或格式错误时返回None"""
+        if not cursor:
+            return None
+        token, _, position = str(cursor).partition('.')
+        if token != self.token or not position.isdigit():
+            return None
+        return int(position)
+
+    def _cursor(self, position: int) -> str:
+        return f"{self.token}.{position}"
+
+    def page(self, page: int, per_page: int, search_user_id: str = '', search_user_name: str = '',
+             min_points: Optional[int] = None, max_points: Optional[int] = None,
+             sort_by: str = 'TotalPoints', sort_order: str = 'desc',
+             after: Optional[str] = None, before: Optional[str] = None,
+             match_user_name: Callable[[str], Optional[pd.Series]] = lambda name: None) -> Dict[str, Any]:
+        """
+        获取一页数据
+        after/before: 游标，分别表示取该位置之后/之前的一页，优先于 page
+        match_user_name: 按昵称查找用户，返回匹配的 UserID（没有数据时返回None）
+        """
+        per_page = max(int(per_page), 1)
+        filters = (search_user_id or '', search_user_name or '', min_points, max_points)
+        order, positions = self._positions(filters, sort_by, sort_order == 'asc', match_user_name)
+
+        total_records = len(positions)
+        total_pages = (total_records + per_page - 1) // per_page
+
+        after_position, before_position = self._parse_cursor(after), self._parse_cursor(before)
+        if after_position is not None:
+            start = int(np.searchsorted(positions, after_position, side='right'))
+        elif before_position is not None:
+            start = max(int(np.searchsorted(positions, before_position, side='left')) - per_page, 0)
+        else:
+            start = (max(int(page), 1) - 1) * per_page
+
+        window = positions[start:start + per_page]
+        data = self.df.iloc[order[window]]
+
+        return {
+            'data': data,
+            'total_records': total_records,
+            'total_pages': total_pages,
+            'page': start // per_page + 1,
+            'next_cursor': self._cursor(int(window[-1])) if start + per_page < total_records and len(window) else None,
+            'prev_cursor': self._cursor(int(window[0])) if start > 0 and len(window) else None
+        }
+
+
+class PointsListingCache:
+    """按 (数据键, 版本) 缓存列表视图，版本变化（数据写入）后重建"""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[Hashable, PointsListing]' = OrderedDict()
+        self.versions: Dict[Hashable, Hashable] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Hashable, loader: Callable[[], Optional[pd.DataFrame]]) -> Optional[PointsListing]:
+        """
+        获取 key 对应的列表视图；缓存的版本与 version 不一致时调用 loader() 重新加载
+        loader 返回None（没有数据）时返回None
+        """
+        with self._lock:
+            listing = self.entries.get(key)
+            if listing is not None and self.versions.get(key) == version:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return listing
+            self.misses += 1
+
+        user_points = loader()
+        if user_points is None:
+            return None
+        listing = PointsListing(user_points, version)
+
+        with self._lock:
+            self.entries[key] = listing
+            self.versions[key] = version
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                self.versions.pop(evicted, None)
+        return listing
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self.entries.pop(key, None)
+            self.versions.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries)
+            }
+
+
+# 全局积分列表缓存实例
+points_listing_cache = PointsListingCache()
@@ -0,0 +1,1043 @@
+#!/usr/bin/env python3
+"""
+积分数据存储模块
+提供统一的积分历史和用户积分汇总存储接口，支持 CSV 文件、嵌入式 SQLite 和日位图三种后端
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import date
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from day_bitmap import DayBitmap
+from frame_cache import frame_cache
+from user_index import NgramNameIndex, UserLookupIndex
+
+# 用户积分汇总的标准列
+USER_POINTS_COLUMNS = ['UserID', 'TotalPoints', 'ValidDays', 'UserName']
+
+# 积分历史记录的标准列
+HISTORY_COLUMNS = ['UserID', 'Date', 'Points']
+
+
+def select_new_daily_records(history_df: pd.DataFrame, daily_stats: pd.DataFrame, points_per_day: int) -> pd.DataFrame:
+    """
+    从每日统计中筛选出历史记录里尚不存在的 (UserID, Date) 记录
+    使用 MultiIndex 哈希反连接，耗时与新旧记录数之和成线性关系
+    """
+    candidates = pd.DataFrame({
+        'UserID': daily_stats['UserID'].astype(str),
+        'Date': daily_stats['Date']
+    }).drop_duplicates()
+
+    if not history_df.empty:
+        existing_keys = pd.MultiIndex.from_frame(history_df[['UserID', 'Date']])
+        candidate_keys = pd.MultiIndex.from_frame(candidates)
+        candidates = candidates[~candidate_keys.isin(existing_keys)]
+
+    new_df = candidates.reset_index(drop=True)
+    new_df['Points'] = points_per_day  # 使用配置的每日积分
+    return new_df
+
+
+def apply_points_delta(user_points: pd.DataFrame, added_df: pd.DataFrame, expired_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    将新增和过期的积分记录增量应用到用户积分汇总
+    只更新受影响的用户，有效天数降为0的用户被移除，新用户的昵称为'未知用户'
+    """
+    delta = pd.concat([
+        pd.DataFrame({'UserID': added_df['UserID'], 'Points': added_df['Points'], 'Days': 1}),
+        pd.DataFrame({'UserID': expired_df['UserID'], 'Points': -expired_df['Points'], 'Days': -1})
+    ], ignore_index=True)
+
+    if delta.empty:
+        return user_points
+
+    delta = delta.groupby('UserID').agg(TotalPoints=('Points', 'sum'), ValidDays=('Days', 'sum'))
+
+    user_points = user_points.set_index('UserID')
+    existing_users = delta.index.intersection(user_points.index)
+    new_users = delta.index.difference(user_points.index)
+
+    # 已有用户：累加变化量
+    for column in ['TotalPoints', 'ValidDays']:
+        user_points.loc[existing_users, column] = (
+            user_points.loc[existing_users, column] + delta.loc[existing_users, column]
+        )
+
+    # 新用户：追加记录
+    if len(new_users) > 0:
+        new_rows = delta.loc[new_users].copy()
+        new_rows['UserName'] = '未知用户'
+        user_points = pd.concat([user_points, new_rows])
+
+    user_points = user_points[user_points['ValidDays'] > 0]
+    return user_points.reset_index()[USER_POINTS_COLUMNS]
+
+
+def apply_user_names(user_points: pd.DataFrame, user_names: Optional[pd.Series]) -> pd.DataFrame:
+    """
+    用新导入的昵称更新用户积分汇总（只更新 user_names 中存在的用户）
+    user_names: 以 UserID 为索引的昵称 Series
+    """
+    if user_names is None or user_names.empty:
+        return user_points
+
+    updated_names = user_points['UserID'].map(user_names)
+    user_points['UserName'] = updated_names.fillna(user_points['UserName'])
+    return user_points
+
+
+class HistoryDateKeys:
+    """
+    积分历史的按日期键索引：history_keys/<日期>.txt 保存该日期已有积分记录的 UserID（每行一个），
+    state.json 记录索引对应的 points_history.csv 的修改时间和大小，以及历史记录数；
+    上传时只读取本次涉及日期的键去重，历史文件被其他方式修改后（签名不一致）由历史文件重建
+    """
+
+    def __init__(self, directory: str, history_file: str):
+        self.directory = directory
+        self.history_file = history_file
+        self.state_file = os.path.join(directory, 'state.json')
+
+    def _key_file(self, day: str) -> str:
+        return os.path.join(self.directory, f'{day}.txt')
+
+    def _history_signature(self) -> Optional[List[int]]:
+        try:
+            stat = os.stat(self.history_file)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _read_state(self) -> dict:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def rows(self) -> Optional[int]:
+        """写入时记录的历史记录数；索引与当前的历史文件不一致时返回None"""
+        signature = self._history_signature()
+        state = self._read_state()
+        if signature is None or state.get('source') != signature:
+            return None
+        return state.get('rows')
+
+    def is_current(self) -> bool:
+        """索引是否与当前的历史文件一致"""
+        return self.rows() is not None
+
+    def dates(self) -> List[str]:
+        """有积分记录的日期（YYYY-MM-DD，升序）"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-4] for name in names if name.endswith('.txt'))
+
+    def read(self, days: Iterable[str]) -> pd.DataFrame:
+        """读取指定日期的 (UserID, Date) 键，Date 为 date 对象"""
+        frames = []
+        for day in days:
+            try:
+                with open(self._key_file(day), 'r', encoding='utf-8') as f:
+                    user_ids = f.read().splitlines()
+            except FileNotFoundError:
+                continue
+            frames.append(pd.DataFrame({'UserID': user_ids, 'Date': date.fromisoformat(day)}))
+        if not frames:
+            return pd.DataFrame(columns=['UserID', 'Date'])
+        return pd.concat(frames, ignore_index=True)
+
+    def append(self, records: pd.DataFrame):
+        """追加新记录的键（records 包含 UserID、Date 列）"""
+        if records.empty:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for day, user_ids in records.groupby(records['Date'].astype(str))['UserID']:
+            with open(self._key_file(day), 'a', encoding='utf-8') as f:
+                f.write('\n'.join(user_ids.astype(str)) + '\n')
+
+    def remove_dates(self, days: Iterable[str]):
+        for day in days:
+            try:
+                os.remove(self._key_file(day))
+            except FileNotFoundError:
+                pass
+
+    def rebuild(self, history_df: pd.DataFrame):
+        """由完整的历史记录重建索引（历史文件写入后调用）"""
+        self.remove_dates(self.dates())
+        self.append(history_df)
+        self.mark_synced(len(history_df))
+
+    def mark_synced(self, rows: int):
+        """记录索引已与当前的历史文件一致及其记录数（每次写入历史文件和键之后调用）"""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_file = f"{self.state_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'source': self._history_signature(), 'rows': int(rows)}, f)
+        os.replace(tmp_file, self.state_file)
+
+
+class PointsStorage:
+    """积分数据存储接口"""
+
+    def get_user_points(self, tenant: str) -> Optional[pd.DataFrame]:
+        """获取管理员的用户积分汇总，没有数据时返回None"""
+        raise NotImplementedError
+
+    def count_history(self, tenant: str) -> int:
+        """获取管理员的积分历史记录数"""
+        raise NotImplementedError
+
+    def history_row_counts(self) -> Dict[str, Optional[int]]:
+        """
+        各管理员在写入时记录的积分历史记录数（供运行指标使用，只读取记录的计数，不解析数据文件）
+        尚未记录计数的管理员（如旧版本写入、之后没有再写入的数据）为None
+        """
+        raise NotImplementedError
+
+    def data_version(self, tenant: str) -> Optional[Hashable]:
+        """管理员用户积分汇总的版本标识，每次写入后改变（供缓存校验），没有数据时返回None"""
+        raise NotImplementedError
+
+    def accumulate(self, tenant: str, daily_stats: pd.DataFrame, user_names: Optional[pd.Series],
+                   points_per_day: int, cutoff_date: date) -> pd.DataFrame:
+        """
+        写入新的每日积分记录，返回更新后的用户积分汇总
+        daily_stats: 包含 UserID、Date 列的每日统计
+        user_names: 以 UserID 为索引的最新昵称，可为None
+        cutoff_date: 该日期及之前的记录视为过期，不会写入；已有的过期记录由 expire 移除（部分后端在此一并移除）
+        """
+        raise NotImplementedError
+
+    def expire(self, tenant: str, cutoff_date: date) -> Optional[pd.DataFrame]:
+        """
+        只移除过期记录（不写入新记录），返回更新后的用户积分汇总；管理员没有数据时返回None
+        """
+        if tenant not in self.list_tenants():
+            return None
+        return self.accumulate(tenant, pd.DataFrame(columns=['UserID', 'Date']), None, 0, cutoff_date)
+
+    def list_tenants(self) -> List[str]:
+        """列出有积分数据的管理员"""
+        raise NotImplementedError
+
+    def iter_history(self, tenant: str, chunk_rows: int = 100000) -> Iterator[pd.DataFrame]:
+        """分块读取管理员的积分历史记录（UserID, Date, Points），Date 为 YYYY-MM-DD 字符串"""
+        raise NotImplementedError
+
+    def export_history(self, tenant: str, path: str) -> int:
+        """将积分历史记录导出为 points_history.csv 格式，返回导出的记录数"""
+        rows = 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(','.join(HISTORY_COLUMNS) + '\n')
+            for chunk in self.iter_history(tenant):
+                chunk[HISTORY_COLUMNS].to_csv(f, header=False, index=False)
+                rows += len(chunk)
+        os.replace(tmp_path, path)
+        return rows
+
+    def search_users(self, name: str, tenant: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        按昵称（不区分大小写的子串）查找用户，结果按 完全匹配、前缀匹配、子串匹配 排序
+        tenant 为None时查找所有管理员的数据；没有任何数据时返回None
+        """
+        raise NotImplementedError
+
+    def clear_user(self, tenant: str, user_id: str) -> bool:
+        """清空单个用户的积分，用户不存在时返回False"""
+        raise NotImplementedError
+
+    def clear_all(self, tenant: str) -> bool:
+        """清空管理员下所有用户的积分"""
+        raise NotImplementedError
+
+
+class CsvPointsStorage(PointsStorage):
+    """
+    CSV 文件存储：每个管理员一个目录，包含 points_history.csv、user_points.csv 和按日期的键索引 history_keys/；
+    上传只追加历史记录，过期记录由 expire（后台的过期积分压缩任务）移除并重写历史文件
+    """
+
+    def __init__(self, data_dir: str = 'data'):
+        self.data_dir = data_dir
+        self.user_index = UserLookupIndex(data_dir)
+
+    def get_path(self, tenant: str, filename: str) -> str:
+        """获取管理员专属的数据文件路径"""
+        tenant_dir = os.path.join(self.data_dir, tenant)
+        if not os.path.exists(tenant_dir):
+            os.makedirs(tenant_dir)
+        return os.path.join(tenant_dir, filename)
+
+    def list_tenants(self) -> List[str]:
+        if not os.path.exists(self.data_dir):
+            return []
+        return [
+            tenant for tenant in os.listdir(self.data_dir)
+            if os.path.exists(os.path.join(self.data_dir, tenant, 'user_points.csv'))
+        ]
+
+    def _read_user_points(self, user_points_file: str) -> Optional[pd.DataFrame]:
+        """读取用户积分汇总文件，UserID 统一为字符串；文件不存在或无法读取时返回None"""
+        if not os.path.exists(user_points_file):
+            return None
+
+        try:
+            user_points = pd.read_csv(user_points_file, dtype={'UserID': str})
+        except Exception as e:
+            print(f"⚠️ 读取用户积分文件失败: {str(e)}")
+            return None
+
+        if 'UserName' not in user_points.columns:
+            user_points['UserName'] = '未知用户'
+        user_points['UserName'] = user_points['UserName'].fillna('未知用户')
+        return user_points
+
+    def data_version(self, tenant: str) -> Optional[Hashable]:
+        try:
+            stat = os.stat(os.path.join(self.data_dir, tenant, 'user_points.csv'))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _count_rows(points_history_file: str) -> int:
+        return len(pd.read_csv(points_history_file, usecols=[0]))
+
+    def get_user_points(self, tenant: str) -> Optional[pd.DataFrame]:
+        # 文件未变化时直接使用进程内缓存的解析结果
+        return frame_cache.get(self.get_path(tenant, 'user_points.csv'), self._read_user_points)
+
+    def count_history(self, tenant: str) -> int:
+        points_history_file = self.get_path(tenant, 'points_history.csv')
+        if not os.path.exists(points_history_file):
+            return 0
+        rows = self._date_keys(tenant).rows()
+        if rows is not None:
+            return rows
+        return frame_cache.get(points_history_file, self._count_rows, kind='rows')
+
+    def _history_rows(self, tenant: str) -> Optional[int]:
+        if not os.path.exists(os.path.join(self.data_dir, tenant, 'points_history.csv')):
+            return 0
+        return self._date_keys(tenant).rows()
+
+    def history_row_counts(self) -> Dict[str, Optional[int]]:
+        return {tenant: self._history_rows(tenant) for tenant in self.list_tenants()}
+
+    def _date_keys(self, tenant: str) -> HistoryDateKeys:
+        return HistoryDateKeys(os.path.join(self.data_dir, tenant, 'history_keys'),
+                               os.path.join(self.data_dir, tenant, 'points_history.csv'))
+
+    @staticmethod
+    def _read_history(points_history_file: str) -> pd.DataFrame:
+        history_df = pd.read_csv(points_history_file, dtype={'UserID': str})
+        history_df['Date'] = pd.to_datetime(history_df['Date']).dt.date
+        return history_df
+
+    def _write_user_points(self, tenant: str, user_points: pd.DataFrame):
+        """保存用户积分汇总并更新缓存和查询索引"""
+        user_points_file = self.get_path(tenant, 'user_points.csv')
+        user_points.to_csv(user_points_file, index=False)
+        frame_cache.invalidate(os.path.join(self.data_dir, tenant, 'points_history.csv'))
+        frame_cache.invalidate(user_points_file)
+        self.user_index.update_tenant(tenant, user_points)
+
+    def accumulate(self, tenant: str, daily_stats: pd.DataFrame, user_names: Optional[pd.Series],
+                   points_per_day: int, cutoff_date: date) -> pd.DataFrame:
+        """
+        已有用户积分汇总时使用增量模式：只读取本次上传涉及日期的键去重，新增记录追加到历史文件，
+        用户积分汇总只按新增记录更新受影响的用户，没有变化时不重写；否则从历史记录完整重算
+        """
+        points_history_file = self.get_path(tenant, 'points_history.csv')
+        user_points_file = self.get_path(tenant, 'user_points.csv')
+        date_keys = self._date_keys(tenant)
+
+        existing_points = frame_cache.get(user_points_file, self._read_user_points)
+        history_exists = os.path.exists(points_history_file)
+
+        if existing_points is not None and history_exists:
+            # 增量模式：键索引与历史文件不一致时（首次使用或历史文件被其他方式修改）先重建
+            history_rows = date_keys.rows()
+            if history_rows is None:
+                history_df = self._read_history(points_history_file)
+                date_keys.rebuild(history_df)
+                history_rows = len(history_df)
+                print(f"📇 已重建 {tenant} 的积分历史日期索引")
+
+            candidates = daily_stats[daily_stats['Date'] > cutoff_date]
+            upload_days = pd.Series(candidates['Date'].unique()).astype(str)
+            existing_keys = date_keys.read(upload_days)
+            new_df = select_new_daily_records(existing_keys, candidates, points_per_day)
+
+            if not new_df.empty:
+                new_df.to_csv(points_history_file, mode='a', header=False, index=False)
+                date_keys.append(new_df)
+                date_keys.mark_synced(history_rows + len(new_df))
+                print(f"✅ 添加了 {len(new_df)} 条新的积分记录")
+                user_points = apply_points_delta(existing_points, new_df, new_df.iloc[:0])
+            else:
+                user_points = existing_points.copy()
+
+            user_points = apply_user_names(user_points, user_names)
+            if new_df.empty and user_points['UserName'].equals(existing_points['UserName']):
+                return user_points
+        else:
+            # 完整重算：读取历史记录（如有），合并新记录并移除过期记录
+            history_df = self._read_history(points_history_file) if history_exists else \
+                pd.DataFrame(columns=HISTORY_COLUMNS)
+
+            new_df = select_new_daily_records(history_df, daily_stats, points_per_day)
+            new_df = new_df[new_df['Date'] > cutoff_date]
+            if not new_df.empty:
+                print(f"✅ 添加了 {len(new_df)} 条新的积分记录")
+
+            expired_mask = history_df['Date'] <= cutoff_date
+            if expired_mask.any():
+                print(f"📅 移除了 {int(expired_mask.sum())} 条过期的积分记录")
+            history_df = pd.concat([history_df[~expired_mask], new_df], ignore_index=True)
+
+            # 去重（同一用户同一天只能有一条记录）
+            history_df = history_df.drop_duplicates(subset=['UserID', 'Date'], keep='last')
+
+            # 保存更新后的历史记录和日期索引
+            history_df.to_csv(points_history_file, index=False)
+            date_keys.rebuild(history_df)
+
+            # 计算每个用户的总积分和有效天数
+            user_points = history_df.groupby('UserID').agg(
+                TotalPoints=('Points', 'sum'),
+                ValidDays=('Points', 'size')
+            ).reset_index()
+            user_points['UserID'] = user_points['UserID'].astype(str)
+            user_points['UserName'] = '未知用户'
+
+            # 保留已有用户的昵称
+            if existing_points is not None:
+                existing_names = existing_points.set_index('UserID')['UserName']
+                existing_names = existing_names[existing_names != '未知用户']
+                existing_names = existing_names[~existing_names.index.duplicated(keep='last')]
+                user_points['UserName'] = user_points['UserID'].map(existing_names).fillna('未知用户')
+                print(f"📋 保留了 {len(existing_names)} 个已有用户的昵称信息")
+
+            user_points = apply_user_names(user_points, user_names)
+
+        # 保存当前用户的积分文件
+        self._write_user_points(tenant, user_points)
+        return user_points
+
+    def iter_history(self, tenant: str, chunk_rows: int = 100000) -> Iterator[pd.DataFrame]:
+        points_history_file = os.path.join(self.data_dir, tenant, 'points_history.csv')
+        if not os.path.exists(points_history_file):
+            return
+        for chunk in pd.read_csv(points_history_file, dtype={'UserID': str}, chunksize=chunk_rows):
+            chunk['Date'] = pd.to_datetime(chunk['Date']).dt.strftime('%Y-%m-%d')
+            yield chunk
+
+    def expire(self, tenant: str, cutoff_date: date) -> Optional[pd.DataFrame]:
+        """
+        压缩历史文件：移除过期记录并重写 points_history.csv，用户积分汇总按过期记录增量更新；
+        日期索引中没有过期日期时不读取任何数据文件
+        """
+        user_points_file = os.path.join(self.data_dir, tenant, 'user_points.csv')
+        points_history_file = os.path.join(self.data_dir, tenant, 'points_history.csv')
+        if not os.path.exists(user_points_file):
+            return None
+        if not os.path.exists(points_history_file):
+            return self.get_user_points(tenant)
+
+        date_keys = self._date_keys(tenant)
+        history_rows = date_keys.rows()
+        keys_current = history_rows is not None
+        cutoff = cutoff_date.isoformat()
+        if keys_current and not any(day <= cutoff for day in date_keys.dates()):
+            return self.get_user_points(tenant)
+
+        history_df = self._read_history(points_history_file)
+        expired_mask = history_df['Date'] <= cutoff_date
+        existing_points = self.get_user_points(tenant)
+        if not expired_mask.any() or existing_points is None:
+            if not keys_current:
+                date_keys.rebuild(history_df)
+            return existing_points
+
+        expired_df = history_df[expired_mask]
+        history_df = history_df[~expired_mask]
+        history_df.to_csv(points_history_file, index=False)
+        if keys_current:
+            date_keys.remove_dates([day for day in date_keys.dates() if day <= cutoff])
+            date_keys.mark_synced(history_rows - len(expired_df))
+        else:
+            date_keys.rebuild(history_df)
+        print(f"📅 移除了 {len(expired_df)} 条过期的积分记录")
+
+        user_points = apply_points_delta(existing_points, expired_df.iloc[:0], expired_df)
+        self._write_user_points(tenant, user_points)
+        return user_points
+
+    def search_users(self, name: str, tenant: Optional[str] = None) -> Optional[pd.DataFrame]:
+        # 使用跨管理员的用户查询索引（n-gram 倒排索引），不读取各管理员的CSV文件
+        return self.user_index.search(name, tenant)
+
+    def clear_user(self, tenant: str, user_id: str) -> bool:
+        user_points_file = self.get_path(tenant, 'user_points.csv')
+        points_history_file = self.get_path(tenant, 'points_history.csv')
+
+        # 处理用户积分统计文件
+        if os.path.exists(user_points_file):
+            user_stats = pd.read_csv(user_points_file)
+            user_stats['UserID'] = user_stats['UserID'].astype(str)
+
+            # 检查用户是否存在
+            if user_id not in user_stats['UserID'].values:
+                return False
+
+            # 删除指定用户的记录
+            user_stats = user_stats[user_stats['UserID'] != user_id]
+            user_stats.to_csv(user_points_file, index=False)
+            frame_cache.invalidate(user_points_file)
+            self.user_index.update_tenant(tenant, user_stats)
+
+        # 处理积分历史文件
+        if os.path.exists(points_history_file):
+            history_df = pd.read_csv(points_history_file)
+            history_df['UserID'] = history_df['UserID'].astype(str)
+
+            # 删除指定用户的历史记录
+            history_df = history_df[history_df['UserID'] != user_id]
+            history_df.to_csv(points_history_file, index=False)
+            self._date_keys(tenant).rebuild(history_df)
+            frame_cache.invalidate(points_history_file)
+
+        return True
+
+    def clear_all(self, tenant: str) -> bool:
+        user_points_file = self.get_path(tenant, 'user_points.csv')
+        points_history_file = self.get_path(tenant, 'points_history.csv')
+
+        # 清空用户积分统计文件
+        if os.path.exists(user_points_file):
+            # 创建空的DataFrame但保持列结构
+            empty_df = pd.DataFrame(columns=['UserID', 'UserName', 'TotalPoints', 'ValidDays'])
+            empty_df.to_csv(user_points_file, index=False)
+            frame_cache.invalidate(user_points_file)
+            self.user_index.update_tenant(tenant, empty_df)
+
+        # 清空积分历史文件
+        if os.path.exists(points_history_file):
+            # 创建空的DataFrame但保持列结构
+            empty_df = pd.DataFrame(columns=HISTORY_COLUMNS)
+            empty_df.to_csv(points_history_file, index=False)
+            self._date_keys(tenant).rebuild(empty_df)
+            frame_cache.invalidate(points_history_file)
+
+        return True
+
+
+class BitmapPointsStorage(CsvPointsStorage):
+    """
+    日位图存储：每个管理员的积分历史保存为 points_bitmap.npz（用户 × 有效期内每天一位），
+    用户积分汇总仍写入 user_points.csv（供查询索引和页面使用）；
+    首次访问时由已有的 points_history.csv 建立位图，可通过 export_history 导出为 CSV 格式
+    """
+
+    def _bitmap_file(self, tenant: str) -> str:
+        return os.path.join(self.data_dir, tenant, 'points_bitmap.npz')
+
+    def _load_bitmap(self, tenant: str, window_days: int, cutoff_date: date) -> DayBitmap:
+        """读取管理员的位图；尚无位图时由 points_history.csv 建立"""
+        bitmap_file = self._bitmap_file(tenant)
+        if os.path.exists(bitmap_file):
+            bitmap = DayBitmap.load(bitmap_file)
+            if bitmap.window_days != window_days:
+                bitmap.expire(cutoff_date)
+                bitmap.resize(window_days)
+            return bitmap
+
+        points_history_file = os.path.join(self.data_dir, tenant, 'points_history.csv')
+        history_df = pd.DataFrame(columns=HISTORY_COLUMNS)
+        if os.path.exists(points_history_file):
+            history_df = pd.read_csv(points_history_file, dtype={'UserID': str})
+            print(f"📦 已将 {tenant} 的 {len(history_df)} 条积分历史记录转换为日位图")
+
+        # 各日期的积分沿用历史记录中的积分，与 CSV 后端按记录保存的积分一致
+        return DayBitmap.from_history(history_df, window_days, cutoff_date)
+
+    def _read_bitmap(self, bitmap_file: str) -> Optional[DayBitmap]:
+        return DayBitmap.load(bitmap_file) if os.path.exists(bitmap_file) else None
+
+    def count_history(self, tenant: str) -> int:
+        bitmap_file = self._bitmap_file(tenant)
+        if not os.path.exists(bitmap_file):
+            return super().count_history(tenant)
+        return frame_cache.get(bitmap_file, DayBitmap.read_count, kind='rows')
+
+    def _history_rows(self, tenant: str) -> Optional[int]:
+        bitmap_file = self._bitmap_file(tenant)
+        if not os.path.exists(bitmap_file):
+            return super()._history_rows(tenant)
+        return frame_cache.get(bitmap_file, DayBitmap.read_count, kind='rows')
+
+    def _save(self, tenant: str, bitmap: DayBitmap, user_names: Optional[pd.Series]) -> pd.DataFrame:
+        """保存位图并重写用户积分汇总（保留已有昵称）"""
+        user_points_file = self.get_path(tenant, 'user_points.csv')
+        bitmap_file = self._bitmap_file(tenant)
+
+        user_points = bitmap.summary()
+        existing_points = frame_cache.get(user_points_file, self._read_user_points)
+        if existing_points is not None:
+            existing_names = existing_points.drop_duplicates('UserID', keep='last').set_index('UserID')['UserName']
+            user_points['UserName'] = user_points['UserID'].map(existing_names).fillna('未知用户')
+        else:
+            user_points['UserName'] = '未知用户'
+        user_points = apply_user_names(user_points[USER_POINTS_COLUMNS], user_names)
+
+        bitmap.save(bitmap_file)
+        user_points.to_csv(user_points_file, index=False)
+        frame_cache.invalidate(bitmap_file)
+        frame_cache.invalidate(user_points_file)
+        self.user_index.update_tenant(tenant, user_points)
+        return user_points
+
+    def accumulate(self, tenant: str, daily_stats: pd.DataFrame, user_names: Optional[pd.Series],
+                   points_per_day: int, cutoff_date: date) -> pd.DataFrame:
+        """
+        新记录按位或写入，过期记录按日期清除对应的位，晚于今天的记录被忽略；
+        新日期的积分为本次的 points_per_day，用户积分为各有效日期的积分之和（每日积分修改后已有日期保持原积分）
+        """
+        window_days = max((date.today() - cutoff_date).days, 1)
+        bitmap = self._load_bitmap(tenant, window_days, cutoff_date)
+
+        expired = bitmap.expire(cutoff_date)
+        if expired:
+            print(f"📅 移除了 {expired} 条过期的积分记录")
+
+        bitmap.points_per_day = points_per_day
+        added = bitmap.add(daily_stats['UserID'], daily_stats['Date'])
+        if added:
+            print(f"✅ 添加了 {added} 条新的积分记录")
+
+        bitmap.compact()
+        return self._save(tenant, bitmap, user_names)
+
+    def expire(self, tenant: str, cutoff_date: date) -> Optional[pd.DataFrame]:
+        if tenant not in self.list_tenants():
+            return None
+
+        window_days = max((date.today() - cutoff_date).days, 1)
+        bitmap = self._load_bitmap(tenant, window_days, cutoff_date)
+        expired = bitmap.expire(cutoff_date)
+        if not expired and os.path.exists(self._bitmap_file(tenant)):
+            # 没有过期记录时只推进 cutoff，不重写用户积分汇总
+            bitmap.save(self._bitmap_file(tenant))
+            return self.get_user_points(tenant)
+
+        if expired:
+            print(f"📅 移除了 {expired} 条过期的积分记录")
+        bitmap.compact()
+        return self._save(tenant, bitmap, None)
+
+    def iter_history(self, tenant: str, chunk_rows: int = 100000) -> Iterator[pd.DataFrame]:
+        bitmap = self._read_bitmap(self._bitmap_file(tenant))
+        if bitmap is None:
+            yield from super().iter_history(tenant, chunk_rows)
+            return
+        yield from bitmap.iter_history()
+
+    def clear_user(self, tenant: str, user_id: str) -> bool:
+        if not super().clear_user(tenant, user_id):
+            return False
+
+        bitmap = self._read_bitmap(self._bitmap_file(tenant))
+        if bitmap is not None and bitmap.remove_users([user_id]):
+            bitmap.save(self._bitmap_file(tenant))
+            frame_cache.invalidate(self._bitmap_file(tenant))
+        return True
+
+    def clear_all(self, tenant: str) -> bool:
+        super().clear_all(tenant)
+
+        bitmap = self._read_bitmap(self._bitmap_file(tenant))
+        if bitmap is not None:
+            # 保留空位图，避免下次访问时由 points_history.csv 重新建立
+            bitmap.remove_users(bitmap.user_ids)
+            bitmap.save(self._bitmap_file(tenant))
+            frame_cache.invalidate(self._bitmap_file(tenant))
+        return True
+
+
+class SqlitePointsStorage(PointsStorage):
+    """
+    SQLite 存储：所有管理员的数据保存在同一个数据库中，以 tenant 列区分
+    表结构参考 cloudflare-version/schema.sql，首次访问某个管理员时自动导入其 CSV 数据
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS user_points (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT,
+            total_points INTEGER DEFAULT 0,
+            valid_days INTEGER DEFAULT 0,
+            last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(tenant, user_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS points_history (
+            tenant TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            points INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (tenant, user_id, date)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS tenants (
+            tenant TEXT PRIMARY KEY,
+            version INTEGER DEFAULT 0,
+            history_rows INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_points_history_tenant_date ON points_history(tenant, date);
+        CREATE INDEX IF NOT EXISTS idx_user_points_tenant_name ON user_points(tenant, user_name);
+    """
+
+    def __init__(self, db_path: str = 'data/points.db', data_dir: str = 'data'):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.csv_storage = CsvPointsStorage(data_dir)
+        self._local = threading.local()
+        self._known_tenants = set()
+        self._tenants_lock = threading.Lock()
+        self._csv_imported = False     # 是否已检查过所有管理员的CSV数据
+        # 管理员 -> (数据版本, 用户积分, 昵称索引)，按需建立，版本变化（任一进程写入）后重建
+        self._name_indexes: Dict[str, Tuple[Hashable, pd.DataFrame, NgramNameIndex]] = {}
+        self._name_indexes_lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            # 早期创建的数据库没有 version 列
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(tenants)')]
+            if 'version' not in columns:
+                conn.execute('ALTER TABLE tenants ADD COLUMN version INTEGER DEFAULT 0')
+            # 历史记录数在写入时维护，早期创建的数据库按现有记录初始化一次
+            if 'history_rows' not in columns:
+                conn.execute('ALTER TABLE tenants ADD COLUMN history_rows INTEGER DEFAULT 0')
+                conn.execute(
+                    'UPDATE tenants SET history_rows = '
+                    '(SELECT COUNT(*) FROM points_history h WHERE h.tenant = tenants.tenant)'
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（sqlite3 连接不能跨线程共享）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_tenant(self, tenant: str) -> bool:
+        """
+        确保管理员已登记；首次访问时导入其 CSV 数据
+        返回该管理员是否有数据（已登记或导入了 CSV）
+        """
+        if tenant in self._known_tenants:
+            return True
+
+        with self._tenants_lock:
+            conn = self._connect()
+            row = conn.execute('SELECT 1 FROM tenants WHERE tenant = ?', (tenant,)).fetchone()
+            if row:
+                self._known_tenants.add(tenant)
+                return True
+
+            user_points_file = os.path.join(self.data_dir, tenant, 'user_points.csv')
+            if not os.path.exists(user_points_file):
+                return False
+
+            self._import_csv(tenant)
+            self._known_tenants.add(tenant)
+            return True
+
+    def _register_tenant(self, conn: sqlite3.Connection, tenant: str, history_delta: int = 0):
+        """登记管理员、递增其数据版本并累加历史记录数的变化量（在写入事务中调用）"""
+        conn.execute('INSERT OR IGNORE INTO tenants (tenant) VALUES (?)', (tenant,))
+        conn.execute('UPDATE tenants SET version = version + 1, history_rows = history_rows + ? WHERE tenant = ?',
+                     (history_delta, tenant))
+        self._known_tenants.add(tenant)
+
+    def _import_csv(self, tenant: str):
+        """导入管理员已有的 CSV 数据"""
+        user_points = self.csv_storage._read_user_points(os.path.join(self.data_dir, tenant, 'user_points.csv'))
+        points_history_file = os.path.join(self.data_dir, tenant, 'points_history.csv')
+
+        conn = self._connect()
+        with conn:
+            before = conn.total_changes
+            if os.path.exists(points_history_file):
+                history_df = pd.read_csv(points_history_file, dtype={'UserID': str})
+                history_df['Date'] = pd.to_datetime(history_df['Date']).dt.strftime('%Y-%m-%d')
+                conn.executemany(
+                    'INSERT OR IGNORE INTO points_history (tenant, user_id, date, points) VALUES (?, ?, ?, ?)',
+                    ((tenant, row.UserID, row.Date, int(row.Points)) for row in history_df.itertuples(index=False))
+                )
+            imported_rows = conn.total_changes - before
+
+            if user_points is not None:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO user_points (tenant, user_id, user_name, total_points, valid_days) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    ((tenant, row.UserID, row.UserName, int(row.TotalPoints), int(row.ValidDays))
+                     for row in user_points.itertuples(index=False))
+                )
+
+            self._register_tenant(conn, tenant, imported_rows)
+
+        print(f"📦 已将 {tenant} 的 CSV 积分数据导入 SQLite")
+
+    def _read_user_points(self, where: str = '', params: tuple = ()) -> pd.DataFrame:
+        query = (
+            'SELECT user_id AS UserID, total_points AS TotalPoints, valid_days AS ValidDays, '
+            "COALESCE(user_name, '未知用户') AS UserName FROM user_points " + where
+        )
+        df = pd.read_sql_query(query, self._connect(), params=params)
+        df['UserID'] = df['UserID'].astype(str)
+        return df
+
+    def get_user_points(self, tenant: str) -> Optional[pd.DataFrame]:
+        if not self._ensure_tenant(tenant):
+            return None
+        return self._read_user_points('WHERE tenant = ?', (tenant,))
+
+    def data_version(self, tenant: str) -> Optional[Hashable]:
+        if not self._ensure_tenant(tenant):
+            return None
+        row = self._connect().execute('SELECT version FROM tenants WHERE tenant = ?', (tenant,)).fetchone()
+        return row[0] if row else None
+
+    def count_history(self, tenant: str) -> int:
+        if not self._ensure_tenant(tenant):
+            return 0
+        row = self._connect().execute('SELECT history_rows FROM tenants WHERE tenant = ?', (tenant,)).fetchone()
+        return row[0] if row else 0
+
+    def history_row_counts(self) -> Dict[str, Optional[int]]:
+        # 只读取已登记的管理员，不导入尚未访问过的管理员的 CSV 数据
+        return dict(self._connect().execute('SELECT tenant, history_rows FROM tenants ORDER BY tenant').fetchall())
+
+    def accumulate(self, tenant: str, daily_stats: pd.DataFrame, user_names: Optional[pd.Series],
+                   points_per_day: int, cutoff_date: date) -> pd.DataFrame:
+        """
+        新记录依靠主键 (tenant, user_id, date) 去重插入，过期记录按 (tenant, date) 索引删除，
+        只重新汇总本次上传和过期记录涉及的用户
+        """
+        self._ensure_tenant(tenant)
+        cutoff = cutoff_date.isoformat()
+
+        candidates = pd.DataFrame({
+            'UserID': daily_stats['UserID'].astype(str),
+            'Date': pd.to_datetime(daily_stats['Date']).dt.strftime('%Y-%m-%d')
+        }).drop_duplicates()
+        candidates = candidates[candidates['Date'] > cutoff]
+
+        conn = self._connect()
+        with conn:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS affected_users (user_id TEXT PRIMARY KEY)')
+            conn.execute('DELETE FROM affected_users')
+
+            # 插入新的积分记录（已存在的 (用户, 日期) 由主键忽略）
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO points_history (tenant, user_id, date, points) VALUES (?, ?, ?, ?)',
+                ((tenant, user_id, day, points_per_day) for user_id, day in candidates.itertuples(index=False))
+            )
+            inserted = conn.total_changes - before
+            if inserted:
+                print(f"✅ 添加了 {inserted} 条新的积分记录")
+
+            conn.executemany('INSERT OR IGNORE INTO affected_users (user_id) VALUES (?)',
+                             ((user_id,) for user_id in candidates['UserID'].unique()))
+
+            # 移除过期的积分记录
+            conn.execute(
+                'INSERT OR IGNORE INTO affected_users (user_id) '
+                'SELECT DISTINCT user_id FROM points_history WHERE tenant = ? AND date <= ?',
+                (tenant, cutoff)
+            )
+            expired = conn.execute('DELETE FROM points_history WHERE tenant = ? AND date <= ?',
+                                   (tenant, cutoff)).rowcount
+            if expired:
+                print(f"📅 移除了 {expired} 条过期的积分记录")
+
+            # 重新汇总受影响的用户
+            conn.execute(
+                """
+                INSERT INTO user_points (tenant, user_id, user_name, total_points, valid_days)
+                SELECT h.tenant, h.user_id, '未知用户', SUM(h.points), COUNT(*)
+                FROM points_history h JOIN affected_users a ON h.user_id = a.user_id
+                WHERE h.tenant = ?
+                GROUP BY h.user_id
+                ON CONFLICT(tenant, user_id) DO UPDATE SET
+                    total_points = excluded.total_points,
+                    valid_days = excluded.valid_days,
+                    last_updated = CURRENT_TIMESTAMP
+                """,
+                (tenant,)
+            )
+            conn.execute(
+                """
+                DELETE FROM user_points
+                WHERE tenant = ? AND user_id IN (SELECT user_id FROM affected_users)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM points_history h
+                      WHERE h.tenant = user_points.tenant AND h.user_id = user_points.user_id
+                  )
+                """,
+                (tenant,)
+            )
+
+            # 更新用户昵称
+            if user_names is not None and not user_names.empty:
+                conn.executemany(
+                    'UPDATE user_points SET user_name = ? WHERE tenant = ? AND user_id = ?',
+                    ((user_name, tenant, str(user_id)) for user_id, user_name in user_names.items())
+                )
+
+            self._register_tenant(conn, tenant, inserted - expired)
+
+        return self.get_user_points(tenant)
+
+    def iter_history(self, tenant: str, chunk_rows: int = 100000) -> Iterator[pd.DataFrame]:
+        if not self._ensure_tenant(tenant):
+            return
+        yield from pd.read_sql_query(
+            'SELECT user_id AS UserID, date AS Date, points AS Points FROM points_history '
+            'WHERE tenant = ? ORDER BY date, user_id',
+            self._connect(), params=(tenant,), chunksize=chunk_rows
+        )
+
+    def _import_all_csv(self):
+        """导入尚未登记的管理员的 CSV 数据（每个进程只检查一次，之后新增的管理员在写入时登记）"""
+        if not self._csv_imported:
+            for data_owner in self.csv_storage.list_tenants():
+                self._ensure_tenant(data_owner)
+            self._csv_imported = True
+
+    def list_tenants(self) -> List[str]:
+        self._import_all_csv()
+        return [row[0] for row in self._connect().execute('SELECT tenant FROM tenants ORDER BY tenant')]
+
+    def _tenant_name_index(self, tenant: str) -> Tuple[pd.DataFrame, NgramNameIndex]:
+        """
+        管理员的用户积分及其昵称 n-gram 索引（与 CSV 后端的查询索引相同），首次查询时建立
+        每次查询只读取 tenants.version 校验，数据写入后重新读取并建立索引
+        """
+        version = self.data_version(tenant)
+        with self._name_indexes_lock:
+            cached = self._name_indexes.get(tenant)
+            if cached is not None and cached[0] == version:
+                return cached[1], cached[2]
+
+        # 先读版本再读数据：期间有写入时缓存的版本偏旧，下次查询会重建
+        frame = self._read_user_points('WHERE tenant = ? ORDER BY id', (tenant,))
+        name_index = NgramNameIndex(frame['UserName'])
+        with self._name_indexes_lock:
+            self._name_indexes[tenant] = (version, frame, name_index)
+        return frame, name_index
+
+    def search_users(self, name: str, tenant: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """使用进程内的昵称 n-gram 索引查找，避免 LIKE '%...%' 扫描整张表"""
+        if tenant is not None:
+            if not self._ensure_tenant(tenant):
+                return None
+            tenants = [tenant]
+        else:
+            # 首次查询所有管理员前，先导入尚未登记的 CSV 数据
+            tenants = self.list_tenants()
+            if not tenants:
+                return None
+
+        frames, ranks = [], []
+        for data_owner in tenants:
+            frame, name_index = self._tenant_name_index(data_owner)
+            rows, row_ranks = name_index.search(name)
+            frames.append(frame.iloc[rows])
+            ranks.append(row_ranks)
+
+        matched = pd.concat(frames, ignore_index=True)
+        if len(frames) > 1:
+            matched = matched.iloc[np.argsort(np.concatenate(ranks), kind='stable')]
+        return matched[USER_POINTS_COLUMNS].reset_index(drop=True)
+
+    def clear_user(self, tenant: str, user_id: str) -> bool:
+        if not self._ensure_tenant(tenant):
+            return True
+
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute('DELETE FROM user_points WHERE tenant = ? AND user_id = ?',
+                                   (tenant, user_id)).rowcount
+            if not deleted:
+                return False
+            removed = conn.execute('DELETE FROM points_history WHERE tenant = ? AND user_id = ?',
+                                   (tenant, user_id)).rowcount
+            self._register_tenant(conn, tenant, -removed)
+        return True
+
+    def clear_all(self, tenant: str) -> bool:
+        if not self._ensure_tenant(tenant):
+            return True
+
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM user_points WHERE tenant = ?', (tenant,))
+            removed = conn.execute('DELETE FROM points_history WHERE tenant = ?', (tenant,)).rowcount
+            self._register_tenant(conn, tenant, -removed)
+        return True
+
+
+# 已创建的存储后端实例
+_storage_instances: Dict[str, PointsStorage] = {}
+_storage_lock = threading.Lock()
+
+
+def get_points_storage(backend: str = 'csv', data_dir: str = 'data',
+                       sqlite_path: str = 'data/points.db') -> PointsStorage:
+    """
+    获取积分数据存储后端（同一配置只创建一个实例）
+    backend: 'csv'、'sqlite' 或 'bitmap'
+    """
+    key = f"{backend}:{data_dir}:{sqlite_path}"
+    with _storage_lock:
+        storage = _storage_instances.get(key)
+        if storage is None:
+            if backend == 'sqlite':
+                storage = SqlitePointsStorage(sqlite_path, data_dir)
+            elif backend == 'bitmap':
+                storage = BitmapPointsStorage(data_dir)
+            elif backend == 'csv':
+                storage = CsvPointsStorage(data_dir)
+            else:
+                raise ValueError(f'不支持的存储后端: {backend}')
+            _storage_instances[key] = storage
+        return storage
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+通用二维码缓存模块
+各管理员的二维码信息保存在内存中（按最近使用排序），修改后延迟合并写入 data/universal_qr_cache.json；
+多个工作进程共享同一个缓存文件，写入时在文件锁内重新读取文件，只合并本进程修改或删除过的条目；
+条目数超过 qr_system.max_cache_size 时淘汰最久未使用的条目
+"""
+
+import atexit
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config_manager import config_manager
+from tenant_locks import file_lock
+
+
+class QrCacheStore:
+    """二维码缓存存储"""
+
+    def __init__(self, cache_file: str = 'data/universal_qr_cache.json', flush_delay: float = 1.0,
+                 max_size: Optional[int] = None):
+        self.cache_file = cache_file
+        self.flush_delay = flush_delay      # 修改后延迟写入的秒数，期间的多次修改只写一次
+        self.max_size = max_size            # 为None时使用配置 qr_system.max_cache_size
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loaded = False
+        self._dirty = False
+        self._changed: set = set()          # 本进程新增或修改、尚未写入文件的条目
+        self._removed: set = set()          # 本进程删除、尚未写入文件的条目
+        self._signature: Optional[Tuple[int, int]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.cache_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _ensure_loaded(self):
+        """首次访问或缓存文件被其他进程修改后重新加载（有未写入的修改时以内存为准）"""
+        signature = self._file_signature()
+        if self._loaded and (self._dirty or signature == self._signature):
+            return
+
+        with self._lock:
+            signature = self._file_signature()
+            if self._loaded and (self._dirty or signature == self._signature):
+                return
+
+            entries = OrderedDict()
+            if signature is not None:
+                try:
+                    entries = self._read_file()
+                except Exception as e:
+                    print(f"加载二维码缓存失败: {str(e)}")
+
+            self.entries = entries
+            self._loaded = True
+            self._signature = signature
+            self._enforce_limit()
+
+    def _read_file(self) -> 'OrderedDict[str, Dict[str, Any]]':
+        entries = OrderedDict()
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries.update(json.load(f))
+        return entries
+
+    def _limit(self) -> int:
+        if self.max_size is not None:
+            return self.max_size
+        return int(config_manager.snapshot.qr_system.max_cache_size)
+
+    def _enforce_limit(self):
+        """淘汰最久未使用的条目（调用方需持有锁）"""
+        limit = self._limit()
+        evicted = 0
+        while len(self.entries) > limit:
+            user_id, _ = self.entries.popitem(last=False)
+            self._changed.discard(user_id)
+            evicted += 1
+
+        if evicted:
+            self.evictions += evicted
+            self._mark_dirty()
+            print(f"二维码缓存超过上限 {limit}，淘汰了 {evicted} 个最久未使用的缓存")
+
+    def _mark_dirty(self):
+        """标记有未写入的修改，并安排延迟写入（调用方需持有锁）"""
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取用户的二维码信息（副本），不存在时返回None"""
+        self._ensure_loaded()
+        with self._lock:
+            info = self.entries.get(user_id)
+            if info is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(user_id)
+            return dict(info)
+
+    def set(self, user_id: str, info: Dict[str, Any]):
+        """保存用户的二维码信息"""
+        self._ensure_loaded()
+        with self._lock:
+            self.entries[user_id] = dict(info)
+            self.entries.move_to_end(user_id)
+            self._changed.add(user_id)
+            self._removed.discard(user_id)
+            self._mark_dirty()
+            self._enforce_limit()
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """所有缓存条目的副本"""
+        self._ensure_loaded()
+        with self._lock:
+            return [(user_id, dict(info)) for user_id, info in self.entries.items()]
+
+    def remove_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """删除满足条件的条目，返回删除数量"""
+        self._ensure_loaded()
+        with self._lock:
+            removed = [user_id for user_id, info in self.entries.items() if predicate(info)]
+            for user_id in removed:
+                del self.entries[user_id]
+                self._changed.discard(user_id)
+                self._removed.add(user_id)
+            if removed:
+                self._mark_dirty()
+            return len(removed)
+
+    def replace_all(self, entries: Dict[str, Dict[str, Any]]):
+        """整体替换缓存内容"""
+        self._ensure_loaded()
+        with self._lock:
+            self._removed.update(set(self.entries) - set(entries))
+            self._removed.difference_update(entries)
+            self.entries = OrderedDict((user_id, dict(info)) for user_id, info in entries.items())
+            self._changed = set(self.entries)
+            self._mark_dirty()
+            self._enforce_limit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries)
+            }
+
+    def flush(self) -> bool:
+        """
+        立即原子写入缓存文件（没有未写入的修改时直接返回）
+        在文件锁内重新读取文件，只把本进程修改和删除的条目合并进去，不覆盖其他进程写入的条目
+        """
+        with self._lock:
+            self._timer = None
+            if not self._dirty:
+                return True
+
+            try:
+                with file_lock(self.cache_file + '.lock'):
+                    try:
+                        merged = self._read_file()
+                    except Exception as e:
+                        print(f"读取二维码缓存失败，将以本进程的缓存覆盖: {str(e)}")
+                        merged = OrderedDict()
+
+                    for user_id in self._removed:
+                        merged.pop(user_id, None)
+                    # 按本进程的使用顺序追加修改过的条目，使其成为最近使用
+                    for user_id, info in self.entries.items():
+                        if user_id in self._changed:
+                            merged[user_id] = info
+                            merged.move_to_end(user_id)
+
+                    limit = self._limit()
+                    while len(merged) > limit:
+                        merged.popitem(last=False)
+
+                    tmp_file = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    with open(tmp_file, 'w', encoding='utf-8') as f:
+                        json.dump(merged, f, ensure_ascii=False, indent=2)
+                    os.replace(tmp_file, self.cache_file)
+                    signature = self._file_signature()
+            except Exception as e:
+                print(f"保存二维码缓存失败: {str(e)}")
+                return False
+
+            self.entries = merged
+            self._changed.clear()
+            self._removed.clear()
+            self._dirty = False
+            self._signature = signature
+            return True
+
+
+# 全局二维码缓存实例
+qr_cache_store = QrCacheStore()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+二维码图片缓存模块
+在进程内缓存编码好的二维码 PNG，按 (内容, 模块大小, 边框, 纠错级别) 区分；
+同一内容重复生成时直接返回缓存，图片通过带签名的地址提供，不再写入共享的静态文件
+"""
+
+import hashlib
+import hmac
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+import qrcode
+
+# 纠错级别
+ERROR_CORRECTION_LEVELS = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H
+}
+
+# 二维码内容的最大长度（version 40 / L 级别最多约 2900 字节）
+MAX_DATA_LENGTH = 2048
+
+
+class QrImageKey(NamedTuple):
+    """二维码渲染参数"""
+    data: str
+    box_size: int = 10
+    border: int = 4
+    error_correction: str = 'L'
+
+
+class QrImageCache:
+    """
+    二维码 PNG 的 LRU 缓存
+    图片地址中的签名由渲染参数和密钥计算，只有本应用生成过的参数才会被渲染；
+    其他进程（或重启后）收到请求时可根据地址中的参数重新生成相同的图片
+    """
+
+    def __init__(self, max_entries: int = 256, secret_key: Optional[bytes] = None):
+        self.max_entries = max_entries
+        self.secret_key = secret_key or b''    # 由应用设置为 app.secret_key
+        self.entries: 'OrderedDict[QrImageKey, Dict[str, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(data: str, box_size: int = 10, border: int = 4, error_correction: str = 'L') -> QrImageKey:
+        """校验并规范化渲染参数"""
+        data = str(data)
+        if not data or len(data) > MAX_DATA_LENGTH:
+            raise ValueError('二维码内容为空或过长')
+        if not 1 <= int(box_size) <= 50 or not 0 <= int(border) <= 20:
+            raise ValueError('二维码尺寸参数无效')
+        error_correction = str(error_correction).upper()
+        if error_correction not in ERROR_CORRECTION_LEVELS:
+            raise ValueError(f'不支持的纠错级别: {error_correction}')
+        return QrImageKey(data, int(box_size), int(border), error_correction)
+
+    def signature(self, key: QrImageKey) -> str:
+        """渲染参数的签名，用作图片地址中的文件名"""
+        message = '\x1f'.join(str(part) for part in key).encode('utf-8')
+        return hmac.new(self.secret_key, message, hashlib.sha256).hexdigest()[:32]
+
+    def verify(self, key: QrImageKey, signature: str) -> bool:
+        return hmac.compare_digest(self.signature(key), str(signature))
+
+    @staticmethod
+    def _render(key: QrImageKey) -> bytes:
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=ERROR_CORRECTION_LEVELS[key.error_correction],
+            box_size=key.box_size,
+            border=key.border,
+        )
+        qr.add_data(key.data)
+        qr.make(fit=True)
+
+        buffer = io.BytesIO()
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def get(self, key: QrImageKey) -> Dict[str, Any]:
+        """
+        获取二维码图片，返回 {'png': PNG字节, 'etag': 内容哈希, 'signature': 签名}
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        png = self._render(key)
+        entry = {
+            'png': png,
+            'etag': hashlib.sha256(png).hexdigest(),
+            'signature': self.signature(key)
+        }
+
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def url_params(key: QrImageKey) -> Dict[str, Any]:
+        """图片地址中的查询参数"""
+        return {'data': key.data, 'box': key.box_size, 'border': key.border, 'ec': key.error_correction}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'size_bytes': sum(len(entry['png']) for entry in self.entries.values())
+            }
+
+
+# 全局二维码图片缓存实例
+qr_image_cache = QrImageCache()
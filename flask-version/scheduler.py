@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+后台维护任务模块
+在后台线程中定期执行清理和压缩等维护任务，上次执行时间记录在文件中（进程重启后不会重复执行）；
+多个工作进程同时运行时通过锁文件保证同一时刻只有一个进程执行
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+
+class MaintenanceTask:
+    """
+    维护任务
+    is_due(上次执行时间戳或None, 当前时间) 返回是否需要执行，每次检查时调用，可读取最新配置
+    """
+
+    def __init__(self, name: str, func: Callable[[], object], is_due: Callable[[Optional[float], datetime], bool]):
+        self.name = name
+        self.func = func
+        self.is_due = is_due
+
+
+def every(interval_hours: Callable[[], Optional[float]]) -> Callable[[Optional[float], datetime], bool]:
+    """
+    按固定间隔执行；interval_hours() 返回间隔小时数，返回None时不执行
+    """
+    def is_due(last_run: Optional[float], now: datetime) -> bool:
+        hours = interval_hours()
+        if hours is None:
+            return False
+        return last_run is None or now.timestamp() - last_run >= hours * 3600
+    return is_due
+
+
+def daily(hour: int) -> Callable[[Optional[float], datetime], bool]:
+    """每天在 hour 点之后执行一次"""
+    def is_due(last_run: Optional[float], now: datetime) -> bool:
+        if now.hour < hour:
+            return False
+        return last_run is None or datetime.fromtimestamp(last_run).date() < now.date()
+    return is_due
+
+
+class MaintenanceScheduler:
+    """后台维护任务调度器"""
+
+    def __init__(self, state_file: str = 'data/scheduler_state.json', lock_file: str = 'data/scheduler.lock',
+                 poll_seconds: float = 60):
+        self.state_file = state_file      # 各任务上次执行时间
+        self.lock_file = lock_file
+        self.poll_seconds = poll_seconds
+        self.tasks: List[MaintenanceTask] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+
+    def register(self, name: str, func: Callable[[], object], is_due: Callable[[Optional[float], datetime], bool]):
+        """注册维护任务"""
+        self.tasks.append(MaintenanceTask(name, func, is_due))
+
+    def start(self):
+        """启动后台线程（重复调用无效）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='maintenance-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        # 启动后先等待一个周期，避免与应用初始化争用资源
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"⚠️ 后台维护任务调度失败: {str(e)}")
+
+    def _load_state(self) -> Dict[str, float]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, float]):
+        tmp_file = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    def _try_lock(self, f) -> bool:
+        """以非阻塞方式获取锁文件的排他锁，其他进程持有时返回False"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def run_pending(self, force: bool = False) -> List[str]:
+        """
+        执行到期的任务，返回本次执行的任务名称
+        force: 忽略执行时间，执行所有任务
+        其他进程正在执行维护任务时直接返回
+        """
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir and not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+
+        with self._run_lock, open(self.lock_file, 'a+') as lock:
+            if not self._try_lock(lock):
+                return []
+
+            # 持有锁后再读取执行记录，其他进程刚执行过的任务不会重复执行
+            state = self._load_state()
+            executed = []
+            for task in self.tasks:
+                now = datetime.now()
+                if not force and not task.is_due(state.get(task.name), now):
+                    continue
+
+                started = time.monotonic()
+                try:
+                    task.func()
+                except Exception as e:
+                    print(f"⚠️ 维护任务 {task.name} 执行失败: {str(e)}")
+                else:
+                    print(f"🧹 维护任务 {task.name} 已完成，耗时 {time.monotonic() - started:.2f} 秒")
+
+                # 失败的任务也记录执行时间，等到下一个周期再重试
+                state[task.name] = now.timestamp()
+                self._save_state(state)
+                executed.append(task.name)
+
+            # 关闭文件时释放锁
+            return executed
+
+
+# 全局维护任务调度器实例
+maintenance_scheduler = MaintenanceScheduler()
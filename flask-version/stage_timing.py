@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+处理阶段计时模块
+记录上传处理流程中每个阶段的耗时、输入/输出行数和进程内存峰值，
+同名阶段多次执行时（如流式导入的各分块）累计到同一条记录
+"""
+
+import json
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+# 阶段显示名称
+STAGE_NAMES = {
+    'read': '读取文件',
+    'clean': '清理数据',
+    'map': '映射列名',
+    'parse_duration': '解析时长',
+    'parse_datetime': '解析时间',
+    'filter': '筛选有效记录',
+    'extract_date': '提取日期',
+    'accumulate': '累计积分',
+    'store': '写入积分数据',
+    'qr': '生成二维码',
+    'write': '保存结果'
+}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程启动以来的内存峰值（MB），无法获取时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    if sys.platform == 'darwin':
+        return round(peak / 1024 / 1024, 1)
+    return round(peak / 1024, 1)
+
+
+class StageSpan:
+    """一次阶段执行，调用方在阶段结束前设置 rows_out"""
+
+    def __init__(self, rows_in: Optional[int] = None):
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+
+
+class StageRecord:
+    """单个阶段的累计结果"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+        self.peak_rss_mb: Optional[float] = None
+        self.peak_growth_mb = 0.0
+
+    def add(self, seconds: float, span: StageSpan, peak_before: Optional[float], peak_after: Optional[float]):
+        self.seconds += seconds
+        self.calls += 1
+        if span.rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + span.rows_in
+        if span.rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + span.rows_out
+        if peak_after is not None:
+            self.peak_rss_mb = peak_after
+            self.peak_growth_mb = round(self.peak_growth_mb + peak_after - peak_before, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'label': STAGE_NAMES.get(self.name, self.name),
+            'seconds': round(self.seconds, 4),
+            'calls': self.calls,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_rss_mb': self.peak_rss_mb,
+            'peak_growth_mb': self.peak_growth_mb
+        }
+
+
+class StageTimer:
+    """
+    处理流程计时器
+    内存为进程级的峰值（ru_maxrss）：peak_rss_mb 是阶段结束时的进程峰值，
+    peak_growth_mb 是该阶段使峰值上升的量（多个上传任务并行时包含其他任务的内存）
+    """
+
+    def __init__(self):
+        self.records: 'OrderedDict[str, StageRecord]' = OrderedDict()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[StageSpan]:
+        """计时一个阶段：with timer.stage('clean', len(df)) as span: ...; span.rows_out = len(df)"""
+        span = StageSpan(rows_in)
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            record = self.records.get(name)
+            if record is None:
+                record = self.records[name] = StageRecord(name)
+            record.add(time.perf_counter() - start, span, peak_before, peak_rss_mb())
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """各阶段结果（按首次执行的顺序）"""
+        return [record.to_dict() for record in self.records.values()]
+
+    def total_seconds(self) -> float:
+        return round(time.perf_counter() - self.started, 4)
+
+    def log(self, event: str = 'upload_timing', **context):
+        """输出一行结构化日志（JSON），便于按阶段检索和统计"""
+        payload = dict(context, event=event, total_seconds=self.total_seconds(), stages=self.to_list())
+        print(f"⏱️ {json.dumps(payload, ensure_ascii=False, default=str)}")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+管理员数据写入锁模块
+积分累计、过期压缩和清空等“读取-修改-写回”操作需要按管理员串行执行：
+同一进程内的多个上传线程通过线程锁互斥，多个工作进程之间通过 data/<管理员>/points.lock 锁文件互斥；
+file_lock 供其他多个进程共享的文件（如二维码缓存、用户查询索引）在“读取-合并-写回”时使用
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, IO, Iterator
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+
+def acquire_file_lock(lock_path: str) -> IO:
+    """打开并以阻塞方式锁定锁文件，返回的文件对象交给 release_file_lock 释放"""
+    lock_dir = os.path.dirname(lock_path)
+    if lock_dir:
+        os.makedirs(lock_dir, exist_ok=True)
+    f = open(lock_path, 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+    except Exception:
+        f.close()
+        raise
+    return f
+
+
+def release_file_lock(f: IO):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+@contextmanager
+def file_lock(lock_path: str) -> Iterator[None]:
+    """跨进程的排他锁（不可重入）：with file_lock('data/xxx.lock'): ..."""
+    f = acquire_file_lock(lock_path)
+    try:
+        yield
+    finally:
+        release_file_lock(f)
+
+
+class TenantLocks:
+    """
+    按管理员划分的可重入写入锁
+    同一线程可以嵌套获取同一管理员的锁（例如清空操作中再执行累计），锁文件只在最外层获取和释放
+    """
+
+    def __init__(self, data_dir: str = 'data', lock_filename: str = 'points.lock'):
+        self.data_dir = data_dir
+        self.lock_filename = lock_filename
+        self._locks: Dict[str, threading.RLock] = {}
+        self._depth: Dict[str, int] = {}
+        self._files: Dict[str, IO] = {}
+        self._lock = threading.Lock()
+
+    def _thread_lock(self, tenant: str) -> threading.RLock:
+        with self._lock:
+            lock = self._locks.get(tenant)
+            if lock is None:
+                lock = self._locks[tenant] = threading.RLock()
+            return lock
+
+    @contextmanager
+    def hold(self, tenant: str) -> Iterator[None]:
+        """持有管理员的写入锁：with tenant_locks.hold(tenant): storage.accumulate(tenant, ...)"""
+        with self._thread_lock(tenant):
+            depth = self._depth.get(tenant, 0)
+            if depth == 0:
+                self._files[tenant] = acquire_file_lock(os.path.join(self.data_dir, tenant, self.lock_filename))
+            self._depth[tenant] = depth + 1
+            try:
+                yield
+            finally:
+                self._depth[tenant] = depth
+                if depth == 0:
+                    release_file_lock(self._files.pop(tenant))
+
+
+# 全局管理员写入锁
+tenant_locks = TenantLocks()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+测试公共夹具
+应用模块在导入时会在当前目录创建配置和用户文件，测试期间在临时目录中运行
+"""
+
+import contextlib
+import importlib
+import io
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, 'benchmarks'))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """在临时目录中导入应用，数据文件不写入仓库"""
+    workdir = tmp_path_factory.mktemp('app')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            module = importlib.import_module('app')
+        yield module
+    finally:
+        os.chdir(cwd)
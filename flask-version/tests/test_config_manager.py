@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+配置管理测试
+"""
+
+import contextlib
+import io
+import json
+
+import pytest
+
+from config_manager import ConfigManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ConfigManager(str(tmp_path / 'system_config.json'))
+
+
+def test_snapshot_reflects_set_and_update_many(manager):
+    assert manager.snapshot.points_system.validity_days == 90
+
+    assert manager.set('points_system.validity_days', 30)
+    assert manager.snapshot.points_system.validity_days == 30
+
+    assert manager.update_many({'points_system.points_per_day': 3, 'storage.backend': 'sqlite'}) == {}
+    assert manager.snapshot.points_system.points_per_day == 3
+    assert manager.snapshot.storage.backend == 'sqlite'
+    assert manager.snapshot.points_system.validity_days == 30
+
+
+def test_snapshot_built_during_save_is_not_kept(manager):
+    """读取方用旧配置生成快照时，另一个线程完成了保存：之后的读取应看到新配置"""
+    build_snapshot = manager._build_snapshot
+    saved = []
+
+    def build_while_saving(config):
+        snapshot = build_snapshot(config)
+        if not saved:
+            saved.append(True)
+            assert manager.set('points_system.validity_days', 45)
+        return snapshot
+
+    manager._build_snapshot = build_while_saving
+    manager._snapshot = None
+    assert manager.snapshot.points_system.validity_days == 90    # 本次读取开始时的配置
+    assert manager.snapshot.points_system.validity_days == 45
+
+
+def test_failed_validation_leaves_config_unchanged(manager):
+    before = manager.snapshot
+    errors = manager.update_many({'points_system.validity_days': 0})
+    assert 'points_system' in errors
+    assert manager.snapshot is before
+
+
+def test_reload_picks_up_changes_from_other_process(manager, tmp_path):
+    other = ConfigManager(manager.config_file)
+    assert other.set('points_system.min_duration_minutes', 25)
+
+    manager.check_reload(force=True)
+    assert manager.snapshot.points_system.min_duration_minutes == 25
+    with open(manager.config_file, 'r', encoding='utf-8') as f:
+        assert json.load(f)['points_system']['min_duration_minutes'] == 25
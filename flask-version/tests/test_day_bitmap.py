@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+积分日位图测试
+"""
+
+import contextlib
+import io
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from day_bitmap import DayBitmap
+from points_storage import BitmapPointsStorage, CsvPointsStorage
+
+TODAY = date.today()
+
+
+def test_future_dates_are_ignored_without_moving_cutoff():
+    cutoff = TODAY - timedelta(days=30)
+    bitmap = DayBitmap(30, cutoff)
+    yesterday = TODAY - timedelta(days=1)
+    assert bitmap.add(['u1', 'u2', 'u3'], [yesterday] * 3) == 3
+
+    assert bitmap.add(['u4'], [date(2099, 1, 1)]) == 0
+    assert bitmap.add(['u4'], [TODAY + timedelta(days=1)]) == 0
+    assert bitmap.count() == 3
+    assert bitmap.cutoff_date == cutoff
+
+    # 有效期最后一天（今天）仍可写入
+    assert bitmap.add(['u4'], [TODAY]) == 1
+
+
+def test_day_points_follow_points_per_day_at_first_write():
+    """每日积分修改后，已有日期保持原积分，新日期使用新积分，与按记录保存积分的结果一致"""
+    bitmap = DayBitmap(30, TODAY - timedelta(days=30))
+    day1, day2 = TODAY - timedelta(days=2), TODAY - timedelta(days=1)
+    bitmap.add(['a', 'b'], [day1, day1], points_per_day=2)
+    bitmap.add(['a', 'c'], [day2, day1], points_per_day=5)
+
+    summary = bitmap.summary().set_index('UserID')
+    assert summary['TotalPoints'].to_dict() == {'a': 7, 'b': 2, 'c': 2}
+    assert summary['ValidDays'].to_dict() == {'a': 2, 'b': 1, 'c': 1}
+
+    history = pd.concat(bitmap.iter_history(), ignore_index=True)
+    assert history.groupby('Date')['Points'].first().to_dict() == {day1.isoformat(): 2, day2.isoformat(): 5}
+
+    # 日期过期后该日期的积分被清除
+    bitmap.expire(day1)
+    assert bitmap.summary().set_index('UserID')['TotalPoints'].to_dict() == {'a': 5}
+
+
+def test_save_and_load_keep_day_points(tmp_path):
+    bitmap = DayBitmap(10, TODAY - timedelta(days=10), points_per_day=3)
+    bitmap.add(['a'], [TODAY - timedelta(days=1)])
+    bitmap.add(['a'], [TODAY], points_per_day=4)
+    path = str(tmp_path / 'bitmap.npz')
+    bitmap.save(path)
+
+    loaded = DayBitmap.load(path)
+    assert np.array_equal(loaded.day_points, bitmap.day_points)
+    assert loaded.summary().equals(bitmap.summary())
+    assert DayBitmap.read_count(path) == 2
+
+    # 早期保存的文件（没有各日期积分和记录数）按保存时的每日积分计算
+    with open(path, 'wb') as f:
+        np.savez(f, user_ids=bitmap.user_ids.astype(str), bits=bitmap.bits,
+                 meta=np.array([bitmap.window_days, bitmap.cutoff, 3], dtype=np.int64))
+    assert DayBitmap.load(path).summary()['TotalPoints'].tolist() == [6]
+    assert DayBitmap.read_count(path) == 2
+
+
+def test_bitmap_backend_matches_csv_after_points_per_day_changes(tmp_path):
+    """CSV 数据转换为位图后修改每日积分再上传（新日期加重复记录），总积分与 CSV 后端一致"""
+    cutoff = TODAY - timedelta(days=30)
+    rng = np.random.default_rng(11)
+
+    def upload(first_day, last_day):
+        return pd.DataFrame({
+            'UserID': [f'u{i}' for i in rng.integers(0, 50, 400)],
+            'Date': [TODAY - timedelta(days=int(day)) for day in rng.integers(first_day, last_day, 400)]
+        })
+
+    first = upload(10, 20)
+    second = pd.concat([upload(0, 10), first.iloc[::3]], ignore_index=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        CsvPointsStorage(str(tmp_path / 'bitmap')).accumulate('t', first, None, 2, cutoff)
+        # 位图后端由已有的 points_history.csv 建立
+        bitmap_points = BitmapPointsStorage(str(tmp_path / 'bitmap')).accumulate('t', second, None, 3, cutoff)
+
+        reference = CsvPointsStorage(str(tmp_path / 'csv'))
+        reference.accumulate('t', first, None, 2, cutoff)
+        csv_points = reference.accumulate('t', second, None, 3, cutoff)
+
+    def by_user(user_points):
+        return user_points.set_index('UserID')[['TotalPoints', 'ValidDays']].sort_index().astype('int64')
+
+    assert by_user(bitmap_points).equals(by_user(csv_points))
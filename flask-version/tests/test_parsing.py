@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+时长和时间解析测试
+向量化解析的结果应与旧版逐行解析器（benchmarks/bench_duration_parser.py）完全一致
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope='module')
+def legacy(app_module):
+    import bench_duration_parser
+    return bench_duration_parser
+
+
+def assert_same_as_legacy(app_module, legacy, series):
+    expected = pd.to_numeric(legacy.legacy_parse_duration_column(series), errors='coerce').to_numpy(dtype='float64')
+    actual = app_module.parse_duration_column(series).to_numpy()
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_duration_formats_match_legacy(app_module, legacy):
+    assert_same_as_legacy(app_module, legacy, legacy.make_duration_column(20000))
+
+
+def test_duration_mixed_int_and_float_match_legacy(app_module, legacy):
+    """Excel 读取的 object 列中 45 和 45.0 不能被当作同一个值（旧实现 '45.0' 无法解析）"""
+    series = pd.Series([45, 45.0, '45', 90.5, None, np.nan, '1小时2分3秒', 45, 45.0, True], dtype=object)
+    assert_same_as_legacy(app_module, legacy, series)
+
+    parsed = app_module.parse_duration_column(series)
+    assert parsed.iloc[0] == 45.0
+    assert np.isnan(parsed.iloc[1])
+
+
+@pytest.mark.parametrize('series', [
+    pd.Series([45.0, 30.0, np.nan]),
+    pd.Series([45, 30, 0]),
+    pd.Series(['43分53秒', None, '90:30', ' 12 '], dtype='str')
+])
+def test_duration_typed_columns_match_legacy(app_module, legacy, series):
+    assert_same_as_legacy(app_module, legacy, series)
+
+
+def test_datetime_column_infers_format_and_falls_back_per_row(app_module):
+    series = pd.Series(['2026-03-10 17:05:35'] * 250 + ['2026/03/11 08:00:00', '03/12/2026 09:30:00', '不是时间', None])
+    parsed = app_module.parse_datetime_column(series)
+
+    assert (parsed.iloc[:250] == pd.Timestamp('2026-03-10 17:05:35')).all()
+    assert parsed.iloc[250] == pd.Timestamp('2026-03-11 08:00:00')
+    assert parsed.iloc[251] == pd.Timestamp('2026-03-12 09:30:00')
+    assert pd.isna(parsed.iloc[252]) and pd.isna(parsed.iloc[253])
+
+
+def test_datetime_column_already_parsed_is_returned_unchanged(app_module):
+    series = pd.Series(pd.to_datetime(['2026-03-10 17:05:35', None]))
+    assert app_module.parse_datetime_column(series) is series
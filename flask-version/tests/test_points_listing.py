@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+积分列表测试
+"""
+
+import pandas as pd
+
+from points_listing import PointsListing
+
+
+def test_snapshot_name_filter_uses_snapshot_names():
+    """上传结果快照按昵称筛选时只使用快照中的昵称，不受当前积分数据影响"""
+    snapshot = pd.DataFrame({
+        'UserID': ['1', '2', '3', '4'],
+        'TotalPoints': [5, 3, 8, 1],
+        'ValidDays': [5, 3, 8, 1],
+        'UserName': ['小明', 'Alice', '明明', None]
+    })
+    listing = PointsListing(snapshot, 'snapshot')
+
+    # 当前积分数据中已没有这些用户
+    result = listing.page(1, 10, search_user_name='明', match_user_name=listing.match_user_name)
+    assert result['data']['UserID'].tolist() == ['3', '1']
+
+    result = listing.page(1, 10, search_user_name='ALI', match_user_name=listing.match_user_name)
+    assert result['data']['UserID'].tolist() == ['2']
+
+    assert listing.match_user_name('不存在').empty
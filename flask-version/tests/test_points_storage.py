@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+积分存储后端测试
+CSV 后端的增量累计（只追加历史记录、按日期键去重）应与由历史记录完整重算的结果一致；
+各后端在写入时记录的历史记录数应与实际记录数一致
+"""
+
+import contextlib
+import io
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from points_storage import BitmapPointsStorage, CsvPointsStorage, SqlitePointsStorage
+
+TODAY = date.today()
+CUTOFF = TODAY - timedelta(days=30)
+
+
+def make_upload(seed, days=10, users=300, rows=2000):
+    """随机的每日统计（含重复的 用户-日期），日期为最近 days 天"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'UserID': [f'u{i:04d}' for i in rng.integers(0, users, rows)],
+        'Date': [TODAY - timedelta(days=int(day)) for day in rng.integers(0, days, rows)]
+    })
+
+
+def recompute(points_history_file):
+    """由历史文件完整重算的用户积分"""
+    history = pd.read_csv(points_history_file, dtype={'UserID': str})
+    assert not history.duplicated(['UserID', 'Date']).any()
+    return history.groupby('UserID').agg(TotalPoints=('Points', 'sum'), ValidDays=('Points', 'size'))
+
+
+def totals(user_points):
+    return user_points.set_index('UserID')[['TotalPoints', 'ValidDays']].sort_index().astype('int64')
+
+
+@contextlib.contextmanager
+def recording_reads(monkeypatch):
+    """记录 pd.read_csv 读取的文件名"""
+    paths = []
+    read_csv = pd.read_csv
+
+    def spy(path, *args, **kwargs):
+        paths.append(os.path.basename(str(path)))
+        return read_csv(path, *args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', spy)
+    yield paths
+    monkeypatch.setattr(pd, 'read_csv', read_csv)
+
+
+def test_incremental_accumulate_matches_full_recompute(tmp_path):
+    storage = CsvPointsStorage(str(tmp_path / 'incremental'))
+    uploads = [make_upload(seed) for seed in range(6)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for round_no, upload in enumerate(uploads):
+            names = pd.Series({'u0001': f'昵称{round_no}'})
+            user_points = storage.accumulate('t', upload, names, 2 if round_no < 3 else 3, CUTOFF)
+
+            history_file = tmp_path / 'incremental' / 't' / 'points_history.csv'
+            assert totals(user_points).equals(recompute(history_file).astype('int64'))
+
+        # 一次性导入所有记录（完整重算）得到相同的历史记录数和有效天数
+        full = CsvPointsStorage(str(tmp_path / 'full')).accumulate('t', pd.concat(uploads), None, 2, CUTOFF)
+    assert totals(full)['ValidDays'].equals(totals(user_points)['ValidDays'])
+    assert storage.get_user_points('t').set_index('UserID').loc['u0001', 'UserName'] == '昵称5'
+
+
+def test_incremental_accumulate_does_not_read_history(tmp_path, monkeypatch):
+    """已有数据时上传只读取本次涉及日期的键，不读取整个历史文件"""
+    storage = CsvPointsStorage(str(tmp_path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.accumulate('t', make_upload(1), None, 1, CUTOFF)
+        with recording_reads(monkeypatch) as paths:
+            storage.accumulate('t', make_upload(2, days=3), None, 1, CUTOFF)
+    assert 'points_history.csv' not in paths
+
+
+def test_rebuilds_date_keys_after_history_changes(tmp_path):
+    """历史文件被清空单个用户等操作改写后，重复上传不会产生重复记录"""
+    storage = CsvPointsStorage(str(tmp_path))
+    upload = make_upload(3)
+    history_file = tmp_path / 't' / 'points_history.csv'
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.accumulate('t', upload, None, 1, CUTOFF)
+        assert storage.clear_user('t', upload['UserID'].iloc[0])
+        storage.accumulate('t', upload, None, 1, CUTOFF)
+
+        # 外部直接修改历史文件（去掉一半记录）后，日期索引由历史文件重建
+        history = pd.read_csv(history_file, dtype={'UserID': str})
+        history.iloc[::2].to_csv(history_file, index=False)
+        storage.accumulate('t', upload, None, 1, CUTOFF)
+
+    assert len(pd.read_csv(history_file)) == len(upload.drop_duplicates())
+
+
+def test_expire_compacts_history_and_updates_totals(tmp_path, monkeypatch):
+    storage = CsvPointsStorage(str(tmp_path))
+    history_file = tmp_path / 't' / 'points_history.csv'
+    cutoff = TODAY - timedelta(days=5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.accumulate('t', make_upload(4), None, 1, CUTOFF)
+        user_points = storage.expire('t', cutoff)
+
+    history = pd.read_csv(history_file)
+    assert (pd.to_datetime(history['Date']).dt.date > cutoff).all()
+    assert totals(user_points).equals(recompute(history_file).astype('int64'))
+    assert storage._date_keys('t').dates()[0] > cutoff.isoformat()
+
+    # 没有过期日期时不读取历史文件
+    with recording_reads(monkeypatch) as paths:
+        storage.expire('t', cutoff)
+    assert 'points_history.csv' not in paths
+    assert storage.expire('missing', cutoff) is None
+
+
+def history_length(storage, tenant):
+    return sum(len(chunk) for chunk in storage.iter_history(tenant))
+
+
+def exercise(storage, tenant='t'):
+    """上传、重复上传、清空单个用户和过期压缩，每一步后比较记录的计数与实际记录数"""
+    upload = make_upload(5)
+    steps = [
+        lambda: storage.accumulate(tenant, upload, None, 1, CUTOFF),
+        lambda: storage.accumulate(tenant, make_upload(6, days=3), None, 1, CUTOFF),
+        lambda: storage.accumulate(tenant, upload, None, 1, CUTOFF),
+        lambda: storage.clear_user(tenant, upload['UserID'].iloc[0]),
+        lambda: storage.expire(tenant, TODAY - timedelta(days=4)),
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for step in steps:
+            step()
+            rows = history_length(storage, tenant)
+            assert storage.count_history(tenant) == rows
+            assert storage.history_row_counts()[tenant] == rows
+        storage.clear_all(tenant)
+    assert storage.history_row_counts()[tenant] == 0
+
+
+def test_csv_history_row_count_is_kept_at_write_time(tmp_path, monkeypatch):
+    storage = CsvPointsStorage(str(tmp_path))
+    exercise(storage)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.accumulate('t', make_upload(7), None, 1, CUTOFF)
+    with recording_reads(monkeypatch) as paths:
+        assert storage.history_row_counts() == {'t': history_length(storage, 't')}
+    assert paths.count('points_history.csv') == 1      # 只有 history_length 读取了历史文件
+
+
+def test_bitmap_history_row_count_is_kept_at_write_time(tmp_path):
+    exercise(BitmapPointsStorage(str(tmp_path)))
+
+
+def test_sqlite_history_row_count_is_kept_at_write_time(tmp_path):
+    storage = SqlitePointsStorage(str(tmp_path / 'points.db'), str(tmp_path))
+    exercise(storage)
+
+    # 只有 CSV 数据、尚未导入的管理员不会因为读取计数而被导入
+    with contextlib.redirect_stdout(io.StringIO()):
+        CsvPointsStorage(str(tmp_path)).accumulate('csv_only', make_upload(8), None, 1, CUTOFF)
+    assert 'csv_only' not in storage.history_row_counts()
+    with sqlite3.connect(str(tmp_path / 'points.db')) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM tenants WHERE tenant = 'csv_only'").fetchone()[0] == 0
+
+
+def test_sqlite_history_row_count_is_initialized_for_existing_databases(tmp_path):
+    db_path = str(tmp_path / 'points.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        SqlitePointsStorage(db_path, str(tmp_path)).accumulate('t', make_upload(9), None, 1, CUTOFF)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('ALTER TABLE tenants DROP COLUMN history_rows')
+
+    storage = SqlitePointsStorage(db_path, str(tmp_path))
+    assert storage.history_row_counts() == {'t': history_length(storage, 't')}
+
+
+def test_data_metrics_use_recorded_history_counts(app_module):
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.get_storage().accumulate('metrics', make_upload(10), None, 1, CUTOFF)
+    storage = app_module.get_storage()
+    metrics = {name: samples for name, _, _, samples in app_module.collect_data_metrics()}
+    tenants = storage.list_tenants()
+    assert metrics['points_tenants'] == [({}, len(tenants))]
+    assert metrics['points_history_rows'] == [({}, sum(storage.count_history(tenant) for tenant in tenants))]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+二维码缓存测试
+两个 QrCacheStore 实例共享同一个缓存文件，模拟多个工作进程
+"""
+
+import json
+
+from qr_cache import QrCacheStore
+
+
+def make_store(path, max_size=100):
+    # 测试中手动 flush，延迟写入定时器设得足够长
+    return QrCacheStore(cache_file=str(path), flush_delay=3600, max_size=max_size)
+
+
+def read_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_flush_merges_entries_from_other_processes(tmp_path):
+    """两个进程各自新增条目后先后写入，文件中保留双方的条目"""
+    path = tmp_path / 'qr.json'
+    first, second = make_store(path), make_store(path)
+    first.set('a', {'filename': 'a.png'})
+    second.set('b', {'filename': 'b.png'})
+    assert first.flush() and second.flush()
+
+    assert read_file(path) == {'a': {'filename': 'a.png'}, 'b': {'filename': 'b.png'}}
+    # 写入后内存与文件一致，之后的读取能看到其他进程的条目
+    assert second.get('a') == {'filename': 'a.png'}
+    assert first.get('b') == {'filename': 'b.png'}
+
+
+def test_flush_applies_only_own_removals_and_updates(tmp_path):
+    """删除和修改只作用于本进程改动过的条目，其他进程随后新增的条目不受影响"""
+    path = tmp_path / 'qr.json'
+    first = make_store(path)
+    first.set('a', {'v': 1})
+    first.set('b', {'v': 1})
+    first.flush()
+
+    second = make_store(path)
+    second.set('d', {'v': 2})                   # 有未写入的修改，不再重新加载文件
+    first.set('c', {'v': 1})
+    first.flush()
+
+    assert second.remove_where(lambda info: info['v'] == 1) == 2     # 只删除本进程看到的 a、b
+    second.flush()
+
+    assert read_file(path) == {'c': {'v': 1}, 'd': {'v': 2}}
+
+
+def test_flush_enforces_limit_on_merged_entries(tmp_path):
+    """合并后的条目数仍受上限约束，淘汰最久未使用的条目"""
+    path = tmp_path / 'qr.json'
+    first, second = make_store(path, max_size=3), make_store(path, max_size=3)
+    for user_id in ('a', 'b'):
+        first.set(user_id, {})
+    first.flush()
+    for user_id in ('c', 'd'):
+        second.set(user_id, {})
+    second.flush()
+
+    assert list(read_file(path)) == ['b', 'c', 'd']
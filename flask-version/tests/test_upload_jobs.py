@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+上传任务测试
+在临时工作目录中导入应用，用合成的观看记录（benchmarks/synthetic_logs.py）执行上传任务
+
+运行（在 flask-version 目录下）: python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import time
+from datetime import date, timedelta
+
+from synthetic_logs import generate_viewing_log, write_viewing_log
+from upload_jobs import UploadJobManager
+
+
+def write_log(path, seed, end_date):
+    log = generate_viewing_log(users=4000, days=20, sessions_per_user=5, seed=seed, end_date=end_date)
+    write_viewing_log(log, str(path))
+    return str(path)
+
+
+def wait_for(manager, job_ids, owner, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        jobs = [manager.get(job_id, owner) for job_id in job_ids]
+        if all(job.status in ('done', 'failed') for job in jobs):
+            return jobs
+        time.sleep(0.05)
+    raise TimeoutError('上传任务未在限定时间内完成')
+
+
+def history_keys(app_module, tenant):
+    history = next(app_module.get_storage().iter_history(tenant, chunk_rows=10 ** 7))
+    return set(zip(history['UserID'], history['Date']))
+
+
+def test_concurrent_jobs_for_same_owner_keep_both_uploads(app_module, tmp_path):
+    """同一管理员同时提交两个上传任务，积分历史应与依次处理两个文件的结果相同"""
+    today = date.today()
+    first = write_log(tmp_path / 'first.csv', 1, today - timedelta(days=1))
+    second = write_log(tmp_path / 'second.csv', 2, today)
+
+    # 对照：依次处理
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in (first, second):
+            assert app_module.process_uploaded_file(path, user_id='serial')['success']
+
+    manager = app_module.upload_job_manager
+    job_ids = [
+        manager.submit('concurrent', os.path.basename(path), app_module.run_upload_job,
+                       path, 'concurrent', 'http://localhost/query')
+        for path in (first, second)
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        jobs = wait_for(manager, job_ids, 'concurrent')
+    assert [job.status for job in jobs] == ['done', 'done'], [job.error for job in jobs]
+
+    expected = history_keys(app_module, 'serial')
+    assert history_keys(app_module, 'concurrent') == expected
+
+    storage = app_module.get_storage()
+    serial = storage.get_user_points('serial').set_index('UserID').sort_index()
+    concurrent = storage.get_user_points('concurrent').set_index('UserID').sort_index()
+    assert concurrent[['TotalPoints', 'ValidDays']].equals(serial[['TotalPoints', 'ValidDays']])
+
+
+def test_job_state_is_visible_to_other_processes(app_module, tmp_path):
+    """任务状态写入文件，其他工作进程（新的任务管理器实例）也能查询到进度和结果"""
+    path = write_log(tmp_path / 'upload.csv', 3, date.today())
+    manager = app_module.upload_job_manager
+    job_id = manager.submit('shared', 'upload.csv', app_module.run_upload_job,
+                            path, 'shared', 'http://localhost/query')
+    with contextlib.redirect_stdout(io.StringIO()):
+        job, = wait_for(manager, [job_id], 'shared')
+    assert job.status == 'done', job.error
+
+    other_process = UploadJobManager()
+    loaded = other_process.get(job_id, 'shared')
+    assert loaded is not None
+    assert loaded.to_dict() == job.to_dict()
+    assert loaded.result['result_id'] == job.result['result_id']
+    assert other_process.get(job_id, 'someone_else') is None
+
+
+def test_result_timings_include_store_and_write_stages(app_module, tmp_path):
+    """结果页的阶段耗时包含写入积分存储和保存结果两个阶段"""
+    path = write_log(tmp_path / 'timed.csv', 4, date.today())
+    manager = app_module.upload_job_manager
+    job_id = manager.submit('timed', 'timed.csv', app_module.run_upload_job, path, 'timed', 'http://localhost/query')
+    with contextlib.redirect_stdout(io.StringIO()):
+        job, = wait_for(manager, [job_id], 'timed')
+    assert job.status == 'done', job.error
+
+    summary, user_points = app_module.upload_result_store.load(job.result['result_id'], 'timed')
+    stages = [stage['stage'] for stage in summary['timings']]
+    assert stages[-3:] == ['store', 'qr', 'write']
+    assert 'accumulate' in stages
+    store = summary['timings'][stages.index('store')]
+    assert store['rows_out'] == len(user_points)
+
+
+def test_streaming_upload_times_store_stage(app_module, tmp_path, monkeypatch):
+    """分块流式导入同样单独记录写入积分存储的耗时"""
+    path = write_log(tmp_path / 'stream.csv', 5, date.today())
+    monkeypatch.setattr(app_module, 'should_stream_upload', lambda file_path: True)
+    timer = app_module.StageTimer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = app_module.process_uploaded_file(path, user_id='streamed', timer=timer)
+    assert result['success'], result.get('error')
+    assert list(timer.records)[-2:] == ['accumulate', 'store']
+    assert timer.records['store'].rows_out == result['total_users']
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+昵称 n-gram 索引和跨管理员用户查询索引测试
+"""
+
+import os
+import threading
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from user_index import RANK_EXACT, RANK_PREFIX, RANK_SUBSTRING, NgramNameIndex, UserLookupIndex
+
+
+def brute_force(names, query):
+    """逐个比较的参照实现：不区分大小写的子串匹配，按 完全、前缀、子串 排序，同类保持原顺序"""
+    query = query.lower()
+    matched = []
+    for row, name in enumerate(names.fillna('').astype(str).str.lower()):
+        if query in name:
+            rank = RANK_EXACT if name == query else RANK_PREFIX if name.startswith(query) else RANK_SUBSTRING
+            matched.append((rank, row))
+    matched.sort()
+    return [row for _, row in matched], [rank for rank, _ in matched]
+
+
+def test_search_matches_brute_force():
+    rng = np.random.default_rng(7)
+    chars = list('小明红华Ab') + ['']
+    names = pd.Series([''.join(rng.choice(chars, rng.integers(0, 6))) for _ in range(3000)] +
+                      ['明' * 300 + 'ab', None, 'ABab'], dtype=object)
+    index = NgramNameIndex(names)
+
+    for query in ['明', '小明', 'ab', 'AB', '明红华', '明明明', 'a明b', '明' * 299 + 'a', '']:
+        rows, ranks = index.search(query)
+        assert (rows.tolist(), ranks.tolist()) == brute_force(names, query), query
+
+
+def test_long_name_does_not_widen_whole_chunk():
+    """一个 1000 字的昵称不应让整块（数万个）昵称都按 1000 字宽建立码点矩阵"""
+    names = pd.Series(['长' * 1000] + [f'用户{i}' for i in range(70000)])
+    tracemalloc.start()
+    try:
+        index = NgramNameIndex(names)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < 200 * 1024 * 1024
+    assert index.search('长' * 1000)[0].tolist() == [0]
+    assert index.search('用户6999')[0].tolist()[:1] == [7000]
+
+
+def write_user_points(data_dir, tenant, names):
+    """写入管理员的 user_points.csv，返回写入的数据"""
+    user_points = pd.DataFrame({
+        'UserID': [str(i) for i in range(len(names))],
+        'UserName': names,
+        'TotalPoints': [i + 1 for i in range(len(names))],
+        'ValidDays': [i + 1 for i in range(len(names))]
+    })
+    os.makedirs(data_dir / tenant, exist_ok=True)
+    user_points.to_csv(data_dir / tenant / 'user_points.csv', index=False)
+    return user_points
+
+
+def test_lookup_index_updates_only_the_changed_tenant(tmp_path):
+    """上传只重写该管理员的索引文件，其他进程（另一个索引实例）能查到所有管理员的数据"""
+    first, second = UserLookupIndex(str(tmp_path)), UserLookupIndex(str(tmp_path))
+    first.update_tenant('alice', write_user_points(tmp_path, 'alice', ['小明', '小红']))
+    second.update_tenant('bob', write_user_points(tmp_path, 'bob', ['明明']))
+
+    alice_index = tmp_path / 'alice' / 'user_index.csv'
+    alice_mtime = os.stat(alice_index).st_mtime_ns
+    first.update_tenant('bob', write_user_points(tmp_path, 'bob', ['明明', '大明']))
+    assert os.stat(alice_index).st_mtime_ns == alice_mtime
+
+    for index in (first, second, UserLookupIndex(str(tmp_path))):
+        assert index.search('明')['UserName'].tolist() == ['明明', '小明', '大明']
+        assert index.search('红', 'alice')['UserID'].tolist() == ['1']
+        assert index.search('明', 'carol') is None
+
+
+def test_lookup_index_concurrent_updates_from_several_processes(tmp_path):
+    """多个进程同时更新不同管理员的索引时不互相覆盖，也不会因临时文件冲突而失败"""
+    tenants = [f'tenant{i}' for i in range(4)]
+    for tenant in tenants:
+        write_user_points(tmp_path, tenant, [f'{tenant}用户'])
+
+    errors = []
+
+    def worker(tenant):
+        index = UserLookupIndex(str(tmp_path))
+        try:
+            for round_no in range(10):
+                names = [f'{tenant}用户'] * (round_no + 1)
+                index.update_tenant(tenant, write_user_points(tmp_path, tenant, names))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(tenant,)) for tenant in tenants]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    index = UserLookupIndex(str(tmp_path))
+    for tenant in tenants:
+        assert len(index.search('用户', tenant)) == 10
+    assert sorted(index.tenants) == tenants
+
+
+def test_lookup_index_rebuilds_tenants_changed_outside_the_index(tmp_path):
+    """user_points.csv 被直接修改或删除时，下次加载按文件重建或移除该管理员"""
+    index = UserLookupIndex(str(tmp_path))
+    index.update_tenant('alice', write_user_points(tmp_path, 'alice', ['小明']))
+    index.update_tenant('bob', write_user_points(tmp_path, 'bob', ['小红']))
+
+    write_user_points(tmp_path, 'alice', ['小明', '小明二号'])
+    os.remove(tmp_path / 'bob' / 'user_points.csv')
+
+    reloaded = UserLookupIndex(str(tmp_path))
+    assert reloaded.search('小明')['UserName'].tolist() == ['小明', '小明二号']
+    assert reloaded.search('小红').empty
+    assert reloaded.search('小红', 'bob') is None
+    assert not os.path.exists(tmp_path / 'bob' / 'user_index.csv')
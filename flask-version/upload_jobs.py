@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+上传任务模块
+在后台线程池中执行上传文件的处理流程，并提供任务进度查询；
+任务状态同时写入 data/<管理员>/upload_jobs/<任务ID>.json，多个工作进程时任一进程都能查询到任务进度
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+# 任务ID格式（uuid4 hex），防止路径穿越
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# 任务阶段及其显示名称
+STAGE_LABELS = {
+    'queued': '排队中',
+    'read': '读取文件',
+    'clean': '清理数据',
+    'parse': '解析时长',
+    'filter': '筛选有效记录',
+    'accumulate': '累计积分',
+    'qr': '生成二维码',
+    'done': '处理完成',
+    'failed': '处理失败'
+}
+
+
+class UploadJob:
+    """单个上传任务的状态"""
+
+    # 需要持久化的字段
+    STATE_FIELDS = ('job_id', 'owner', 'filename', 'status', 'stage', 'rows_processed', 'rows_total',
+                    'error', 'result', 'created_at', 'started_at', 'finished_at', 'updated_at')
+
+    def __init__(self, job_id: str, owner: str, filename: str,
+                 on_change: Optional[Callable[['UploadJob'], None]] = None):
+        self.job_id = job_id
+        self.owner = owner
+        self.filename = filename
+        self.status = 'queued'           # queued / running / done / failed
+        self.stage = 'queued'
+        self.rows_processed: Optional[int] = None    # 没有逐行进度的阶段为None
+        self.rows_total: Optional[int] = None
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.updated_at = self.created_at
+        self.on_change = on_change      # 进度变化时的回调（用于写入任务状态文件）
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, rows_processed: Optional[int] = None, rows_total: Optional[int] = None):
+        """
+        更新任务进度（供处理流程回调）
+        stage: 当前阶段，见 STAGE_LABELS
+        rows_processed: 已处理行数，不传时保持不变（整表处理没有逐行进度）
+        rows_total: 总行数（可为估算值）
+        """
+        with self._lock:
+            self.stage = stage
+            if rows_total is not None:
+                self.rows_total = rows_total
+            if rows_processed is not None:
+                self.rows_processed = rows_processed
+            self.updated_at = time.time()
+
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def eta_seconds(self) -> Optional[float]:
+        """根据已处理行数的速度估算剩余时间（秒）"""
+        if self.status != 'running' or not self.started_at:
+            return None
+        if not self.rows_total or not self.rows_processed:
+            return None
+
+        elapsed = time.time() - self.started_at
+        remaining = max(self.rows_total - self.rows_processed, 0)
+        return round(elapsed / self.rows_processed * remaining, 1)
+
+    def to_state(self) -> Dict[str, Any]:
+        """完整的任务状态（包含处理结果，用于写入状态文件）"""
+        with self._lock:
+            return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'UploadJob':
+        """由状态文件的内容恢复任务（只用于查询）"""
+        job = cls(state['job_id'], state['owner'], state['filename'])
+        for field in cls.STATE_FIELDS:
+            if field in state:
+                setattr(job, field, state[field])
+        return job
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态快照（不包含处理结果）"""
+        with self._lock:
+            progress = None
+            if self.status == 'done':
+                progress = 100.0
+            elif self.rows_total and self.rows_processed is not None:
+                progress = round(min(self.rows_processed / self.rows_total, 1.0) * 100, 1)
+
+            return {
+                'job_id': self.job_id,
+                'filename': self.filename,
+                'status': self.status,
+                'stage': self.stage,
+                'stage_label': STAGE_LABELS.get(self.stage, self.stage),
+                'rows_processed': self.rows_processed,
+                'rows_total': self.rows_total,
+                'progress': progress,
+                'eta_seconds': self.eta_seconds(),
+                'error': self.error,
+                'created_at': datetime.fromtimestamp(self.created_at).isoformat()
+            }
+
+
+class UploadJobManager:
+    """上传任务管理器"""
+
+    def __init__(self, max_workers: int = 2, retention_seconds: int = 3600, data_dir: str = 'data',
+                 save_interval: float = 0.5, stale_seconds: int = 1800):
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds    # 已结束任务的保留时间
+        self.data_dir = data_dir
+        self.save_interval = save_interval            # 处理中的进度写入状态文件的最小间隔（秒）
+        self.stale_seconds = stale_seconds            # 未结束的任务超过该时间没有进度更新时视为已中断
+        self._saved_at: Dict[str, float] = {}
+        self.jobs: Dict[str, UploadJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """延迟创建线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='upload-job')
+        return self._executor
+
+    def submit(self, owner: str, filename: str, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> str:
+        """
+        提交上传任务，立即返回任务ID
+        func 在后台线程中执行，调用方式为 func(job, *args, **kwargs)，
+        返回值作为任务结果；返回 {'success': False, 'error': ...} 或抛出异常时任务失败
+        """
+        job = UploadJob(uuid.uuid4().hex, owner, filename, on_change=self._save_progress)
+
+        with self._lock:
+            self._purge_finished()
+            self.jobs[job.job_id] = job
+            executor = self._get_executor()
+
+        self._purge_files(owner)
+        self._save(job)
+        executor.submit(self._run, job, func, args, kwargs)
+        return job.job_id
+
+    def _run(self, job: UploadJob, func: Callable[..., Dict[str, Any]], args, kwargs):
+        """在工作线程中执行任务"""
+        job.status = 'running'
+        job.started_at = time.time()
+        self._save(job)
+
+        try:
+            result = func(job, *args, **kwargs)
+            if result.get('success'):
+                job.result = result
+                job.status = 'done'
+                job.update('done', job.rows_total)
+            else:
+                job.error = result.get('error', '未知错误')
+                job.status = 'failed'
+                job.update('failed')
+        except Exception as e:
+            print(f"❌ 上传任务 {job.job_id} 执行失败: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+            job.update('failed')
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+
+    def _job_dir(self, owner: str) -> str:
+        return os.path.join(self.data_dir, owner, 'upload_jobs')
+
+    def _save(self, job: UploadJob):
+        """将任务状态原子写入状态文件（写入失败不影响任务执行）"""
+        job_dir = self._job_dir(job.owner)
+        path = os.path.join(job_dir, f"{job.job_id}.json")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(job_dir, exist_ok=True)
+            state = job.to_state()
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+            self._saved_at[job.job_id] = time.monotonic()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ 保存上传任务 {job.job_id} 的状态失败: {str(e)}")
+
+    def _save_progress(self, job: UploadJob):
+        """进度回调：处理中的进度按 save_interval 限制写入频率，阶段结束时由 _run 写入最终状态"""
+        if time.monotonic() - self._saved_at.get(job.job_id, 0) >= self.save_interval:
+            self._save(job)
+
+    def _load(self, job_id: str, owner: str) -> Optional[UploadJob]:
+        """从状态文件读取其他工作进程执行的任务"""
+        try:
+            with open(os.path.join(self._job_dir(owner), f"{job_id}.json"), 'r', encoding='utf-8') as f:
+                job = UploadJob.from_state(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # 执行任务的进程已退出时任务不会再更新
+        if job.status in ('queued', 'running') and time.time() - job.updated_at > self.stale_seconds:
+            job.status = 'failed'
+            job.stage = 'failed'
+            job.error = '上传任务已中断，请重新上传'
+        return job
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[UploadJob]:
+        """
+        获取任务，指定 owner 时只返回该用户的任务
+        本进程中没有该任务时读取状态文件（需要指定 owner）
+        """
+        if not job_id or not JOB_ID_PATTERN.match(job_id):
+            return None
+
+        with self._lock:
+            job = self.jobs.get(job_id)
+
+        if job is None and owner is not None:
+            job = self._load(job_id, owner)
+
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def _purge_finished(self):
+        """清理超过保留时间的已结束任务（调用方需持有锁）"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+            self._saved_at.pop(job_id, None)
+
+    def _purge_files(self, owner: str):
+        """删除超过保留时间未更新的任务状态文件"""
+        job_dir = self._job_dir(owner)
+        if not os.path.exists(job_dir):
+            return
+
+        now = time.time()
+        for filename in os.listdir(job_dir):
+            path = os.path.join(job_dir, filename)
+            try:
+                if now - os.path.getmtime(path) > self.retention_seconds:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+# 全局上传任务管理器实例
+upload_job_manager = UploadJobManager()
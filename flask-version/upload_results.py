@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+上传结果存储模块
+将上传处理结果（用户积分表和摘要信息）保存在服务器端，session 中只保存结果ID
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from frame_cache import frame_cache
+
+# pyarrow 为可选依赖：可用时使用 Feather 列式格式（内存映射读取），否则使用 pickle
+try:
+    import pyarrow.feather as feather
+    HAS_PYARROW = True
+except ImportError:
+    feather = None
+    HAS_PYARROW = False
+
+# 结果ID格式（uuid4 hex），防止路径穿越
+RESULT_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadResultStore:
+    """服务器端上传结果存储，按过期时间清理"""
+
+    def __init__(self, result_dir: str = 'data/upload_results', ttl_seconds: int = 24 * 3600):
+        self.result_dir = result_dir
+        self.ttl_seconds = ttl_seconds
+        self.data_suffix = '.feather' if HAS_PYARROW else '.pkl'
+        self._lock = threading.Lock()
+
+    def _paths(self, result_id: str) -> Tuple[str, str]:
+        base = os.path.join(self.result_dir, result_id)
+        return base + '.json', base + self.data_suffix
+
+    @staticmethod
+    def _write_atomic(path: str, write):
+        tmp_path = path + '.tmp'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def save(self, owner: str, summary: Dict[str, Any], user_points: pd.DataFrame) -> str:
+        """
+        保存上传结果，返回结果ID
+        summary: 摘要信息（filename、total_users、general_qr、upload_time 等，需可 JSON 序列化）
+        """
+        if not os.path.exists(self.result_dir):
+            os.makedirs(self.result_dir)
+
+        self.purge_expired()
+
+        result_id = uuid.uuid4().hex
+        meta_path, data_path = self._paths(result_id)
+        user_points = user_points.reset_index(drop=True)
+
+        if HAS_PYARROW:
+            self._write_atomic(data_path, lambda path: feather.write_feather(user_points, path))
+        else:
+            self._write_atomic(data_path, user_points.to_pickle)
+
+        meta = dict(summary, owner=owner, created_at=time.time())
+
+        def write_meta(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+        self._write_atomic(meta_path, write_meta)
+        return result_id
+
+    def update_summary(self, result_id: str, owner: str, **fields) -> bool:
+        """更新已保存结果的摘要信息（例如保存完成后才能确定的阶段耗时），结果不存在时返回False"""
+        if not result_id or not RESULT_ID_PATTERN.match(result_id):
+            return False
+
+        meta_path, _ = self._paths(result_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if meta.get('owner') != owner:
+            return False
+
+        meta.update(fields)
+
+        def write_meta(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+        self._write_atomic(meta_path, write_meta)
+        return True
+
+    def _read_frame(self, data_path: str) -> pd.DataFrame:
+        if HAS_PYARROW:
+            return feather.read_table(data_path, memory_map=True).to_pandas()
+        return pd.read_pickle(data_path)
+
+    def load(self, result_id: str, owner: str) -> Optional[Tuple[Dict[str, Any], pd.DataFrame]]:
+        """
+        读取上传结果，返回 (摘要信息, 用户积分表)
+        结果不存在、已过期或不属于 owner 时返回None
+        """
+        if not result_id or not RESULT_ID_PATTERN.match(result_id):
+            return None
+
+        meta_path, data_path = self._paths(result_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('owner') != owner or time.time() - meta.get('created_at', 0) > self.ttl_seconds:
+            return None
+
+        try:
+            # 同一结果的多次分页/筛选请求只解析一次
+            user_points = frame_cache.get(data_path, self._read_frame, kind='upload_result')
+        except Exception as e:
+            print(f"⚠️ 读取上传结果失败: {str(e)}")
+            return None
+
+        return meta, user_points
+
+    def purge_expired(self):
+        """删除过期的上传结果"""
+        if not os.path.exists(self.result_dir):
+            return
+
+        now = time.time()
+        with self._lock:
+            for filename in os.listdir(self.result_dir):
+                path = os.path.join(self.result_dir, filename)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl_seconds:
+                        os.remove(path)
+                        frame_cache.invalidate(path)
+                except OSError:
+                    continue
+
+
+# 全局上传结果存储实例
+upload_result_store = UploadResultStore()
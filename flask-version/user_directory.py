@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+用户目录模块
+在内存中缓存 users.csv（按用户名索引，并建立邮箱索引），文件变化时才重新加载；
+认证流程不依赖 pandas
+"""
+
+import csv
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# users.csv 的列
+USER_FIELDS = ['username', 'password_hash', 'email', 'role', 'created_at', 'is_active']
+
+
+class UserDirectory:
+    """用户目录"""
+
+    def __init__(self, users_file: str = 'users.csv'):
+        self.users_file = users_file
+        self.users: Dict[str, Dict[str, Any]] = {}     # 用户名 -> 用户信息
+        self.emails: Dict[str, str] = {}               # 邮箱 -> 用户名
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.RLock()
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.users_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _parse_row(row: Dict[str, str]) -> Dict[str, Any]:
+        user = {field: row.get(field) or '' for field in USER_FIELDS}
+        user['is_active'] = str(user['is_active']).strip().lower() not in ('false', '0', 'no')
+        return user
+
+    def _ensure_loaded(self):
+        """首次访问或 users.csv 被修改后重新加载"""
+        signature = self._file_signature()
+        if signature is not None and signature == self._signature:
+            return
+
+        with self._lock:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+
+            users, emails = {}, {}
+            if signature is not None:
+                with open(self.users_file, 'r', encoding='utf-8-sig', newline='') as f:
+                    for row in csv.DictReader(f):
+                        user = self._parse_row(row)
+                        # 与原先的按行查找一致，同名用户以第一条记录为准
+                        users.setdefault(user['username'], user)
+                        if user['email']:
+                            emails.setdefault(user['email'], user['username'])
+
+            self.users, self.emails = users, emails
+            self._signature = signature
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        """按用户名获取用户信息（副本），不存在时返回None"""
+        self._ensure_loaded()
+        user = self.users.get(username)
+        return dict(user) if user is not None else None
+
+    def exists(self, username: Optional[str] = None, email: Optional[str] = None) -> bool:
+        """用户名或邮箱是否已被使用"""
+        self._ensure_loaded()
+        return (username is not None and username in self.users) or (email is not None and email in self.emails)
+
+    @staticmethod
+    def _to_row(user: Dict[str, Any]) -> List[str]:
+        return [str(user.get(field, '')) for field in USER_FIELDS]
+
+    def add(self, user: Dict[str, Any]) -> bool:
+        """
+        追加新用户到 users.csv，用户名或邮箱已存在时返回False
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self.exists(user['username'], user.get('email')):
+                return False
+
+            if not os.path.exists(self.users_file):
+                self.write_all([user])
+                return True
+
+            # 确保追加的记录另起一行
+            needs_newline = False
+            with open(self.users_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) not in (b'\n', b'\r')
+
+            with open(self.users_file, 'a', encoding='utf-8', newline='') as f:
+                if needs_newline:
+                    f.write('\r\n')
+                csv.writer(f).writerow(self._to_row(user))
+
+            self._signature = None    # 下次访问时重新加载
+            return True
+
+    def write_all(self, users: List[Dict[str, Any]]):
+        """原子替换整个 users.csv"""
+        with self._lock:
+            tmp_file = self.users_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(USER_FIELDS)
+                for user in users:
+                    writer.writerow(self._to_row(user))
+            os.replace(tmp_file, self.users_file)
+            self._signature = None
+
+
+# 全局用户目录实例
+user_directory = UserDirectory()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+用户查询索引模块
+汇总所有管理员的用户积分（用户ID、昵称、积分），供公开查询页面使用，查询时不再读取各管理员的CSV文件；
+昵称通过 n-gram 倒排索引进行子串查找
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tenant_locks import file_lock
+
+# 索引文件的列
+INDEX_COLUMNS = ['UserID', 'UserName', 'TotalPoints', 'ValidDays']
+
+# 匹配类型排序：完全匹配 < 前缀匹配 < 子串匹配
+RANK_EXACT, RANK_PREFIX, RANK_SUBSTRING = 0, 1, 2
+
+# 建立 n-gram 索引时每块最多处理的昵称数
+NGRAM_BUILD_CHUNK = 65536
+
+# 每块码点矩阵的单元数上限（行数 × 最长昵称长度），约 2M 单元，int64 矩阵约 16MB
+NGRAM_BUILD_CELLS = 2 * 1024 * 1024
+
+# Unicode 码点范围，用于把双字 gram 编码为一个整数
+UNICODE_RANGE = 0x110000
+
+
+class NgramNameIndex:
+    """
+    昵称的 n-gram 倒排索引（单字和双字，适合以中文为主的昵称）
+    查询时对查询串各个 gram 的倒排列表求交集得到候选行，只对候选行做子串校验；不区分大小写
+    """
+
+    def __init__(self, names: pd.Series):
+        self.names = names.fillna('').astype(str).str.lower().to_numpy(dtype=object)
+        self.postings = self._build_postings(self.names)
+
+    @staticmethod
+    def _build_postings(names: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        建立 gram -> 有序行号数组 的倒排列表
+        昵称按块转换为 Unicode 码点矩阵，单字 gram 编码为码点，双字 gram 编码为 码点1 * 0x110000 + 码点2；
+        矩阵宽度取块内最长的昵称，因此先按长度排序再分块，并按 NGRAM_BUILD_CELLS 限制每块的行数，
+        个别很长的昵称不会使整块的矩阵随之变宽
+        """
+        lengths = np.fromiter((len(name) for name in names), dtype=np.int64, count=len(names))
+        by_length = np.argsort(lengths, kind='stable')
+
+        key_parts, row_parts = [], []
+        start = 0
+        while start < len(by_length):
+            end = min(start + NGRAM_BUILD_CHUNK, len(by_length))
+            # 按长度升序，块内最长的是最后一个；超过单元数上限时缩小块（缩小后宽度只会更小）
+            width = max(int(lengths[by_length[end - 1]]), 1)
+            end = min(end, start + max(NGRAM_BUILD_CELLS // width, 1))
+            batch = by_length[start:end]
+            start = end
+
+            chunk = np.array(names[batch], dtype=str)
+            width = chunk.dtype.itemsize // 4
+            matrix = chunk.view(np.uint32).reshape(len(chunk), width).astype(np.int64)
+            rows = np.broadcast_to(batch[:, None], matrix.shape)
+
+            unigram_valid = matrix > 0
+            key_parts.append(matrix[unigram_valid])
+            row_parts.append(rows[unigram_valid])
+
+            if width > 1:
+                bigrams = matrix[:, :-1] * UNICODE_RANGE + matrix[:, 1:]
+                bigram_valid = matrix[:, 1:] > 0
+                key_parts.append(bigrams[bigram_valid])
+                row_parts.append(rows[:, 1:][bigram_valid])
+
+        if not key_parts:
+            return {}
+
+        # 按 (gram, 行号) 排序，同一 gram 的行号递增；同一行中重复出现的 gram 只记录一次
+        keys = np.concatenate(key_parts)
+        rows = np.concatenate(row_parts)
+        order = np.lexsort((rows, keys))
+        keys, rows = keys[order], rows[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        keys, rows = keys[keep], rows[keep]
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        grams = [
+            chr(key) if key < UNICODE_RANGE else chr(key // UNICODE_RANGE) + chr(key % UNICODE_RANGE)
+            for key in keys[starts].tolist()
+        ]
+        return dict(zip(grams, np.split(rows, starts[1:])))
+
+    def search(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        查找昵称包含 query 的行
+        返回 (行号, 匹配类型)，已按 完全匹配、前缀匹配、子串匹配 排序，同类型内保持原顺序
+        """
+        query = str(query).lower()
+
+        if not query:
+            candidates = np.arange(len(self.names))
+        else:
+            grams = {query} if len(query) <= 2 else {query[i:i + 2] for i in range(len(query) - 1)}
+            postings = []
+            for gram in grams:
+                rows = self.postings.get(gram)
+                if rows is None:
+                    return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+                postings.append(rows)
+
+            # 从最短的倒排列表开始求交集
+            postings.sort(key=len)
+            candidates = postings[0]
+            for rows in postings[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, rows, assume_unique=True)
+
+        names = self.names[candidates]
+
+        # 长度超过2时，双字 gram 都出现不代表连续出现，需要校验
+        if len(query) > 2:
+            matched = np.fromiter((query in name for name in names), dtype=bool, count=len(names))
+            candidates, names = candidates[matched], names[matched]
+
+        ranks = np.fromiter(
+            (RANK_EXACT if name == query else RANK_PREFIX if name.startswith(query) else RANK_SUBSTRING
+             for name in names),
+            dtype=np.int64, count=len(names)
+        )
+        order = np.argsort(ranks, kind='stable')
+        return candidates[order], ranks[order]
+
+
+class UserLookupIndex:
+    """
+    跨管理员的用户查询索引
+    每个管理员的索引数据保存在 data/<管理员>/user_index.csv，data/user_index.json 记录各管理员的 user_points.csv
+    在建索引时的修改时间和大小；某个管理员的数据变化时只重写该管理员的索引文件和这份记录。
+    多个工作进程之间通过 data/user_index.lock 锁文件串行化“读取-修改-写回”
+    """
+
+    def __init__(self, data_dir: str = 'data'):
+        self.data_dir = data_dir
+        self.meta_file = os.path.join(data_dir, 'user_index.json')
+        self.lock_file = os.path.join(data_dir, 'user_index.lock')
+        self.legacy_index_file = os.path.join(data_dir, 'user_index.csv')     # 旧版本的汇总索引文件
+        self.frames: Dict[str, pd.DataFrame] = {}   # 管理员 -> 索引数据
+        self.tenants: Dict[str, List[int]] = {}    # 管理员 -> [user_points.csv 修改时间(ns), 大小]
+        self._loaded = False
+        self._loaded_signature = None
+        self._tenant_indexes: Dict[str, Tuple[pd.DataFrame, NgramNameIndex]] = {}   # 按需建立
+        self._lock = threading.RLock()
+
+    def _user_points_file(self, tenant: str) -> str:
+        return os.path.join(self.data_dir, tenant, 'user_points.csv')
+
+    def _index_file(self, tenant: str) -> str:
+        return os.path.join(self.data_dir, tenant, 'user_index.csv')
+
+    @staticmethod
+    def _file_signature(path: str) -> Optional[List[int]]:
+        """文件的修改时间和大小，文件不存在时返回None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @staticmethod
+    def _tmp_path(path: str) -> str:
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _read_meta(self) -> Dict[str, List[int]]:
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"⚠️ 读取用户查询索引记录失败，将重新建立: {str(e)}")
+            return {}
+
+    def _save_meta(self, meta: Dict[str, List[int]]):
+        """原子写入索引记录（调用方需持有文件锁）"""
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+        tmp_meta = self._tmp_path(self.meta_file)
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_meta, self.meta_file)
+
+    def _save_tenant(self, tenant: str, frame: pd.DataFrame):
+        """原子写入单个管理员的索引文件（调用方需持有文件锁）"""
+        index_file = self._index_file(tenant)
+        tmp_index = self._tmp_path(index_file)
+        frame.to_csv(tmp_index, index=False)
+        os.replace(tmp_index, index_file)
+
+    def _remove_tenant(self, tenant: str):
+        """从内存和磁盘中删除管理员的索引数据（调用方需持有锁和文件锁）"""
+        self.frames.pop(tenant, None)
+        self.tenants.pop(tenant, None)
+        self._tenant_indexes.pop(tenant, None)
+        try:
+            os.remove(self._index_file(tenant))
+        except FileNotFoundError:
+            pass
+
+    def _ensure_loaded(self):
+        """索引记录被其他进程更新过（或尚未加载）时重新加载变化的管理员，并校正与各管理员数据不一致的部分"""
+        signature = self._file_signature(self.meta_file)
+        if self._loaded and signature == self._loaded_signature:
+            return
+
+        with self._lock:
+            signature = self._file_signature(self.meta_file)
+            if self._loaded and signature == self._loaded_signature:
+                return
+
+            with file_lock(self.lock_file):
+                self._load_tenants(self._read_meta())
+                self._reconcile()
+                if os.path.exists(self.legacy_index_file):
+                    os.remove(self.legacy_index_file)
+                self._loaded_signature = self._file_signature(self.meta_file)
+            self._loaded = True
+
+    def _load_tenants(self, meta: Dict[str, List[int]]):
+        """按索引记录加载有变化的管理员的索引文件，读取失败的留给 _reconcile 重建（调用方需持有锁）"""
+        for tenant in list(self.tenants):
+            if tenant not in meta:
+                self.frames.pop(tenant, None)
+                self.tenants.pop(tenant, None)
+                self._tenant_indexes.pop(tenant, None)
+
+        for tenant, signature in meta.items():
+            if self.tenants.get(tenant) == signature and tenant in self.frames:
+                continue
+            self._tenant_indexes.pop(tenant, None)
+            try:
+                self.frames[tenant] = pd.read_csv(self._index_file(tenant),
+                                                  dtype={'UserID': str, 'UserName': str})
+                self.tenants[tenant] = signature
+            except Exception:
+                self.frames.pop(tenant, None)
+                self.tenants.pop(tenant, None)
+
+    def _reconcile(self):
+        """重建修改时间或大小与索引记录不一致的管理员数据（调用方需持有锁和文件锁）"""
+        current = {}
+        if os.path.exists(self.data_dir):
+            for tenant in os.listdir(self.data_dir):
+                signature = self._file_signature(self._user_points_file(tenant))
+                if signature is not None:
+                    current[tenant] = signature
+
+        changed = [tenant for tenant, signature in current.items() if self.tenants.get(tenant) != signature]
+        removed = [tenant for tenant in self.tenants if tenant not in current]
+        if not changed and not removed:
+            return
+
+        for tenant in changed:
+            frame = self._read_tenant(tenant)
+            self._save_tenant(tenant, frame)
+            self.frames[tenant] = frame
+            self.tenants[tenant] = current[tenant]
+            self._tenant_indexes.pop(tenant, None)
+        for tenant in removed:
+            self._remove_tenant(tenant)
+
+        self._save_meta(self.tenants)
+        print(f"🔎 用户查询索引已更新 {len(changed) + len(removed)} 个管理员的数据")
+
+    def _read_tenant(self, tenant: str) -> pd.DataFrame:
+        """读取单个管理员的用户积分作为索引数据"""
+        try:
+            user_points = pd.read_csv(self._user_points_file(tenant), dtype={'UserID': str})
+        except Exception as e:
+            print(f"⚠️ 读取 {tenant} 的用户积分失败: {str(e)}")
+            return pd.DataFrame(columns=INDEX_COLUMNS)
+        return self._to_index_rows(user_points)
+
+    @staticmethod
+    def _to_index_rows(user_points: pd.DataFrame) -> pd.DataFrame:
+        rows = pd.DataFrame({
+            'UserID': user_points['UserID'].astype(str),
+            'UserName': user_points['UserName'] if 'UserName' in user_points.columns else '未知用户',
+            'TotalPoints': user_points['TotalPoints'],
+            'ValidDays': user_points['ValidDays']
+        }, columns=INDEX_COLUMNS)
+        rows['UserName'] = rows['UserName'].fillna('未知用户').astype(str)
+        return rows.reset_index(drop=True)
+
+    def _tenant_index(self, tenant: str) -> Tuple[pd.DataFrame, NgramNameIndex]:
+        """获取管理员的用户数据及其昵称索引，首次查询时建立"""
+        with self._lock:
+            cached = self._tenant_indexes.get(tenant)
+            if cached is None:
+                frame = self.frames.get(tenant, pd.DataFrame(columns=INDEX_COLUMNS))
+                cached = (frame, NgramNameIndex(frame['UserName']))
+                self._tenant_indexes[tenant] = cached
+            return cached
+
+    def update_tenant(self, tenant: str, user_points: Optional[pd.DataFrame]):
+        """
+        管理员的 user_points.csv 写入后更新其索引数据，只重写该管理员的索引文件
+        user_points: 刚写入的用户积分，为None时表示该管理员已没有数据
+        """
+        self._ensure_loaded()
+
+        with self._lock, file_lock(self.lock_file):
+            # 以磁盘上的记录为准合并，保留其他进程写入的管理员
+            meta = self._read_meta()
+            others_current = ({key: value for key, value in meta.items() if key != tenant} ==
+                              {key: value for key, value in self.tenants.items() if key != tenant})
+            signature = self._file_signature(self._user_points_file(tenant))
+
+            if user_points is None or signature is None:
+                self._remove_tenant(tenant)
+                meta.pop(tenant, None)
+            else:
+                frame = self._to_index_rows(user_points)
+                self._save_tenant(tenant, frame)
+                self.frames[tenant] = frame
+                self.tenants[tenant] = signature
+                self._tenant_indexes.pop(tenant, None)
+                meta[tenant] = signature
+
+            self._save_meta(meta)
+            # 其他管理员在此期间被别的进程更新过时，保留旧的签名，下次查询时加载
+            if others_current:
+                self._loaded_signature = self._file_signature(self.meta_file)
+
+    def search(self, name: str, tenant: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        按昵称（不区分大小写的子串）查找用户，结果按 完全匹配、前缀匹配、子串匹配 排序
+        tenant 为None时查找所有管理员；没有相应数据时返回None
+        """
+        self._ensure_loaded()
+
+        tenants = [tenant] if tenant is not None else list(self.tenants)
+        if not any(data_owner in self.tenants for data_owner in tenants):
+            return None
+
+        frames, ranks = [], []
+        for data_owner in tenants:
+            frame, name_index = self._tenant_index(data_owner)
+            rows, row_ranks = name_index.search(name)
+            frames.append(frame.iloc[rows])
+            ranks.append(row_ranks)
+
+        matched = pd.concat(frames, ignore_index=True)
+        if len(frames) > 1:
+            matched = matched.iloc[np.argsort(np.concatenate(ranks), kind='stable')]
+        return matched[['UserID', 'TotalPoints', 'ValidDays', 'UserName']].reset_index(drop=True)